@@ -1,30 +1,41 @@
-from langchain_community.llms import Ollama
+import os
+
 from crewai import Agent
-from crewai import LLM
-from langchain_ollama.llms import OllamaLLM
 
-from crewai import LLM
+from prompts import TASK_PROMPT, system_prompt
+from routing import model_router
 
 
-llm = LLM(
-    model="ollama/llama3.2",
-    base_url="http://localhost:11434"
-)
+# Agent step-by-step console logging; set TOURMUSE_VERBOSE=0 in production,
+# where /metrics and TOURMUSE_TRACE_FILE cover timing and token use.
+VERBOSE = os.getenv("TOURMUSE_VERBOSE", "1") == "1"
+
+# Agents that must answer in JSON use Ollama's JSON mode, which constrains
+# decoding to valid JSON objects. Set TOURMUSE_JSON_MODE=0 for servers without it.
+JSON_FORMAT = {"type": "json_object"} if os.getenv("TOURMUSE_JSON_MODE", "1") == "1" else None
+
+
+def default_llm(response_format=None):
+    """The router's client for the default model; each run swaps in its routed model and host."""
+    return model_router.llm(model_router.default_model, model_router.backends[0], response_format=response_format)
+
+
+json_llm = default_llm(JSON_FORMAT)
 # 1️⃣ Planner Agent - Generates daily timetable
 planner_agent = Agent(
     role="Planner Agent",
-    goal="Generate a clear, user-friendly, day-wise travel timetable based on {user_input}.",
+    goal="Generate a clear, user-friendly, day-wise travel timetable based on the user's trip request.",
     backstory="Expert travel planner with knowledge of world travel timings, optimal routes, and local highlights.",
     allow_delegation=False,
-    llm=llm,
-    verbose=True,
+    llm=json_llm,
+    verbose=VERBOSE,
     max_iter = 3,
-    prompt_template="""
+    system_template=system_prompt("""
     You are an expert travel planner.
-    Given: {{user_input}}
-    Generate a daily itinerary with time slots, place names, address, description, weather, entry fees, and transport method clearly.
+    Given the user's trip request, generate a daily itinerary with time slots, place names, address, description, weather, entry fees, and transport method clearly.
     Return in JSON:
-    [
+    {
+      "days": [
       {
         "day": 1,
         "date": "YYYY-MM-DD",
@@ -43,9 +54,11 @@ planner_agent = Agent(
         ]
       },
       ...
-    ]
+      ]
+    }
     
-    """
+    """),
+    prompt_template=TASK_PROMPT,
 )
 
 # 2️⃣ Budget Agent - Computes detailed cost
@@ -54,9 +67,9 @@ budget_agent = Agent(
     goal="Calculate a detailed budget split for accommodation, meals, transport, activities, and shopping based on plan and user budget.",
     backstory="Expert travel budget analyst with data on typical costs in various cities.",
     allow_delegation=False,
-    llm=llm,
-    verbose=True,
-    prompt_template="""
+    llm=json_llm,
+    verbose=VERBOSE,
+    system_template=system_prompt("""
     You are a travel budget analyst.
     Given the user's destination, travel dates, preferences, and draft itinerary, calculate:
     - Accommodation, Meals, Transport, Activities, Shopping costs
@@ -71,7 +84,8 @@ budget_agent = Agent(
       "Shopping": "$100",
       "Total": "$850"
     }
-    """
+    """),
+    prompt_template=TASK_PROMPT,
 )
 
 # 3️⃣ Optimizer Agent - Suggests cost-cutting changes
@@ -80,13 +94,14 @@ optimizer_agent = Agent(
     goal="Suggest ways to reduce costs in specific categories like accommodation, meals, transport, or activities while retaining trip quality.",
     backstory="Optimization expert for travel costs.",
     allow_delegation=False,
-    llm=llm,
-    verbose=True,
-    prompt_template="""
+    llm=json_llm,
+    verbose=VERBOSE,
+    system_template=system_prompt("""
     You are a cost optimizer for travel.
     Given the current budget breakdown and user selection of what to optimize (accommodation, meals, etc.), suggest changes to reduce costs while retaining experience quality.
     Return a new optimized budget breakdown JSON.
-    """
+    """),
+    prompt_template=TASK_PROMPT,
 )
 
 # 4️⃣ Replanner Agent - Creates alternate plans
@@ -95,13 +110,14 @@ replanner_agent = Agent(
     goal="Generate an alternate itinerary based on weather changes, event conflicts, or user dissatisfaction.",
     backstory="Expert in replanning travel based on live updates.",
     allow_delegation=False,
-    llm=llm,
-    verbose=True,
-    prompt_template="""
+    llm=json_llm,
+    verbose=VERBOSE,
+    system_template=system_prompt("""
     You are a replanning agent.
     Given the previous plan, new conditions (weather/event/user feedback), and constraints, generate a new daily itinerary with revised timings and places if needed.
     Return in the same structured JSON as the Planner Agent.
-    """
+    """),
+    prompt_template=TASK_PROMPT,
 )
 
 # 5️⃣ Place Agent - Provides detailed place info
@@ -110,14 +126,15 @@ place_agent = Agent(
     goal="Provide detailed information for a specific place in the itinerary.",
     backstory="Place information expert with data on attractions.",
     allow_delegation=False,
-    llm=llm,
-    verbose=True,
-    prompt_template="""
+    llm=json_llm,
+    verbose=VERBOSE,
+    system_template=system_prompt("""
     You are a place detail provider.
     Given the name and location of a place, return:
     - Entry fee, address, weather, short description, top highlights, nearby restaurants, map link, and available transport.
     Return in structured JSON.
-    """
+    """),
+    prompt_template=TASK_PROMPT,
 )
 
 # 6️⃣ City Guide Agent - Provides local info
@@ -126,9 +143,9 @@ city_guide_agent = Agent(
     goal="Provide local information including visa info, customs, public transport tips, and local events.",
     backstory="Expert city guide bot.",
     allow_delegation=False,
-    llm=llm,
-    verbose=True,
-    prompt_template="""
+    llm=json_llm,
+    verbose=VERBOSE,
+    system_template=system_prompt("""
     You are a city guide.
     Given the user's destination and dates, return:
     - Visa information
@@ -136,7 +153,8 @@ city_guide_agent = Agent(
     - Public transport tips
     - Local events during the travel period
     Return in structured JSON.
-    """
+    """),
+    prompt_template=TASK_PROMPT,
 )
 
 # 7️⃣ Intent Agent - Parses user inputs
@@ -145,9 +163,9 @@ intent_agent = Agent(
     goal="Parse user inputs from the frontend (destination, dates, budget, mood, preferences) and prepare a clean JSON to pass to the Planner Agent.",
     backstory="Intent parser bot.",
     allow_delegation=False,
-    llm=llm,
-    verbose=True,
-    prompt_template="""
+    llm=default_llm(),
+    verbose=VERBOSE,
+    system_template=system_prompt("""
     You are an intent parser.
     Given user raw inputs, extract:
     - Destination
@@ -156,7 +174,8 @@ intent_agent = Agent(
     - Mood (relax, adventure, culture)
     - Preferences (eco-friendly, dynamic replanning)
     Return in clean structured JSON.
-    """
+    """),
+    prompt_template=TASK_PROMPT,
 )
 
 # 8️⃣ Eco Agent - Suggests greener alternatives
@@ -165,68 +184,78 @@ eco_agent = Agent(
     goal="Suggest eco-friendly alternatives for transport and activities.",
     backstory="Expert in sustainable travel planning.",
     allow_delegation=False,
-    llm=llm,
-    verbose=True,
-    prompt_template="""
+    llm=default_llm(),
+    verbose=VERBOSE,
+    system_template=system_prompt("""
     You are a sustainable travel advisor.
     Given the itinerary, suggest:
     - Greener transport options
     - Eco-friendly activities
     - Sustainable accommodation suggestions
     Return in structured JSON.
-    """
+    """),
+    prompt_template=TASK_PROMPT,
 )
 
 hotel_agent = Agent(
     role="Hotel Generator Agent",
     goal="Generate hotel options by budget tier.",
     backstory="Global hotel recommender.",
-    allow_delegation=True,
-    llm=llm,
-    verbose=True,
-    prompt_template="""
+    allow_delegation=False,
+    llm=json_llm,
+    verbose=VERBOSE,
+    system_template=system_prompt("""
 Given location and dates, return:
 {
   "budget_hotels": [],
   "mid_range_hotels": [],
   "luxury_hotels": []
 }
-"""
+"""),
+    prompt_template=TASK_PROMPT,
+)
+
+# Hotel Blurb Agent - Short descriptions for hotels ranked by hotels.py
+hotel_blurb_agent = Agent(
+    role="Hotel Blurb Agent",
+    goal="Write a short, factual blurb for each recommended hotel.",
+    backstory="Travel copywriter who sticks to the facts given.",
+    allow_delegation=False,
+    llm=json_llm,
+    verbose=VERBOSE,
+    system_template=system_prompt("""
+Given a city and a list of hotels with their price, rating and eco flag, write one
+sentence per hotel (at most 25 words) saying who it suits. Use only the facts given.
+Return JSON mapping each hotel name to its blurb:
+{"<hotel name>": "<blurb>"}
+"""),
+    prompt_template=TASK_PROMPT,
 )
 
 
+
 chatbot_agent = Agent(
     role="City and Itinerary Chatbot",
-    goal="Answer user questions about cities and places based on, modify travel plans on demand.",
+    goal="Answer user questions about cities and places based on the trip context, and modify travel plans on demand.",
     backstory=(
         "You are a friendly and accurate travel chatbot for TourMuse. "
         "You answer questions about cities, food, transport, attractions, and modify itineraries on request, "
         "respecting user preferences like eco-friendliness and budget."
     ),
     allow_delegation=True,
-    llm=llm,
-    verbose=True,
-    prompt_template="""
+    llm=default_llm(),
+    verbose=VERBOSE,
+    system_template=system_prompt("""
 You are TourMuse, an intelligent travel assistant capable of understanding and modifying user itineraries with full context.
 
-Here is the context:
-- Current Plan: {current_plan}
-- Budget: {budget}
-- Optimized Plan: {optimized_plan}
-- Replanned Plan: {replanned_plan}
-- Eco Suggestions: {eco_suggestions}
-- Hotels: {hotels}
-- City Guide: {city_guide}
-
-User's Message:
-"{user_message}"
-
-Using the above context:
+You are given the trip context, the conversation so far, details relevant to this message, and the user's message.
+Using that context:
 - Answer the user's query precisely.
 - If they request modifications, propose clear actionable changes to the itinerary, considering the budget, eco-friendliness, and user preferences.
 - If they ask for information about a place, use the city guide and related context.
 - Keep the response warm, helpful, and concise.
-"""
+"""),
+    prompt_template=TASK_PROMPT,
 )
 
 
@@ -240,5 +269,6 @@ __all__ = [
     "city_guide_agent",
     "intent_agent",
     "eco_agent",
-    "hotel_agent"
+    "hotel_agent",
+    "hotel_blurb_agent"
 ]
@@ -0,0 +1,211 @@
+# mock_ollama.py
+"""Stand-in for an Ollama server, for benchmarking the backend without a GPU or network.
+
+Serves the OpenAI-compatible chat endpoint the crews call plus the native
+``/api/tags``, ``/api/generate`` and ``/api/embed`` used by the model router
+and the semantic cache. Replies are canned, schema-valid outputs chosen from
+the agent role in the prompt and are paced at a configurable token rate after
+a first-token latency. A fraction of requests can be failed with 503, the
+status Ollama uses for a full queue.
+
+Run standalone with ``python bench/mock_ollama.py --port 11434``.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MODELS = ["llama3.2:latest", "llama3.2:1b"]
+
+
+def _itinerary(days):
+    return {"days": [
+        {
+            "day": day,
+            "date": f"2025-06-{day:02d}",
+            "slots": [
+                {"time": "09:00", "duration": "2 hours", "place": f"Museum {day}", "address": "1 Main St",
+                 "description": "Collections and a cafe.", "weather": "Sunny, 22°C", "entry_fee": "€15",
+                 "transport_method": "Metro"},
+                {"time": "12:00", "duration": "1.5 hours", "place": f"Old Town {day}", "address": "Market Sq",
+                 "description": "Lunch and a walk.", "weather": "Sunny, 24°C", "entry_fee": "Free",
+                 "transport_method": "Walk"},
+                {"time": "15:00", "duration": "2 hours", "place": f"Park {day}", "address": "Riverside",
+                 "description": "Gardens by the river.", "weather": "Cloudy, 21°C", "entry_fee": "Free",
+                 "transport_method": "Bus"},
+            ],
+        }
+        for day in days
+    ]}
+
+
+def reply_for(prompt):
+    """Canned answer for the agent whose role appears in ``prompt``."""
+    if "You are Replanner Agent" in prompt:
+        days = sorted({int(n) for n in re.findall(r'\\?"day\\?":\s*(\d+)', prompt)}) or [1]
+        return json.dumps(_itinerary(days))
+    if "You are Planner Agent" in prompt:
+        return json.dumps(_itinerary([1, 2, 3]))
+    if "You are Budget Agent" in prompt:
+        return json.dumps({"Accommodation": "₹24000", "Meals": "₹9000", "Transport": "₹4000",
+                           "Activities": "₹6000", "Shopping": "₹5000", "Total": "₹48000"})
+    if "You are Hotel Generator Agent" in prompt:
+        tier = lambda name, price: [{"name": f"{name} {i}", "price": price, "rating": 4.2, "address": "Centre"} for i in (1, 2)]
+        return json.dumps({"budget_hotels": tier("Hostel", "₹2500"), "mid_range_hotels": tier("Hotel", "₹7000"),
+                           "luxury_hotels": tier("Palace", "₹22000")})
+    if "You are Hotel Blurb Agent" in prompt:
+        names = re.findall(r'"name":\s*"([^"]+)"', prompt)
+        return json.dumps({name: f"{name} is a comfortable base close to the sights." for name in names})
+    if "You are Place Agent" in prompt:
+        return json.dumps({"description": "A landmark worth an unhurried visit.", "entry_fee": "€15",
+                           "address": "1 Main St", "lat": 48.8606, "lon": 2.3376,
+                           "highlights": ["Main gallery", "Rooftop view"], "transport": "Metro"})
+    if "You are City Guide Agent" in prompt:
+        return json.dumps({"visa": "Schengen rules apply.", "customs": "Greet shopkeepers when entering.",
+                           "transport": "Buy a day pass for the metro.", "events": []})
+    if "You are Intent Agent" in prompt:
+        return json.dumps({"destination": "Paris", "dates": None, "budget": 50000, "mood": "culture"})
+    return ("Here are a few suggestions for your trip. Visit the old town early to avoid crowds, "
+            "take the metro between neighbourhoods, and book popular museums a day ahead.")
+
+
+def tokenize(text):
+    # Roughly four characters per token, like the models this stands in for.
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+class MockConfig:
+    def __init__(self, token_rate=200.0, latency=0.05, failure_rate=0.0, seed=0):
+        self.token_rate = token_rate        # output tokens per second
+        self.latency = latency              # seconds before the first token
+        self.failure_rate = failure_rate    # fraction of chat requests answered with 503
+        self.random = random.Random(seed)
+
+
+class MockStats:
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, failed=False):
+        with self._lock:
+            self.requests += 1
+            self.failures += int(failed)
+            self.busy_seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {"requests": self.requests, "failures": self.failures, "busy_seconds": self.busy_seconds}
+
+
+def create_app(config=None):
+    config = config or MockConfig()
+    stats = MockStats()
+    app = FastAPI(title="Mock Ollama")
+    app.state.config = config
+    app.state.stats = stats
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": name} for name in MODELS]}
+
+    @app.post("/api/generate")
+    async def generate():
+        # Only used to pin models with keep_alive; nothing to load here.
+        return {"done": True}
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        # Bag-of-words vectors: enough for reworded questions to land near each other.
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        vectors = []
+        for text in texts:
+            vector = [0.0] * 64
+            for word in re.findall(r"\w+", text.lower()):
+                vector[zlib.crc32(word.encode()) % 64] += 1.0
+            vectors.append(vector)
+        return {"model": body.get("model"), "embeddings": vectors}
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        started = time.perf_counter()
+        if config.random.random() < config.failure_rate:
+            stats.record(0.0, failed=True)
+            return JSONResponse(status_code=503, content={"error": "server busy, please try again"})
+
+        prompt = "\n".join(str(m.get("content") or "") for m in body.get("messages", []))
+        content = "Thought: I now know the final answer\nFinal Answer: " + reply_for(prompt)
+        tokens = tokenize(content)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(tokens),
+                 "total_tokens": len(prompt) // 4 + len(tokens)}
+        ident = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        base = {"id": ident, "created": int(time.time()), "model": body.get("model")}
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.latency + len(tokens) / config.token_rate)
+            stats.record(time.perf_counter() - started)
+            return {**base, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+            ]}
+
+        async def events():
+            await asyncio.sleep(config.latency)
+            for token in tokens:
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(1 / config.token_rate)
+            last = {**base, "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            if (body.get("stream_options") or {}).get("include_usage"):
+                last["usage"] = usage
+            yield f"data: {json.dumps(last)}\n\n"
+            yield "data: [DONE]\n\n"
+            stats.record(time.perf_counter() - started)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def serve_in_thread(app, host="127.0.0.1", port=0):
+    """Start ``app`` with uvicorn on a background thread; returns ``(server, base_url)``."""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("server failed to start")
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    config = MockConfig(args.token_rate, args.latency, args.failure_rate)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# run.py
+"""Load-test the backend endpoints against a mock Ollama server.
+
+Starts ``mock_ollama`` and the FastAPI app on local ports, drives each
+scenario at the given concurrency, and reports latency percentiles,
+throughput, time to first byte and per-request overhead (latency minus the
+time the mock spent "generating"). With ``--baseline`` the run fails (exit 1)
+when any scenario's p95 latency or throughput is worse than the baseline by
+more than ``--tolerance``. Baselines are only comparable on the same machine
+and settings, so regenerate ``baseline.json`` when either changes.
+
+    cd backend
+    python bench/run.py --concurrency 8 --requests 40
+    python bench/run.py --save-baseline bench/baseline.json
+    python bench/run.py --baseline bench/baseline.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path[:0] = [str(BENCH_DIR), str(BENCH_DIR.parent)]
+
+from mock_ollama import MockConfig, create_app, serve_in_thread  # noqa: E402
+
+_ids = itertools.count()
+
+
+def trip(**overrides):
+    n = next(_ids)
+    # A distinct user, trip and budget per request keeps the result cache out of the numbers.
+    return {
+        "user_id": f"bench-{n}", "trip_id": f"trip-{n}", "location": "Paris",
+        "startDate": "2025-06-01", "endDate": "2025-06-03", "budget": 60000 + n,
+        "travelStyle": "culture", "ecoFriendly": False, "dynamicReplanning": False,
+        **overrides,
+    }
+
+
+def seeded_trip(body):
+    """Setup request that stores a plan for ``body``'s trip, for endpoints that need one."""
+    return "POST", "/generate-plan", trip(user_id=body["user_id"], trip_id=body["trip_id"])
+
+
+def replan_body():
+    body = trip()
+    return {"user_id": body["user_id"], "trip_id": body["trip_id"], "location": "Paris",
+            "changes": [{"day": 2, "reason": "Rain expected"}]}
+
+
+def chat_body():
+    body = trip()
+    return {"user_id": body["user_id"], "trip_id": body["trip_id"], "message": f"What should I eat near the museum? ({body['budget']})"}
+
+
+# name -> (method, path, body factory, setup request factory or None)
+SCENARIOS = {
+    "generate-plan": ("POST", "/generate-plan", trip, None),
+    "generate-plan-stream": ("POST", "/generate-plan/stream", trip, None),
+    "compute-budget": ("POST", "/compute-budget", trip, seeded_trip),
+    "optimize-budget": ("POST", "/optimize-budget", trip, seeded_trip),
+    "replan": ("POST", "/replan", replan_body, seeded_trip),
+    "place-details": ("POST", "/place-details", lambda: {**{k: trip()[k] for k in ("user_id", "location")},
+                                                          "place_name": f"Museum {next(_ids)}", "date": "2025-06-02"}, None),
+    "city-guide": ("POST", "/city-guide", trip, None),
+    "eco-suggestions": ("POST", "/eco-suggestions", trip, None),
+    "generate-hotels": ("POST", "/generate-hotels", trip, None),
+    "parse-intent": ("POST", "/parse-intent", lambda: {"user_id": "bench", "text": f"somewhere relaxing, maybe {next(_ids)}"}, None),
+    "chatbot": ("POST", "/chatbot", chat_body, None),
+    "chatbot-stream": ("POST", "/chatbot/stream", chat_body, None),
+    "trip-bundle": ("POST", "/trip-bundle", trip, None),
+}
+
+
+async def timed_request(client, method, path, body):
+    started = time.perf_counter()
+    ttfb = None
+    async with client.stream(method, path, json=body) as response:
+        async for chunk in response.aiter_raw():
+            if ttfb is None and chunk:
+                ttfb = time.perf_counter() - started
+        status = response.status_code
+    latency = time.perf_counter() - started
+    return latency, ttfb if ttfb is not None else latency, status
+
+
+class MockFleet:
+    """One or more mock servers, so the router has several backends to balance across."""
+
+    def __init__(self, config, count):
+        self.apps = [create_app(config) for _ in range(count)]
+        self.servers, self.urls = zip(*(serve_in_thread(app) for app in self.apps))
+
+    def snapshot(self):
+        totals = {"requests": 0, "failures": 0, "busy_seconds": 0.0}
+        for app in self.apps:
+            for key, value in app.state.stats.snapshot().items():
+                totals[key] += value
+        return totals
+
+    def stop(self):
+        for server in self.servers:
+            server.should_exit = True
+
+
+async def run_scenario(client, mock, name, concurrency, requests):
+    method, path, make_body, make_setup = SCENARIOS[name]
+    bodies = [make_body() for _ in range(requests)]
+    if make_setup is not None:
+        # Setup calls are not timed, and are done before the mock counters are read.
+        setups = [make_setup(body) for body in bodies]
+        await asyncio.gather(*(client.request(m, p, json=b) for m, p, b in setups))
+
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(body):
+        async with semaphore:
+            samples.append(await timed_request(client, method, path, body))
+
+    before = mock.snapshot()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(body) for body in bodies))
+    wall = time.perf_counter() - started
+    after = mock.snapshot()
+
+    latency = np.array([s[0] for s in samples]) * 1000
+    ttfb = np.array([s[1] for s in samples]) * 1000
+    errors = sum(1 for s in samples if s[2] >= 400)
+    model_ms = (after["busy_seconds"] - before["busy_seconds"]) * 1000 / len(samples)
+    p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / wall, 2),
+        "p50_ms": round(float(p50), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+        "ttfb_p50_ms": round(float(np.percentile(ttfb, 50)), 1),
+        "model_calls": after["requests"] - before["requests"],
+        "model_ms_per_request": round(model_ms, 1),
+        # Model time is summed over a request's calls, so parallel crews (trip-bundle) can push this below zero.
+        "overhead_ms": round(float(latency.mean()) - model_ms, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regression messages for scenarios slower or lower-throughput than ``baseline``."""
+    failures = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            failures.append(f"{name}: p95 {current['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            failures.append(f"{name}: {current['throughput_rps']} req/s vs baseline {base['throughput_rps']} req/s")
+        if current["errors"] > base.get("errors", 0):
+            failures.append(f"{name}: {current['errors']} errors vs baseline {base.get('errors', 0)}")
+    return failures
+
+
+def print_table(results):
+    columns = ("requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "ttfb_p50_ms", "overhead_ms")
+    print(f"{'scenario':<22}" + "".join(f"{c:>15}" for c in columns))
+    for name, row in results.items():
+        print(f"{name:<22}" + "".join(f"{row[c]:>15}" for c in columns))
+
+
+async def bench(args):
+    mock = MockFleet(MockConfig(args.token_rate, args.latency, args.failure_rate, args.seed), args.backends)
+    os.environ["TOURMUSE_OLLAMA_URLS"] = ",".join(mock.urls)
+    os.environ.setdefault("TOURMUSE_CACHE_BACKEND", "memory")
+    os.environ.setdefault("TOURMUSE_SESSION_BACKEND", "memory")
+    os.environ.setdefault("TOURMUSE_KNOWLEDGE_PATH", ":memory:")
+    os.environ.setdefault("TOURMUSE_PLAN_PATH", ":memory:")
+    os.environ.setdefault("TOURMUSE_VERBOSE", "0")
+    # Build every crew before serving, so the first scenario doesn't time the warm-up.
+    os.environ.setdefault("TOURMUSE_WARM_UP", "blocking")
+    os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+    import main  # after the environment points the backend at the mock
+    app_server, app_url = serve_in_thread(main.app)
+
+    names = args.scenarios or list(SCENARIOS)
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+        for name in names:
+            results[name] = await run_scenario(client, mock, name, args.concurrency, args.requests)
+            print(f"  {name}: p95 {results[name]['p95_ms']}ms", file=sys.stderr)
+
+    app_server.should_exit = True
+    mock.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="*", choices=list(SCENARIOS), help="default: all")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20, help="requests per scenario")
+    parser.add_argument("--token-rate", type=float, default=400.0, help="mock output tokens per second")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock seconds before the first token")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of mock calls failed with 503")
+    parser.add_argument("--backends", type=int, default=1, help="number of mock servers for the router to balance across")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against this results file and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional regression")
+    parser.add_argument("--save-baseline", help="write results as the new baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args))
+    print_table(results)
+    for path in filter(None, (args.json, args.save_baseline)):
+        Path(path).write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.baseline:
+        failures = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
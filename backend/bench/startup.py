@@ -0,0 +1,137 @@
+# startup.py
+"""Measure worker cold start: import time and time to first request.
+
+For each warm-up mode a fresh uvicorn process is started against a mock
+Ollama server and timed until it answers ``GET /`` (accepting traffic), its
+first crew request (``POST /parse-intent``) and ``GET /ready`` (every crew
+built; not measured with warm-up off). Import time is the median of
+``import main`` in fresh interpreters, with and without building all crews.
+
+    cd backend
+    python bench/startup.py --repeat 3
+    python bench/startup.py --modes background off --json startup.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+sys.path[:0] = [str(BENCH_DIR)]
+
+from mock_ollama import MockConfig, create_app, serve_in_thread  # noqa: E402
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import main
+if {warm}:
+    main.crew_pool.warm_up()
+print(time.perf_counter() - started)
+"""
+
+
+def environment(ollama_url, warm_up="background"):
+    return {
+        **os.environ,
+        "TOURMUSE_OLLAMA_URLS": ollama_url,
+        "TOURMUSE_CACHE_BACKEND": "memory",
+        "TOURMUSE_SESSION_BACKEND": "memory",
+        "TOURMUSE_KNOWLEDGE_PATH": ":memory:",
+        "TOURMUSE_PLAN_PATH": ":memory:",
+        "TOURMUSE_VERBOSE": "0",
+        "TOURMUSE_WARM_UP": warm_up,
+        "CREWAI_DISABLE_TELEMETRY": "true",
+        "OTEL_SDK_DISABLED": "true",
+    }
+
+
+def import_seconds(env, warm, repeat):
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(warm=warm)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return round(statistics.median(samples), 3)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(client, method, path, started, timeout, **kwargs):
+    """Seconds from ``started`` until ``path`` answers 200."""
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if client.request(method, path, **kwargs).status_code == 200:
+                return round(time.perf_counter() - started, 3)
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{method} {path} did not answer within {timeout}s")
+
+
+def first_request(env, timeout, warm_up):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            listening = wait_for(client, "GET", "/", started, timeout)
+            crew = wait_for(client, "POST", "/parse-intent", started, timeout,
+                            json={"user_id": "startup", "text": "a relaxing week somewhere warm"})
+            # With warm-up off the other crews are only built when used, so /ready never turns 200.
+            ready = wait_for(client, "GET", "/ready", started, timeout) if warm_up != "off" else None
+    finally:
+        server.terminate()
+        server.wait()
+    return {"listening_s": listening, "first_crew_request_s": crew, "ready_s": ready}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="*", default=["background", "blocking", "off"],
+                        choices=["background", "blocking", "off"], help="TOURMUSE_WARM_UP values to start with")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per import measurement")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    _, ollama_url = serve_in_thread(create_app(MockConfig(latency=0.0, token_rate=5000.0)))
+    env = environment(ollama_url)
+    results = {
+        "import_main_s": import_seconds(env, False, args.repeat),
+        "import_main_and_build_crews_s": import_seconds(env, True, args.repeat),
+        "startup": {},
+    }
+    for mode in args.modes:
+        results["startup"][mode] = first_request(environment(ollama_url, mode), args.timeout, mode)
+
+    print(f"import main:                  {results['import_main_s']}s")
+    print(f"import main + build crews:    {results['import_main_and_build_crews_s']}s")
+    print(f"{'warm-up':<12}{'listening_s':>14}{'first_crew_request_s':>24}{'ready_s':>10}")
+    for mode, row in results["startup"].items():
+        print(f"{mode:<12}{row['listening_s']:>14}{row['first_crew_request_s']:>24}{str(row['ready_s']):>10}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
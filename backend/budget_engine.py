@@ -0,0 +1,217 @@
+# budget_engine.py
+
+import json
+import os
+import re
+
+import numpy as np
+
+# Approximate INR per unit of each currency; override with TOURMUSE_FX_RATES='{"USD": 84}'.
+FX_TO_INR = {
+    "INR": 1.0, "USD": 83.0, "EUR": 90.0, "GBP": 105.0, "JPY": 0.56, "AED": 22.6,
+    "THB": 2.3, "SGD": 62.0, "AUD": 55.0, "CHF": 94.0, "IDR": 0.0053, "LKR": 0.27,
+}
+FX_TO_INR.update(json.loads(os.getenv("TOURMUSE_FX_RATES", "{}")))
+
+CURRENCY_SYMBOLS = {"₹": "INR", "rs": "INR", "$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "aed": "AED", "฿": "THB"}
+
+# Baseline costs in INR for one traveller in an inexpensive Indian city.
+LODGING = {"budget": 1500.0, "mid_range": 4000.0, "luxury": 12000.0}          # per night
+MEALS = {"street": 600.0, "casual": 1500.0, "fine": 4000.0}                    # per day
+TRANSPORT = {"public": 300.0, "mixed": 800.0, "taxi": 2000.0}                   # per day
+ACTIVITIES_PER_DAY = 800.0    # used when the itinerary has no entry fees
+SHOPPING_PER_DAY = 1000.0
+SHOPPING_LEVELS = {"none": 0.0, "light": 0.5, "full": 1.0}
+
+# How much each choice is worth to the traveller, used to pick the best plan that fits.
+QUALITY = {
+    "lodging": {"budget": 1.0, "mid_range": 2.0, "luxury": 3.0},
+    "meals": {"street": 1.0, "casual": 2.0, "fine": 2.5},
+    "transport": {"public": 1.5, "mixed": 2.0, "taxi": 2.2},
+    "shopping": {"none": 0.0, "light": 0.6, "full": 1.0},
+}
+
+# city -> (cost index relative to the baseline, local currency)
+CITIES = {
+    "paris": (3.0, "EUR"), "london": (3.4, "GBP"), "rome": (2.6, "EUR"), "barcelona": (2.4, "EUR"),
+    "amsterdam": (3.0, "EUR"), "zurich": (4.2, "CHF"), "new york": (3.8, "USD"), "san francisco": (3.8, "USD"),
+    "tokyo": (2.6, "JPY"), "singapore": (3.0, "SGD"), "dubai": (2.8, "AED"), "sydney": (3.0, "AUD"),
+    "bangkok": (1.3, "THB"), "bali": (1.2, "IDR"), "colombo": (0.9, "LKR"),
+    "mumbai": (1.4, "INR"), "delhi": (1.2, "INR"), "bangalore": (1.3, "INR"), "goa": (1.3, "INR"),
+    "jaipur": (1.0, "INR"), "kerala": (1.0, "INR"), "manali": (1.0, "INR"), "varanasi": (0.9, "INR"),
+}
+DEFAULT_CITY = (2.0, "USD")
+
+# Per-slot transport fare as a fraction of the "public" daily budget.
+LEG_FARES = (
+    (("walk", "foot", "bike", "cycle"), 0.0),
+    (("metro", "subway", "bus", "tram", "train", "public", "ferry"), 0.25),
+    (("taxi", "cab", "uber", "ola", "car", "auto", "rickshaw"), 1.5),
+)
+
+CATEGORIES = ("Accommodation", "Meals", "Transport", "Activities", "Shopping")
+
+_CODES = "|".join(re.escape(code) for code in sorted(FX_TO_INR, key=len, reverse=True))
+_CURRENCY = rf"₹|\brs\.?|\$|€|£|¥|฿|\b(?:{_CODES})\b"
+# "€15", "EUR 15", "15 EUR". Only codes with a rate count, so "for 2 people" isn't 2 "FOR".
+_MONEY = re.compile(
+    rf"(?P<cur>{_CURRENCY})?\s*(?P<amount>\d[\d,]*(?:\.\d+)?)(?:\s*(?P<code>\b(?:{_CODES})\b))?", re.IGNORECASE
+)
+_CLAUSE = re.compile(r"[^,;/|()]+")
+
+
+def city_profile(location):
+    name = (location or "").split(",")[0].strip().lower()
+    return CITIES.get(name, DEFAULT_CITY)
+
+
+def parse_money(value, default_currency="INR"):
+    """Amount in INR for values like "$10", "€15-20", "Free", "free for kids, €17 adults", 250 (local currency)."""
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value) * FX_TO_INR.get(default_currency, 1.0)
+    text = str(value).strip()
+    matches = list(_MONEY.finditer(text))
+    if not matches:
+        # "Free", "No entry fee", "N/A"
+        return 0.0
+    # The adult fare when the text lists several ("free for kids, €17 adults"), else the
+    # first amount ("€15-20" -> 15).
+    adult = next((clause.group() for clause in _CLAUSE.finditer(text)
+                  if "adult" in clause.group().lower() and _MONEY.search(clause.group())), None)
+    match = _MONEY.search(adult) if adult else matches[0]
+    currency = match.group("cur") or match.group("code") or next(
+        (m.group("cur") or m.group("code") for m in matches if m.group("cur") or m.group("code")), None
+    )
+    currency = CURRENCY_SYMBOLS.get((currency or "").lower().rstrip("."), (currency or default_currency).upper())
+    amount = float(match.group("amount").replace(",", ""))
+    return amount * FX_TO_INR.get(currency, FX_TO_INR.get(default_currency, 1.0))
+
+
+def leg_fare(method, public_per_day):
+    text = (method or "").lower()
+    for keywords, fraction in LEG_FARES:
+        if any(keyword in text for keyword in keywords):
+            return fraction * public_per_day
+    return 0.25 * public_per_day
+
+
+def format_inr(amount):
+    return f"₹{amount:,.0f}"
+
+
+class BudgetEngine:
+    """Deterministic trip budgeting.
+
+    Per-day category costs are built as a (days x categories) matrix from the
+    itinerary's entry fees and transport legs plus the city's cost tables; the
+    "fit within budget" step scores every combination of lodging tier, meal
+    tier, transport mode and shopping level at once and keeps the best one that
+    fits.
+    """
+
+    def _itinerary_arrays(self, days, n_days, index, currency):
+        fees = np.zeros(n_days)
+        legs = np.zeros(n_days)
+        public = TRANSPORT["public"] * index
+        has_fees = False
+        for i, day in enumerate(days[:n_days]):
+            slots = day.get("slots") or []
+            slot_fees = [parse_money(slot.get("entry_fee"), currency) for slot in slots]
+            if any(slot.get("entry_fee") is not None for slot in slots):
+                has_fees = True
+            fees[i] = sum(slot_fees)
+            legs[i] = sum(leg_fare(slot.get("transport_method"), public) for slot in slots)
+        return fees, legs, has_fees
+
+    def breakdown(self, location, n_days, days=None, lodging="mid_range", meals="casual",
+                  transport="mixed", shopping="full"):
+        index, currency = city_profile(location)
+        n_days = max(n_days, 1)
+        nights = max(n_days - 1, 1)
+        fees, legs, has_fees = self._itinerary_arrays(days or [], n_days, index, currency)
+
+        matrix = np.zeros((n_days, len(CATEGORIES)))
+        matrix[:nights, 0] = LODGING[lodging] * index
+        matrix[:, 1] = MEALS[meals] * index
+        # Itinerary legs are the floor; the chosen mode covers getting around beyond them.
+        matrix[:, 2] = np.maximum(legs, TRANSPORT[transport] * index)
+        matrix[:, 3] = fees if has_fees else ACTIVITIES_PER_DAY * index
+        matrix[:, 4] = SHOPPING_PER_DAY * index * SHOPPING_LEVELS[shopping]
+        return matrix
+
+    def compute(self, location, n_days, budget, days=None, **choices):
+        matrix = self.breakdown(location, n_days, days, **choices)
+        totals = matrix.sum(axis=0)
+        total = float(totals.sum())
+        result = {name: format_inr(value) for name, value in zip(CATEGORIES, totals)}
+        result.update({
+            "Total": format_inr(total),
+            "total_inr": round(total, 2),
+            "budget_inr": budget,
+            "within_budget": total <= budget,
+            "per_day": [
+                {"day": i + 1, **{name: round(float(v), 2) for name, v in zip(CATEGORIES, row)}, "total": round(float(row.sum()), 2)}
+                for i, row in enumerate(matrix)
+            ],
+            "choices": choices or {"lodging": "mid_range", "meals": "casual", "transport": "mixed", "shopping": "full"},
+        })
+        return result
+
+    def optimize(self, location, n_days, budget, days=None, eco_friendly=False, travel_style=""):
+        """Best-value mix of lodging, meals, transport and shopping that fits ``budget``."""
+        index, currency = city_profile(location)
+        n_days = max(n_days, 1)
+        nights = max(n_days - 1, 1)
+        fees, legs, has_fees = self._itinerary_arrays(days or [], n_days, index, currency)
+        fixed = float(fees.sum()) if has_fees else ACTIVITIES_PER_DAY * index * n_days
+
+        names = {key: list(table) for key, table in (
+            ("lodging", LODGING), ("meals", MEALS), ("transport", TRANSPORT), ("shopping", SHOPPING_LEVELS)
+        )}
+        lodging = np.array([LODGING[k] for k in names["lodging"]]) * index * nights
+        meals = np.array([MEALS[k] for k in names["meals"]]) * index * n_days
+        transport = np.array([
+            np.maximum(legs, TRANSPORT[k] * index).sum() for k in names["transport"]
+        ])
+        shopping = np.array([SHOPPING_LEVELS[k] for k in names["shopping"]]) * SHOPPING_PER_DAY * index * n_days
+
+        cost = (
+            lodging[:, None, None, None] + meals[None, :, None, None]
+            + transport[None, None, :, None] + shopping[None, None, None, :] + fixed
+        )
+        weights = {"lodging": 1.0, "meals": 1.0, "transport": 1.0, "shopping": 0.5}
+        if "luxury" in (travel_style or "").lower():
+            weights["lodging"] = 1.5
+        quality_tables = {key: np.array([QUALITY[key][k] for k in names[key]]) * weights[key] for key in names}
+        if eco_friendly:
+            quality_tables["transport"] = quality_tables["transport"] + np.array(
+                [1.0 if k == "public" else 0.0 for k in names["transport"]]
+            )
+        quality = (
+            quality_tables["lodging"][:, None, None, None] + quality_tables["meals"][None, :, None, None]
+            + quality_tables["transport"][None, None, :, None] + quality_tables["shopping"][None, None, None, :]
+        )
+
+        feasible = cost <= budget
+        if feasible.any():
+            # Highest quality that fits; cheaper wins ties.
+            score = np.where(feasible, quality * 1e9 - cost, -np.inf)
+            best = np.unravel_index(np.argmax(score), cost.shape)
+        else:
+            best = np.unravel_index(np.argmin(cost), cost.shape)
+        choice = {key: names[key][i] for key, i in zip(("lodging", "meals", "transport", "shopping"), best)}
+
+        optimized = self.compute(location, n_days, budget, days, **choice)
+        optimized["savings_inr"] = round(
+            self.compute(location, n_days, budget, days)["total_inr"] - optimized["total_inr"], 2
+        )
+        optimized["over_budget_inr"] = round(max(optimized["total_inr"] - budget, 0.0), 2)
+        optimized["alternatives_considered"] = int(cost.size)
+        return optimized
+
+
+budget_engine = BudgetEngine()
+
+__all__ = ["BudgetEngine", "budget_engine", "city_profile", "parse_money"]
@@ -0,0 +1,310 @@
+# cache.py
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Keys whose sizes RedisBackend.nbytes measures; the rest are estimated from their mean.
+NBYTES_SAMPLE = 64
+
+
+def merged_json(value, fields):
+    """JSON object ``value`` (or ``None``) with ``fields`` merged in, as ``(text, dict)``."""
+    merged = {**(json.loads(value) if value else {}), **fields}
+    return json.dumps(merged, default=str), merged
+
+
+def canonical_key(*parts):
+    """Stable sha256 over JSON-serializable parts (dict key order does not matter)."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU store with per-entry expiry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def merge(self, key, fields, ttl=None):
+        """Merge ``fields`` into the JSON object at ``key``; returns the merged object."""
+        with self._lock:
+            entry = self._entries.get(key)
+            current = entry[1] if entry and (entry[0] is None or entry[0] >= time.time()) else None
+            value, merged = merged_json(current, fields)
+            self._entries[key] = (time.time() + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return merged
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def nbytes(self):
+        with self._lock:
+            return sum(len(key) + len(value) for key, (_, value) in self._entries.items())
+
+
+class SQLiteBackend:
+    """Disk-backed store that survives restarts; evicts least recently used rows."""
+
+    def __init__(self, path="tourmuse_cache.sqlite3", max_entries=10000, table="cache"):
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            self._trim(now)
+            self._conn.commit()
+
+    def _trim(self, now):
+        """Drop expired rows, then the least recently used beyond ``max_entries``."""
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def merge(self, key, fields, ttl=None):
+        """Merge ``fields`` into the JSON object at ``key``; returns the merged object.
+
+        The read and write share one ``BEGIN IMMEDIATE`` transaction, so
+        workers updating the same key queue up instead of overwriting each
+        other's fields.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT value FROM {self.table} WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                    (key, now),
+                ).fetchone()
+                value, merged = merged_json(row[0] if row else None, fields)
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now + ttl if ttl else None, now),
+                )
+                self._trim(now)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return merged
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def nbytes(self):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COALESCE(SUM(LENGTH(key) + LENGTH(value)), 0) FROM {self.table}"
+            ).fetchone()
+            return row[0]
+
+
+class RedisBackend:
+    """Store on any Redis-compatible client (redis-py, fakeredis, a local stand-in).
+
+    Only ``get``, ``set(..., ex=)``, ``delete``, ``scan_iter``, ``transaction`` and
+    ``pipeline`` (for ``strlen``) are used. Redis handles expiry itself; size is
+    bounded with the server's maxmemory policy.
+    """
+
+    def __init__(self, client, prefix="tourmuse:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix="tourmuse:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("The redis backend requires the 'redis' package") from e
+        return cls(redis.Redis.from_url(url, decode_responses=True), prefix=prefix)
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def merge(self, key, fields, ttl=None):
+        """Merge ``fields`` into the JSON object at ``key`` under WATCH/MULTI; returns the merged object."""
+        name = self.prefix + key
+
+        def update(pipe):
+            current = pipe.get(name)
+            value, merged = merged_json(current.decode("utf-8") if isinstance(current, bytes) else current, fields)
+            pipe.multi()
+            pipe.set(name, value, ex=int(ttl) if ttl else None)
+            return merged
+
+        return self.client.transaction(update, name, value_from_callable=True)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def _keys(self):
+        return self.client.scan_iter(match=self.prefix + "*")
+
+    def __len__(self):
+        return sum(1 for _ in self._keys())
+
+    def nbytes(self):
+        """Estimated from the sizes of a sample of values, read with one pipelined STRLEN each."""
+        keys = list(self._keys())
+        if not keys:
+            return 0
+        sample = random.sample(keys, min(len(keys), NBYTES_SAMPLE))
+        pipe = self.client.pipeline(transaction=False)
+        for key in sample:
+            pipe.strlen(key)
+        measured = sum(len(key) + (size or 0) for key, size in zip(sample, pipe.execute()))
+        return round(measured * len(keys) / len(sample))
+
+
+def create_backend(kind, path=None, max_entries=1024, table="cache"):
+    if kind == "memory":
+        return MemoryBackend(max_entries=max_entries)
+    if kind == "sqlite":
+        return SQLiteBackend(path or "tourmuse_cache.sqlite3", max_entries=max_entries, table=table)
+    if kind == "redis":
+        url = os.getenv("TOURMUSE_REDIS_URL", "redis://localhost:6379/0")
+        return RedisBackend.from_url(url, prefix=f"tourmuse:{table}:")
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+class ResultCache:
+    """Content-addressed cache of serialized crew outputs.
+
+    Keys hash the crew name, inputs, model and prompt version, so a prompt or
+    model change naturally misses instead of serving stale generations.
+    """
+
+    def __init__(self, backend, ttl=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+
+    @classmethod
+    def from_env(cls):
+        backend = create_backend(
+            os.getenv("TOURMUSE_CACHE_BACKEND", "memory"),
+            path=os.getenv("TOURMUSE_CACHE_PATH"),
+            max_entries=int(os.getenv("TOURMUSE_CACHE_MAX_ENTRIES", "1024")),
+        )
+        return cls(backend, ttl=float(os.getenv("TOURMUSE_CACHE_TTL", "86400")))
+
+    @staticmethod
+    def make_key(crew_name, inputs, model, prompt_version):
+        return canonical_key(crew_name, inputs, model, prompt_version)
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        self.backend.set(key, json.dumps(value, default=str), ttl=self.ttl)
+        self.sets += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "bytes": self.backend.nbytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+result_cache = ResultCache.from_env()
+
+__all__ = [
+    "MemoryBackend", "SQLiteBackend", "RedisBackend", "ResultCache",
+    "canonical_key", "create_backend", "result_cache"
+]
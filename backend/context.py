@@ -0,0 +1,183 @@
+# context.py
+
+import json
+import os
+import re
+
+CHARS_PER_TOKEN = 4
+
+# slot -> (label, token budget, keywords that make the slot relevant to a message)
+CONTEXT_SLOTS = {
+    "current_plan": ("Current Plan", 600, (
+        "plan", "itinerary", "day", "schedule", "visit", "morning", "afternoon",
+        "evening", "tomorrow", "today", "when", "time", "slot", "move", "swap", "add", "remove",
+    )),
+    "replanned_plan": ("Replanned Plan", 400, ("replan", "weather", "rain", "change", "alternative", "instead")),
+    "budget": ("Budget", 200, ("budget", "cost", "price", "expensive", "cheap", "money", "spend", "afford", "inr", "₹", "$")),
+    "optimized_plan": ("Optimized Plan", 200, ("save", "saving", "optimi", "reduce", "cut", "cheaper")),
+    "hotels": ("Hotels", 250, ("hotel", "stay", "accommodation", "room", "hostel", "lodging", "check-in")),
+    "city_guide": ("City Guide", 250, (
+        "visa", "custom", "culture", "etiquette", "transport", "metro", "bus", "train",
+        "event", "festival", "tip", "local", "safe",
+    )),
+    "eco_suggestions": ("Eco Suggestions", 200, ("eco", "green", "sustainable", "carbon", "environment", "walk", "bike")),
+}
+
+# Included when nothing in the message points at a specific slot.
+DEFAULT_SLOTS = ("current_plan",)
+
+CONTEXT_TOKENS = int(os.getenv("TOURMUSE_CHAT_CONTEXT_TOKENS", "1200"))
+HISTORY_TURNS = int(os.getenv("TOURMUSE_CHAT_HISTORY_TURNS", "3"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("TOURMUSE_CHAT_SUMMARY_TOKENS", "200"))
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text, budget):
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:max(limit - 3, 0)].rstrip() + "..."
+
+
+def _first_sentence(text, limit=160):
+    text = " ".join((text or "").split())
+    match = re.match(r"(.+?[.!?])(\s|$)", text)
+    return truncate_tokens(match.group(1) if match else text, limit // CHARS_PER_TOKEN)
+
+
+def _summarize_days(days):
+    lines = []
+    for day in days:
+        if not isinstance(day, dict):
+            continue
+        places = [
+            str(slot.get("place") or slot.get("place_name") or slot.get("activity_name") or "")
+            for slot in day.get("slots") or day.get("time_slots") or []
+            if isinstance(slot, dict)
+        ]
+        label = f"Day {day.get('day', '?')}"
+        if day.get("date"):
+            label += f" ({day['date']})"
+        lines.append(f"{label}: {', '.join(p for p in places if p) or 'no slots'}")
+    return "\n".join(lines)
+
+
+def _summarize_mapping(data):
+    lines = []
+    for key, value in data.items():
+        if isinstance(value, list):
+            names = [
+                str(item.get("name", item)) if isinstance(item, dict) else str(item)
+                for item in value[:5]
+            ]
+            lines.append(f"{key}: {', '.join(names)}")
+        elif isinstance(value, dict):
+            lines.append(f"{key}: {_first_sentence(json.dumps(value, default=str))}")
+        else:
+            lines.append(f"{key}: {_first_sentence(str(value))}")
+    return "\n".join(lines)
+
+
+def summarize_output(result):
+    """Compact, prompt-ready summary of a crew output, computed once when it is stored."""
+    data = result.get("json") if isinstance(result, dict) else None
+    if isinstance(data, dict) and isinstance(data.get("days"), list):
+        data = data["days"]
+    if isinstance(data, list) and data and isinstance(data[0], dict) and "day" in data[0]:
+        return _summarize_days(data)
+    if isinstance(data, dict):
+        return _summarize_mapping(data)
+    raw = result.get("raw", "") if isinstance(result, dict) else str(result)
+    return truncate_tokens(" ".join(raw.split()), 150)
+
+
+def relevant_slots(message):
+    words = re.findall(r"[\w$₹-]+", message.lower())
+    slots = [
+        name for name, (_, _, keywords) in CONTEXT_SLOTS.items()
+        if any(word.startswith(keyword) for word in words for keyword in keywords)
+    ]
+    return slots or list(DEFAULT_SLOTS)
+
+
+def session_context(context, budget=None):
+    """Summaries of every stored session slot, in ``CONTEXT_SLOTS`` order.
+
+    The text doesn't depend on the message, so it stays byte-identical from
+    turn to turn (until a slot is updated) and the model server can reuse its
+    cached prefill. Slots are dropped once the overall budget is spent.
+    """
+    remaining = budget or CONTEXT_TOKENS
+    lines = []
+    for name, (label, slot_budget, _) in CONTEXT_SLOTS.items():
+        entry = context.get(name)
+        if not entry:
+            continue
+        slot_budget = min(slot_budget, remaining)
+        if slot_budget <= 0:
+            break
+        text = truncate_tokens(entry.get("summary") or entry.get("raw") or "", slot_budget)
+        lines.append(f"- {label}:\n{text}")
+        remaining -= estimate_tokens(text)
+    return "\n".join(lines) or "No trip details available yet."
+
+
+def turn_context(context, message, budget=None):
+    """Full text of the slots relevant to ``message`` that the session context only summarizes."""
+    remaining = budget or CONTEXT_TOKENS
+    lines = []
+    for name in relevant_slots(message):
+        entry = context.get(name)
+        if not entry:
+            continue
+        raw = entry.get("raw") or ""
+        if not raw or raw == entry.get("summary"):
+            continue
+        label, slot_budget, _ = CONTEXT_SLOTS[name]
+        slot_budget = min(slot_budget, remaining)
+        if slot_budget <= 0:
+            break
+        text = truncate_tokens(raw, slot_budget)
+        lines.append(f"- {label}:\n{text}")
+        remaining -= estimate_tokens(text)
+    return "\n".join(lines) or "None"
+
+
+def record_turn(conversation, message, reply):
+    """Append a turn, folding older turns into the rolling summary in blocks.
+
+    Turns are only folded once twice the recent window has built up, so the
+    rendered conversation grows by appending for several turns in a row
+    instead of shifting (and invalidating the cached prompt) on every turn.
+    """
+    conversation = {"summary": "", "turns": [], **(conversation or {})}
+    turns = conversation["turns"] + [[message, reply]]
+    summary = conversation["summary"]
+    folded, turns = (turns[:-HISTORY_TURNS], turns[-HISTORY_TURNS:]) if len(turns) > 2 * HISTORY_TURNS else ([], turns)
+    for user, assistant in folded:
+        summary = f"{summary}\nUser asked: {_first_sentence(user)} TourMuse: {_first_sentence(assistant)}".strip()
+    # Keep the most recent part of the summary when it outgrows its budget.
+    limit = HISTORY_SUMMARY_TOKENS * CHARS_PER_TOKEN
+    if len(summary) > limit:
+        summary = summary[-limit:].split("\n", 1)[-1]
+    return {"summary": summary, "turns": turns}
+
+
+def render_conversation(conversation):
+    if not conversation:
+        return "No previous messages."
+    lines = []
+    if conversation.get("summary"):
+        lines.append(f"Earlier: {conversation['summary']}")
+    for user, assistant in conversation.get("turns", []):
+        lines.append(f"User: {user}\nTourMuse: {truncate_tokens(assistant, 150)}")
+    return "\n".join(lines) or "No previous messages."
+
+
+__all__ = [
+    "CONTEXT_SLOTS", "estimate_tokens", "record_turn", "relevant_slots",
+    "render_conversation", "session_context", "summarize_output", "turn_context"
+]
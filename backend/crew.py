@@ -1,27 +1,278 @@
 # crew.py
 
-from crewai import Crew
-from tasks import (
-    planner_task, budget_task, optimizer_task, replanner_task,
-    place_task, city_guide_task, intent_task, eco_task, hotel_task, chatbot_task
-)
-
-planner_crew = Crew(tasks=[planner_task])
-budget_crew = Crew(tasks=[budget_task])
-optimizer_crew = Crew(tasks=[optimizer_task])
-replanner_crew = Crew(tasks=[replanner_task])
-place_crew = Crew(tasks=[place_task])
-city_guide_crew = Crew(tasks=[city_guide_task])
-intent_crew = Crew(tasks=[intent_task])
-eco_crew = Crew(tasks=[eco_task])
-hotel_crew = Crew(tasks=[hotel_task])
-chatbot_crew = Crew(
-    agents=[chatbot_task.agent],
-    tasks=[chatbot_task],
-    verbose=True
-)
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from metrics import tracer
+from prompts import prefix_tracker, prompt_text
+from routing import is_backend_error, model_router, session_affinity
+from schemas import output_validator
+
+# crew name -> its task in tasks.py. Importing crewai and building the agents
+# takes seconds, so tasks.py is only imported when a crew is first needed (or
+# by CrewPool.warm_up); importing this module stays cheap for new workers.
+CREW_TASKS = {
+    "planner": "planner_task",
+    "budget": "budget_task",
+    "optimizer": "optimizer_task",
+    "replanner": "replanner_task",
+    "place": "place_task",
+    "city_guide": "city_guide_task",
+    "intent": "intent_task",
+    "eco": "eco_task",
+    "hotel": "hotel_task",
+    "hotel_blurb": "hotel_blurb_task",
+    "chatbot": "chatbot_task",
+}
+
+# Crews that log their steps when agents are verbose.
+VERBOSE_CREWS = {"chatbot"}
+
+
+def crew_task(name):
+    import tasks
+
+    return getattr(tasks, CREW_TASKS[name])
+
+
+def build_prototype(name):
+    """Prototype crew for ``name``; never kicked off directly, every request runs on a copy."""
+    from crewai import Crew
+    from agents import VERBOSE
+
+    _subscribe_llm_events()
+    task = crew_task(name)
+    if task.agent.prompt_template and not task.agent.system_template:
+        # crewai only renders prompt_template together with system_template;
+        # alone it is dropped and anything it carries never reaches the model.
+        raise ValueError(f"{name}: agent sets prompt_template without system_template")
+    options = {"verbose": VERBOSE} if name in VERBOSE_CREWS else {}
+    return Crew(agents=[task.agent], tasks=[task], **options)
+
+
+def serialize_output(output):
+    """Compact, JSON-safe form of a CrewOutput for responses, caches and sessions."""
+    usage = getattr(output, "token_usage", None)
+    return {
+        "raw": output.raw,
+        "json": output.json_dict,
+        "token_usage": usage.model_dump() if usage is not None else None,
+    }
+
+
+def crew_fingerprint(name):
+    """Model and prompt version of a crew, used to key cached results."""
+    task = crew_task(name)
+    agent = task.agent
+    prompt = "\x1f".join(
+        str(part or "") for part in (
+            agent.role, agent.goal, agent.backstory, agent.system_template, agent.prompt_template,
+            task.description, task.expected_output,
+        )
+    )
+    return {
+        "model": model_router.model_for(name),
+        "prompt_version": hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12],
+    }
+
+
+# LLM timing comes from crewai's event bus. Handlers run on crewai's own
+# threads with a copy of the emitting context, so they still see the trace tags
+# and the per-kickoff state below. Start/end events may arrive in either order;
+# a call is recorded once both halves are in.
+_kickoff_state = ContextVar("tourmuse_kickoff", default=None)
+_llm_calls = {}
+_llm_lock = threading.Lock()
+
+
+def _timestamp(event):
+    return event.timestamp.timestamp()
+
+
+def _merge_llm_call(call_id, **fields):
+    with _llm_lock:
+        call = _llm_calls.setdefault(call_id, {})
+        call.update(fields)
+        if "start" not in call or "end" not in call:
+            return
+        del _llm_calls[call_id]
+    start, end, first = call["start"], call["end"], call.get("first_token")
+    tracer.record("llm_call", end - start, start=start, **call.get("usage", {}))
+    if first is not None:
+        # Streamed calls split into prompt processing (until the first token) and generation.
+        tracer.record("llm_prefill", first - start, start=start)
+        tracer.record("llm_decode", end - first, start=first)
+
+
+def _on_llm_started(source, event):
+    state = _kickoff_state.get()
+    if state is not None:
+        with _llm_lock:
+            first = state["llm_calls"] == 0
+            state["llm_calls"] += 1
+        if first:
+            tracer.record("prompt_build", max(_timestamp(event) - state["started"], 0.0), start=state["started"])
+        key = (state.get("backend"), session_affinity.get() or tracer.tags().get("crew"))
+        prefix_tracker.observe(key, prompt_text(event.messages))
+    tracer.count("tourmuse_llm_calls_total")
+    _merge_llm_call(event.call_id, start=_timestamp(event))
+
+
+def _on_llm_chunk(source, event):
+    with _llm_lock:
+        _llm_calls.setdefault(event.call_id, {}).setdefault("first_token", _timestamp(event))
+
+
+def _on_llm_completed(source, event):
+    usage = event.usage or {}
+    tokens = {"tokens_in": usage.get("prompt_tokens") or 0, "tokens_out": usage.get("completion_tokens") or 0}
+    tracer.count("tourmuse_tokens_total", tokens["tokens_in"], direction="in")
+    tracer.count("tourmuse_tokens_total", tokens["tokens_out"], direction="out")
+    _merge_llm_call(event.call_id, end=_timestamp(event), usage=tokens)
+
+
+def _on_llm_failed(source, event):
+    tracer.count("tourmuse_llm_failures_total")
+    with _llm_lock:
+        _llm_calls.pop(event.call_id, None)
+
+
+_subscribed = False
+
+
+def _subscribe_llm_events():
+    global _subscribed
+    with _llm_lock:
+        if _subscribed:
+            return
+        _subscribed = True
+    from crewai.events import (
+        LLMCallCompletedEvent, LLMCallFailedEvent, LLMCallStartedEvent, LLMStreamChunkEvent, crewai_event_bus
+    )
+
+    crewai_event_bus.on(LLMCallStartedEvent)(_on_llm_started)
+    crewai_event_bus.on(LLMStreamChunkEvent)(_on_llm_chunk)
+    crewai_event_bus.on(LLMCallCompletedEvent)(_on_llm_completed)
+    crewai_event_bus.on(LLMCallFailedEvent)(_on_llm_failed)
+
+
+class CrewPool:
+    """Hands each request an isolated crew copied from a prototype.
+
+    Prototypes are built by ``build(name)`` the first time a crew is needed, or
+    up front by ``warm_up()``. ``Crew.copy()`` clones agents and tasks from
+    already-built objects, so the prompt templates are never rebuilt. A few
+    spare copies per crew are kept warm and replenished after each run, keeping
+    the copy cost off the request path. Crews are never reused once kicked off,
+    since they carry task outputs, memory and iteration counters.
+    """
+
+    def __init__(self, names, build=build_prototype, spares=None, router=model_router):
+        self.spares = spares if spares is not None else int(os.getenv("TOURMUSE_CREW_SPARES", "2"))
+        self.router = router
+        self.names = list(names)
+        self._build = build
+        self._prototypes = {}
+        self._warm = {name: deque() for name in self.names}
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.warm_seconds = None
+
+    def built(self, name):
+        return name in self._prototypes
+
+    def prototype(self, name):
+        prototype = self._prototypes.get(name)
+        if prototype is None:
+            with self._build_lock:
+                prototype = self._prototypes.get(name)
+                if prototype is None:
+                    prototype = self._prototypes[name] = self._build(name)
+        return prototype
+
+    def acquire(self, name):
+        with self._lock:
+            if self._warm[name]:
+                return self._warm[name].popleft()
+        return self.prototype(name).copy()
+
+    def refill(self, name):
+        while True:
+            with self._lock:
+                if len(self._warm[name]) >= self.spares:
+                    return
+            crew = self.prototype(name).copy()
+            with self._lock:
+                self._warm[name].append(crew)
+
+    def warm_up(self, names=None):
+        """Build the prototypes and spare copies of ``names`` (default: every crew)."""
+        started = time.perf_counter()
+        for name in names or self.names:
+            self.refill(name)
+        if names is None:
+            self.warm_seconds = round(time.perf_counter() - started, 3)
+
+    @property
+    def ready(self):
+        return len(self._prototypes) == len(self.names)
+
+    def stats(self):
+        with self._lock:
+            spares = {name: len(warm) for name, warm in self._warm.items()}
+        return {"built": sorted(self._prototypes), "ready": self.ready,
+                "warm_seconds": self.warm_seconds, "spares": spares}
+
+    def _run(self, name, run):
+        """Run ``run(crew)`` on a fresh copy routed to a model host."""
+        crew = self.acquire(name)
+        agent = crew.agents[0]
+        token = _kickoff_state.set({"started": time.time(), "llm_calls": 0})
+        try:
+            with tracer.span("kickoff", crew=name) as extra, self.router.route(name, agent.llm) as (backend, llm):
+                extra["backend"] = backend.url
+                _kickoff_state.get()["backend"] = backend.url
+                agent.llm = llm
+                result = run(crew)
+            tracer.count("tourmuse_crew_runs_total", outcome="ok")
+            return result
+        except Exception:
+            tracer.count("tourmuse_crew_runs_total", outcome="error")
+            raise
+        finally:
+            _kickoff_state.reset(token)
+            self.refill(name)
+
+    def kickoff(self, name, inputs):
+        def run(crew):
+            return output_validator.validate(name, serialize_output(crew.kickoff(inputs=inputs)))
+        try:
+            return self._run(name, run)
+        except Exception as e:
+            if not is_backend_error(e) or len(self.router.backends) < 2:
+                raise
+            # The failed host is now marked down, so the retry lands elsewhere.
+            tracer.count("tourmuse_crew_retries_total", crew=name)
+            return self._run(name, run)
+
+    def stream(self, name, inputs, on_chunk):
+        """Kick off with token streaming, calling ``on_chunk(text)`` per chunk."""
+        def run(crew):
+            crew.stream = True
+            streaming = crew.kickoff(inputs=inputs)
+            for chunk in streaming:
+                if chunk.content:
+                    on_chunk(chunk.content)
+            return output_validator.validate(name, serialize_output(streaming.result))
+        return self._run(name, run)
+
+crew_pool = CrewPool(CREW_TASKS)
 
 __all__ = [
-    "planner_crew", "budget_crew", "optimizer_crew", "replanner_crew",
-    "place_crew", "city_guide_crew", "intent_crew", "eco_crew", "hotel_crew"
+    "CREW_TASKS", "CrewPool", "build_prototype", "crew_fingerprint",
+    "crew_pool", "crew_task", "serialize_output"
 ]
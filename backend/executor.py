@@ -0,0 +1,173 @@
+# executor.py
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import tracer
+
+# Lower runs first.
+INTERACTIVE = 0
+NORMAL = 1
+BATCH = 2
+BACKGROUND = 3    # speculative work nobody is waiting on yet, e.g. prefetch
+
+
+class QueueFull(Exception):
+    """Raised when the scheduler queue is at capacity; ``retry_after`` is in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Server busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CrewExecutor:
+    """Runs blocking crew kickoffs on a bounded set of worker threads so the event loop stays free.
+
+    At most ``max_workers`` LLM jobs are in flight at once; the rest wait in a
+    priority queue. Lower priorities are picked first, and within a priority,
+    users take turns: each user's next job is placed one round after their
+    previous one, so a user with many queued jobs cannot starve the others.
+    Past ``max_queue`` waiting jobs, submissions are refused with ``QueueFull``.
+    Jobs run in a copy of the submitter's context, so trace tags follow them
+    onto the worker. Queue depth, wait and run times are tracked for ``/stats``.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None):
+        self.max_workers = max_workers or int(os.getenv("TOURMUSE_MAX_WORKERS", "4"))
+        self.max_queue = max_queue or int(os.getenv("TOURMUSE_MAX_QUEUE", "64"))
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._heap = []
+        self._seq = itertools.count()
+        self._user_rounds = {}      # (priority, user) -> round of that user's last queued job
+        self._served_rounds = {}    # priority -> round of the last job started
+        self._closed = False
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+        self._workers = [
+            threading.Thread(target=self._work, name=f"crew-{i}", daemon=True)
+            for i in range(self.max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def retry_after(self):
+        """Rough seconds until a worker frees up and a queue slot with it."""
+        finished = self._completed + self._failed
+        avg_run = self._total_run / finished if finished else 10.0
+        return max(1, math.ceil(avg_run / self.max_workers))
+
+    def check_capacity(self):
+        with self._lock:
+            if self._queued >= self.max_queue:
+                raise QueueFull(self.retry_after())
+
+    def submit(self, fn, *args, priority=NORMAL, user=None, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` and return a ``concurrent.futures.Future``."""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("executor is shut down")
+            if self._queued >= self.max_queue:
+                raise QueueFull(self.retry_after())
+            turn = max(self._user_rounds.get((priority, user), 0), self._served_rounds.get(priority, 0)) + 1
+            self._user_rounds[(priority, user)] = turn
+            heapq.heappush(self._heap, (
+                priority, turn, next(self._seq), time.perf_counter(), future, user,
+                contextvars.copy_context(), fn, args, kwargs,
+            ))
+            self._queued += 1
+            self._ready.notify()
+        future.add_done_callback(self._on_cancel)
+        return future
+
+    async def run(self, fn, *args, priority=NORMAL, user=None, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on a worker and await its result."""
+        return await asyncio.wrap_future(self.submit(fn, *args, priority=priority, user=user, **kwargs))
+
+    def _on_cancel(self, future):
+        if future.cancelled():
+            # Cancelled while still queued; the worker will skip it.
+            with self._lock:
+                self._queued -= 1
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._heap and not self._closed:
+                    self._ready.wait()
+                if self._closed:
+                    return
+                priority, turn, _, submitted, future, user, context, fn, args, kwargs = heapq.heappop(self._heap)
+                if self._user_rounds.get((priority, user)) == turn:
+                    # That was the user's last queued job at this priority; a later one
+                    # starts from the served round anyway.
+                    del self._user_rounds[(priority, user)]
+                if not future.set_running_or_notify_cancel():
+                    continue
+                waited = time.perf_counter() - submitted
+                self._served_rounds[priority] = max(self._served_rounds.get(priority, 0), turn)
+                self._queued -= 1
+                self._running += 1
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+            context.run(tracer.record, "queue_wait", waited)
+            started = time.perf_counter()
+            try:
+                result = context.run(fn, *args, **kwargs)
+            except BaseException as e:
+                outcome = "_failed"
+                future.set_exception(e)
+            else:
+                outcome = "_completed"
+                future.set_result(result)
+            with self._lock:
+                self._running -= 1
+                self._total_run += time.perf_counter() - started
+                setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self):
+        with self._lock:
+            started = self._completed + self._failed + self._running
+            finished = self._completed + self._failed
+            by_priority = {}
+            for entry in self._heap:
+                if not entry[4].cancelled():
+                    by_priority[entry[0]] = by_priority.get(entry[0], 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._queued,
+                "queued_by_priority": by_priority,
+                "in_flight": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_wait_seconds": round(self._total_wait / started, 4) if started else 0.0,
+                "max_wait_seconds": round(self._max_wait, 4),
+                "avg_run_seconds": round(self._total_run / finished, 4) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            pending, self._heap = self._heap, []
+            self._ready.notify_all()
+        for entry in pending:
+            entry[4].cancel()
+
+
+executor = CrewExecutor()
+
+__all__ = ["BACKGROUND", "BATCH", "CrewExecutor", "INTERACTIVE", "NORMAL", "QueueFull", "executor"]
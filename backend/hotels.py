@@ -0,0 +1,183 @@
+# hotels.py
+
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+from budget_engine import LODGING, budget_engine, city_profile, format_inr, parse_money
+from knowledge import find_coordinates, knowledge_base, normalize_name
+from scheduling import distance_matrix
+
+HOTELS_PER_TIER = int(os.getenv("TOURMUSE_HOTELS_PER_TIER", "5"))
+TIERS = ("budget_hotels", "mid_range_hotels", "luxury_hotels")
+# Score weights; "eco" only counts for eco-friendly trips.
+WEIGHTS = {"price": 0.4, "rating": 0.3, "distance": 0.3, "eco": 0.3}
+# km from the day's stops at which the distance score halves.
+DISTANCE_SCALE = 3.0
+ECO_WORDS = ("eco", "green", "sustainab", "solar", "leed", "organic", "carbon")
+
+
+def tier_bounds(location):
+    """Nightly prices in INR separating budget / mid-range / luxury in ``location``."""
+    index, _ = city_profile(location)
+    return np.sqrt([LODGING["budget"] * LODGING["mid_range"], LODGING["mid_range"] * LODGING["luxury"]]) * index
+
+
+def is_eco(hotel):
+    flag = hotel.get("eco", hotel.get("eco_friendly"))
+    if flag is not None:
+        return bool(flag)
+    text = " ".join(str(hotel.get(key) or "") for key in ("name", "description", "amenities", "notes")).lower()
+    return any(word in text for word in ECO_WORDS)
+
+
+class CityHotels:
+    """One city's candidates as arrays: coordinates, nightly price in INR, rating and eco flag."""
+
+    def __init__(self, location, rows):
+        _, currency = city_profile(location)
+        self.records = []
+        self.points = np.full((len(rows), 2), np.nan)
+        self.prices = np.full(len(rows), np.nan)
+        self.ratings = np.full(len(rows), np.nan)
+        self.eco = np.zeros(len(rows), dtype=bool)
+        # Stated tier, for candidates without a price.
+        self.tiers = np.full(len(rows), TIERS.index("mid_range_hotels"))
+        for i, (name, lat, lon, price, rating, eco, data) in enumerate(rows):
+            details = json.loads(data)
+            self.records.append({**details, "name": name})
+            if lat is not None and lon is not None:
+                self.points[i] = (lat, lon)
+            if price is not None:
+                self.prices[i] = parse_money(price, currency) or np.nan
+            if rating is not None:
+                self.ratings[i] = rating
+            self.eco[i] = bool(eco)
+            if details.get("tier") in TIERS:
+                self.tiers[i] = TIERS.index(details["tier"])
+        priced = ~np.isnan(self.prices)
+        self.tiers[priced] = np.digitize(self.prices[priced], tier_bounds(location))
+
+
+class HotelRanker:
+    """Recommends hotels by tier from the knowledge base's candidates for a city.
+
+    Every candidate is scored at once on price against the nightly allowance
+    the budget engine leaves for lodging, rating, distance to each itinerary
+    day's stops and, for eco-friendly trips, its eco flag; the best of each
+    price tier are returned. Unknown values score as average. A city's arrays
+    are rebuilt only after its candidates change.
+    """
+
+    def __init__(self, knowledge=knowledge_base, per_tier=HOTELS_PER_TIER):
+        self.knowledge = knowledge
+        self.per_tier = per_tier
+        self.rankings = 0
+        self.misses = 0
+        self.ingested = 0
+        self._cities = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, location):
+        key = normalize_name(location)
+        revision = self.knowledge.hotel_revision
+        with self._lock:
+            cached = self._cities.get(key)
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+        rows = self.knowledge.hotels(location)
+        hotels = CityHotels(location, rows) if rows else None
+        with self._lock:
+            self._cities[key] = (revision, hotels)
+        return hotels
+
+    def day_centroids(self, location, days):
+        """Mean coordinates of each itinerary day's located stops, as a ``(k, 2)`` array."""
+        centroids = []
+        for day in days or []:
+            points = [
+                find_coordinates(slot) or self.knowledge.coordinates(location, slot.get("place") or "")
+                for slot in day.get("slots") or [] if isinstance(slot, dict)
+            ]
+            points = [point for point in points if point is not None]
+            if points:
+                centroids.append(np.mean(points, axis=0))
+        return np.array(centroids).reshape(-1, 2)
+
+    def allowance(self, location, n_days, budget, days, eco_friendly, travel_style):
+        """Nightly lodging budget in INR: the engine's lodging choice plus whatever the budget leaves over."""
+        plan = budget_engine.optimize(location, n_days, budget, days, eco_friendly=eco_friendly,
+                                      travel_style=travel_style)
+        nights = max(n_days - 1, 1)
+        return plan["per_day"][0]["Accommodation"] + max(budget - plan["total_inr"], 0.0) / nights
+
+    def rank(self, location, n_days, budget, days=None, eco_friendly=False, travel_style=""):
+        """Hotels by tier as a crew-style answer, or ``None`` when ``location`` has no candidates."""
+        hotels = self.candidates(location)
+        if hotels is None:
+            self.misses += 1
+            return None
+        allowance = self.allowance(location, n_days, budget, days, eco_friendly, travel_style)
+
+        price = np.where(np.isnan(hotels.prices), 0.5, np.minimum(1.0, allowance / hotels.prices) ** 2)
+        rating = np.where(np.isnan(hotels.ratings), 0.5, np.clip((hotels.ratings - 2.5) / 2.5, 0.0, 1.0))
+        distance_km = np.full(len(hotels.records), np.nan)
+        centroids = self.day_centroids(location, days)
+        located = ~np.isnan(hotels.points[:, 0])
+        if len(centroids) and located.any():
+            distance_km[located] = distance_matrix(hotels.points[located], centroids).mean(axis=1)
+        distance = np.where(np.isnan(distance_km), 0.5, 1.0 / (1.0 + distance_km / DISTANCE_SCALE))
+        score = WEIGHTS["price"] * price + WEIGHTS["rating"] * rating + WEIGHTS["distance"] * distance
+        if eco_friendly:
+            score = score + WEIGHTS["eco"] * hotels.eco
+
+        tiers = {}
+        for tier, name in enumerate(TIERS):
+            members = np.flatnonzero(hotels.tiers == tier)
+            best = members[np.argsort(-score[members], kind="stable")][:self.per_tier]
+            tiers[name] = [self._hotel(hotels, i, score, distance_km) for i in best]
+        self.rankings += 1
+        return {"raw": json.dumps(tiers, ensure_ascii=False), "json": tiers, "token_usage": None,
+                "allowance_per_night": format_inr(allowance)}
+
+    @staticmethod
+    def _hotel(hotels, i, score, distance_km):
+        hotel = {key: value for key, value in hotels.records[i].items() if key != "tier"}
+        if not math.isnan(hotels.prices[i]):
+            hotel.setdefault("price", format_inr(hotels.prices[i]))
+            hotel["price_inr"] = round(float(hotels.prices[i]), 2)
+        if not math.isnan(hotels.ratings[i]):
+            hotel["rating"] = float(hotels.ratings[i])
+        if not math.isnan(hotels.points[i, 0]):
+            hotel["lat"], hotel["lon"] = map(float, hotels.points[i])
+        if not math.isnan(distance_km[i]):
+            hotel["distance_km"] = round(float(distance_km[i]), 2)
+        hotel["eco"] = bool(hotels.eco[i])
+        hotel["score"] = round(float(score[i]), 4)
+        return hotel
+
+    def ingest(self, location, tiers, source="crew"):
+        """Store the hotel crew's tiered answer as candidates for ``location``; returns how many were kept."""
+        candidates = []
+        for tier in TIERS:
+            for hotel in (tiers or {}).get(tier) or []:
+                if not isinstance(hotel, dict) or not hotel.get("name"):
+                    continue
+                price = next((hotel[key] for key in ("price", "price_per_night", "cost") if key in hotel), None)
+                candidates.append({"name": hotel["name"], "details": {**hotel, "tier": tier}, "price": price,
+                                   "rating": hotel.get("rating"), "eco": is_eco(hotel)})
+        self.knowledge.put_hotels(location, candidates, source=source)
+        self.ingested += len(candidates)
+        return len(candidates)
+
+    def stats(self):
+        return {"rankings": self.rankings, "misses": self.misses, "ingested": self.ingested,
+                "cities_loaded": len(self._cities)}
+
+
+hotel_ranker = HotelRanker()
+
+__all__ = ["CityHotels", "HotelRanker", "hotel_ranker", "is_eco", "tier_bounds"]
@@ -0,0 +1,243 @@
+# intent.py
+
+import json
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import Literal, Optional
+
+from pydantic import BaseModel, ValidationError, model_validator
+
+MOOD_KEYWORDS = {
+    "relax": ("relax", "chill", "leisure", "beach", "spa", "slow", "peaceful", "luxury"),
+    "adventure": ("adventure", "hike", "hiking", "trek", "thrill", "outdoor", "explore", "backpack"),
+    "culture": ("culture", "cultural", "museum", "history", "historic", "heritage", "art", "food"),
+}
+
+DATE_FORMATS = (
+    "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y",
+    "%d %b %Y", "%d %B %Y", "%b %d %Y", "%B %d %Y",
+)
+
+_DATE = (
+    r"\d{4}-\d{2}-\d{2}(?:T[\d:.]+Z?)?"
+    r"|\d{1,2}[/.-]\d{1,2}[/.-]\d{4}"
+    r"|\d{1,2}\s+[A-Za-z]{3,9},?\s+\d{4}"
+    r"|[A-Za-z]{3,9}\s+\d{1,2},?\s+\d{4}"
+)
+_DATE_RANGE = re.compile(rf"(?P<start>{_DATE})\s*(?:-|–|to|until|till)\s*(?P<end>{_DATE})", re.IGNORECASE)
+_ANY_DATE = re.compile(_DATE)
+_DURATION = re.compile(r"(?:for\s+)?(\d{1,2})\s*(?:days?|nights?)\b", re.IGNORECASE)
+_BUDGET = re.compile(
+    r"(?:budget\s*(?:of|is|:)?\s*)?(?P<cur>₹|rs\.?|inr|\$|usd|€|eur)?\s*"
+    r"(?P<amount>\d[\d,]*(?:\.\d+)?)\s*(?P<mult>k|l|lakh|lakhs)?\b\s*(?P<cur2>inr|rupees|usd|dollars|eur)?",
+    re.IGNORECASE,
+)
+_DESTINATION = re.compile(
+    r"(?:destination\s*[:=]\s*|location\s*[:=]\s*|\b(?:trip|travel|going|fly|flying|holiday|vacation)\s+to\s+|\bvisit(?:ing)?\s+|\bto\s+)"
+    r"(?P<place>[A-Z][\w'.-]*(?:[ -][A-Z][\w'.-]*)*)"
+)
+_KEY_VALUE = re.compile(r"^\s*([A-Za-z_ ]+?)\s*[:=]\s*(.+?)\s*$")
+
+# Aliases the frontend form and near-structured text use for each intent field.
+FIELD_ALIASES = {
+    "destination": ("destination", "location", "city", "place"),
+    "start_date": ("start_date", "startdate", "start", "from", "departure"),
+    "end_date": ("end_date", "enddate", "end", "to", "return"),
+    "budget": ("budget", "max_budget", "amount"),
+    "mood": ("mood", "travelstyle", "travel_style", "style"),
+    "eco_friendly": ("eco_friendly", "ecofriendly", "eco"),
+    "dynamic_replanning": ("dynamic_replanning", "dynamicreplanning", "replanning"),
+}
+
+_TRUE = {"true", "yes", "y", "1", "on"}
+
+
+class TripIntent(BaseModel):
+    destination: str
+    start_date: date
+    end_date: date
+    budget: Optional[float] = None
+    currency: str = "INR"
+    mood: Optional[Literal["relax", "adventure", "culture"]] = None
+    eco_friendly: bool = False
+    dynamic_replanning: bool = False
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        if self.end_date < self.start_date:
+            raise ValueError("end_date is before start_date")
+        return self
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = re.sub(r"\s+", " ", str(value).replace(",", "")).strip()
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).date()
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_mood(value):
+    text = str(value or "").lower()
+    for mood, keywords in MOOD_KEYWORDS.items():
+        if any(keyword in text for keyword in keywords):
+            return mood
+    return None
+
+
+def parse_budget(text):
+    for match in _BUDGET.finditer(text):
+        if _ANY_DATE.search(match.group(0)):
+            continue
+        has_marker = match.group("cur") or match.group("cur2") or match.group("mult") or "budget" in match.group(0).lower()
+        if not has_marker:
+            continue
+        amount = float(match.group("amount").replace(",", ""))
+        mult = (match.group("mult") or "").lower()
+        if mult == "k":
+            amount *= 1_000
+        elif mult.startswith("l"):
+            amount *= 100_000
+        currency = (match.group("cur") or match.group("cur2") or "inr").lower().rstrip(".")
+        currency = {"₹": "INR", "rs": "INR", "rupees": "INR", "$": "USD", "dollars": "USD", "€": "EUR"}.get(
+            currency, currency.upper()
+        )
+        return amount, currency
+    return None, "INR"
+
+
+def _normalize(fields):
+    normalized = {}
+    for key, value in fields.items():
+        name = re.sub(r"[\s-]", "_", str(key).strip().lower())
+        for field, aliases in FIELD_ALIASES.items():
+            if name in aliases or name.replace("_", "") in aliases:
+                normalized.setdefault(field, value)
+    return normalized
+
+
+def _from_fields(fields):
+    fields = _normalize(fields)
+    if not {"destination", "start_date", "end_date"} <= fields.keys():
+        return None
+    budget, currency = fields.get("budget"), "INR"
+    if isinstance(budget, str) and budget.strip():
+        # A form's budget field needs no marker: "50,000", "1,00,000", "50k", "€2000".
+        plain = re.sub(r"[\s,]", "", budget)
+        if re.fullmatch(r"\d+(?:\.\d+)?", plain):
+            budget = float(plain)
+        else:
+            budget, currency = parse_budget(f"budget {budget}")
+            if budget is None:
+                # Unreadable here; let the intent crew interpret it.
+                return None
+    elif isinstance(budget, str):
+        budget = None
+    return {
+        "destination": str(fields["destination"]).strip(),
+        "start_date": parse_date(fields["start_date"]),
+        "end_date": parse_date(fields["end_date"]),
+        "budget": budget,
+        "currency": currency,
+        "mood": parse_mood(fields.get("mood")),
+        "eco_friendly": str(fields.get("eco_friendly", "")).strip().lower() in _TRUE,
+        "dynamic_replanning": str(fields.get("dynamic_replanning", "")).strip().lower() in _TRUE,
+    }
+
+
+def _from_text(text):
+    destination = _DESTINATION.search(text)
+    if not destination:
+        return None
+    dates = _DATE_RANGE.search(text)
+    if dates:
+        start, end = parse_date(dates.group("start")), parse_date(dates.group("end"))
+    else:
+        found = _ANY_DATE.findall(text)
+        duration = _DURATION.search(text)
+        if not found or not duration:
+            return None
+        start = parse_date(found[0])
+        end = start + timedelta(days=int(duration.group(1)) - 1) if start else None
+    budget, currency = parse_budget(_DATE_RANGE.sub(" ", text))
+    lowered = text.lower()
+    return {
+        "destination": destination.group("place").strip(),
+        "start_date": start,
+        "end_date": end,
+        "budget": budget,
+        "currency": currency,
+        "mood": parse_mood(lowered),
+        "eco_friendly": bool(re.search(r"\beco|sustainab|green", lowered)),
+        "dynamic_replanning": "replan" in lowered,
+    }
+
+
+class IntentParser:
+    """Rule-based intent extraction for structured and near-structured input.
+
+    Handles form dicts, JSON strings, ``key: value`` lines and short sentences
+    like "trip to Paris 2025-03-01 to 2025-03-05, budget ₹80k, culture".
+    Anything it cannot turn into a valid ``TripIntent`` returns ``None`` so the
+    caller can fall back to ``intent_agent``.
+    """
+
+    def __init__(self):
+        self.fast_path = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def _candidate(self, data):
+        if isinstance(data, dict):
+            return _from_fields(data)
+        text = str(data or "").strip()
+        if text.startswith("{"):
+            try:
+                return _from_fields(json.loads(text))
+            except ValueError:
+                pass
+        pairs = [m.groups() for m in map(_KEY_VALUE.match, re.split(r"[\n;]", text)) if m]
+        if len(pairs) >= 3:
+            candidate = _from_fields(dict(pairs))
+            if candidate:
+                return candidate
+        return _from_text(text)
+
+    def parse(self, data):
+        candidate = self._candidate(data)
+        intent = None
+        if candidate and candidate["start_date"] and candidate["end_date"]:
+            try:
+                intent = TripIntent(**candidate)
+            except ValidationError:
+                intent = None
+        with self._lock:
+            if intent is None:
+                self.fallbacks += 1
+            else:
+                self.fast_path += 1
+        return intent
+
+    def stats(self):
+        total = self.fast_path + self.fallbacks
+        return {
+            "fast_path": self.fast_path,
+            "fallbacks": self.fallbacks,
+            "fast_path_rate": round(self.fast_path / total, 4) if total else 0.0,
+        }
+
+
+intent_parser = IntentParser()
+
+__all__ = ["IntentParser", "TripIntent", "intent_parser", "parse_date"]
@@ -0,0 +1,119 @@
+# jobs.py
+
+import asyncio
+import os
+import time
+import uuid
+
+
+class TooManyJobs(Exception):
+    """Raised when a user already has ``max_per_user`` unfinished jobs."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many unfinished jobs, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, kind, user_id):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.error_status = None
+        self.task = None
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "user_id": self.user_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Runs long requests in the background and keeps their results for polling.
+
+    Each job wraps one endpoint coroutine, so it goes through the same crew
+    scheduler as a direct call. A user may have at most ``max_per_user``
+    unfinished jobs; finished jobs are dropped ``ttl`` seconds after they end.
+    """
+
+    def __init__(self, max_per_user=None, ttl=None):
+        self.max_per_user = max_per_user or int(os.getenv("TOURMUSE_MAX_JOBS_PER_USER", "3"))
+        self.ttl = ttl or int(os.getenv("TOURMUSE_JOB_TTL", "3600"))
+        self._jobs = {}
+        self.submitted = 0
+        self.rejected = 0
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j.id for j in self._jobs.values() if j.done and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, kind, user_id, fn, *args, **kwargs):
+        """Start ``fn(*args, **kwargs)`` as a background job and return it."""
+        self._purge()
+        active = sum(1 for j in self._jobs.values() if j.user_id == user_id and not j.done)
+        if active >= self.max_per_user:
+            self.rejected += 1
+            raise TooManyJobs(retry_after=5)
+        job = Job(kind, user_id)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, fn, *args, **kwargs))
+        self.submitted += 1
+        return job
+
+    async def _run(self, job, fn, *args, **kwargs):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = await fn(*args, **kwargs)
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            # Endpoint coroutines raise HTTPException; keep its status and detail.
+            job.status = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+            job.error_status = getattr(e, "status_code", 500)
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None and not job.done:
+            job.task.cancel()
+            if job.started_at is None:
+                # A task cancelled before its first step never enters _run.
+                job.status = "cancelled"
+                job.finished_at = time.time()
+        return job
+
+    def stats(self):
+        statuses = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"submitted": self.submitted, "rejected": self.rejected, "jobs": statuses}
+
+
+job_manager = JobManager()
+
+__all__ = ["Job", "JobManager", "TooManyJobs", "job_manager"]
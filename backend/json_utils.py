@@ -0,0 +1,157 @@
+# json_utils.py
+
+import json
+import re
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+
+def strip_code_fences(text):
+    return _FENCE.sub("", text or "")
+
+
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_SMART_QUOTES = str.maketrans({"\u201c": '"', "\u201d": '"'})
+
+
+def _scan(text):
+    """Return the open-container stack, whether we end inside a string, and the
+    end offset of the first complete top-level value (or None)."""
+    stack, in_string, escape = [], False, False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "[{":
+            stack.append("]" if ch == "[" else "}")
+        elif ch in "]}":
+            if stack:
+                stack.pop()
+            if not stack:
+                return stack, False, i + 1
+    return stack, in_string, None
+
+
+def _close(text):
+    stack, in_string, _ = _scan(text)
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",").rstrip()
+    if text.endswith(":"):
+        text += " null"
+    return _TRAILING_COMMA.sub(r"\1", text + "".join(reversed(stack)))
+
+
+def _last_cut(text):
+    """Offset of the last comma outside a string, where a truncated value can be dropped."""
+    in_string, escape, cut = False, False, None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == ",":
+            cut = i
+    return cut
+
+
+def repair_json(text, max_cuts=8):
+    """Salvage JSON from model output without another model call.
+
+    Handles code fences, prose around the JSON, smart quotes, trailing commas and
+    output truncated mid-value (the incomplete tail is dropped and the open
+    containers are closed). Returns ``(data, repaired)`` and raises ``ValueError``
+    when nothing parseable can be recovered.
+    """
+    cleaned = strip_code_fences(text).strip()
+    try:
+        return json.loads(cleaned), False
+    except ValueError:
+        pass
+    starts = [i for i in (cleaned.find("{"), cleaned.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("no JSON found in model output")
+    body = _TRAILING_COMMA.sub(r"\1", cleaned[min(starts):].translate(_SMART_QUOTES))
+    _, _, end = _scan(body)
+    if end is not None:
+        body = body[:end]
+    for _ in range(max_cuts + 1):
+        try:
+            return json.loads(_close(body)), True
+        except ValueError:
+            cut = _last_cut(body)
+            if cut is None:
+                break
+            body = body[:cut]
+    raise ValueError("could not repair JSON in model output")
+
+
+class ArrayItemParser:
+    """Pulls complete objects out of a JSON array while it is still streaming.
+
+    The first ``[`` in the text opens the array (so ``{"days": [...]}`` works as
+    well as a bare list); each ``{...}`` directly inside it is parsed as soon as
+    its closing brace arrives.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._array_depth = None
+        self._item_start = None
+        self._closed = False
+        self._in_string = False
+        self._escape = False
+
+    def _in_array(self):
+        return self._array_depth is not None and not self._closed
+
+    def feed(self, chunk):
+        self._text += chunk
+        items = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+                if ch == "[" and self._array_depth is None:
+                    self._array_depth = self._depth
+                elif ch == "{" and self._in_array() and self._depth == self._array_depth + 1:
+                    self._item_start = i
+            elif ch in "]}":
+                if ch == "}" and self._item_start is not None and self._depth == self._array_depth + 1:
+                    try:
+                        items.append(json.loads(text[self._item_start:i + 1]))
+                    except ValueError:
+                        pass
+                    self._item_start = None
+                if ch == "]" and self._depth == self._array_depth:
+                    self._closed = True
+                self._depth -= 1
+        self._pos = len(text)
+        return items
+
+
+__all__ = ["ArrayItemParser", "repair_json", "strip_code_fences"]
@@ -0,0 +1,359 @@
+# knowledge.py
+"""Local knowledge base of place details, city guides and hotel candidates.
+
+Answers from the place and city guide crews are kept in SQLite, indexed by
+city, normalized place name (with an FTS5 index for name variants) and geo
+cell, so repeat questions are served without a model call. Hotels are kept
+as per-city candidates for hotels.py to rank. Entries can also be
+bulk-imported from JSON or JSONL files:
+
+    python knowledge.py import places.jsonl
+    python knowledge.py stats
+
+Each record is ``{"type": "place", "city": ..., "name": ..., "lat": ..., "lon": ...,
+"details": {...}}``, ``{"type": "city", "city": ..., "details": {...}}`` or
+``{"type": "hotel", "city": ..., "name": ..., "lat": ..., "lon": ..., "price": ...,
+"rating": ..., "eco": ..., "details": {...}}`` (``price`` per night, as a number
+in the city's currency or text such as "€120"; ``eco`` true or a list of
+certifications).
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+KNOWLEDGE_PATH = os.getenv("TOURMUSE_KNOWLEDGE_PATH", "tourmuse_knowledge.sqlite3")
+PLACE_TTL = int(os.getenv("TOURMUSE_KNOWLEDGE_PLACE_TTL", str(30 * 86400)))
+CITY_TTL = int(os.getenv("TOURMUSE_KNOWLEDGE_CITY_TTL", str(30 * 86400)))
+HOTEL_TTL = int(os.getenv("TOURMUSE_KNOWLEDGE_HOTEL_TTL", str(30 * 86400)))
+# Degrees per geo cell side; 0.01° is about 1 km.
+CELL_SIZE = 0.01
+
+_NON_WORD = re.compile(r"[^\w]+")
+_ARTICLES = {"the", "a", "an"}
+# Words that name a kind of place rather than a place: "Louvre" may drop "Museum",
+# but "Park" alone doesn't identify "Central Park".
+GENERIC_WORDS = {
+    "art", "basilica", "beach", "bridge", "castle", "cathedral", "church", "fort", "fortress", "gallery",
+    "garden", "gardens", "gate", "hill", "lake", "market", "memorial", "monument", "mosque", "museum",
+    "national", "of", "palace", "park", "square", "station", "temple", "tower", "zoo",
+    # "Musée du Louvre", "Museo del Prado"
+    "de", "del", "des", "di", "du", "musee", "museo", "museu",
+}
+
+
+def normalize_name(name):
+    """``"The Musée d'Orsay"`` -> ``"musee d orsay"``."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    words = _NON_WORD.sub(" ", text).split()
+    while len(words) > 1 and words[0] in _ARTICLES:
+        words = words[1:]
+    return " ".join(words)
+
+
+def same_place(name, other):
+    """Whether two names can mean the same place: one contains the other, they share a
+    word that isn't generic, and the longer adds only generic ones ("Louvre" / "Louvre Museum")."""
+    words, others = set(normalize_name(name).split()), set(normalize_name(other).split())
+    shared = words & others
+    return (bool(shared - GENERIC_WORDS) and len(shared) == min(len(words), len(others))
+            and (words ^ others) <= GENERIC_WORDS)
+
+
+def geo_cell(lat, lon, size=CELL_SIZE):
+    return f"{math.floor(lat / size)}:{math.floor(lon / size)}"
+
+
+def find_coordinates(data):
+    """``(lat, lon)`` from a place answer's JSON, wherever the model put them."""
+    if not isinstance(data, dict):
+        return None
+    lat = next((data[k] for k in ("lat", "latitude") if k in data), None)
+    lon = next((data[k] for k in ("lon", "lng", "longitude") if k in data), None)
+    try:
+        if lat is not None and lon is not None:
+            return float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    for value in data.values():
+        if isinstance(value, dict):
+            point = find_coordinates(value)
+            if point is not None:
+                return point
+    return None
+
+
+def as_answer(details):
+    """Wrap imported details in the shape crew results are returned in."""
+    return {"raw": json.dumps(details, ensure_ascii=False), "json": details, "token_usage": None}
+
+
+class KnowledgeBase:
+    """SQLite store of place and city answers.
+
+    An entry is fresh for ``place_ttl``/``city_ttl`` seconds after it was
+    written. Entries written from crew output carry the crew's prompt version
+    and are ignored once the prompt changes; imported entries have none and
+    stay valid until they expire.
+    """
+
+    def __init__(self, path=KNOWLEDGE_PATH, place_ttl=PLACE_TTL, city_ttl=CITY_TTL, hotel_ttl=HOTEL_TTL):
+        self.path = path
+        self.place_ttl = place_ttl
+        self.city_ttl = city_ttl
+        self.hotel_ttl = hotel_ttl
+        # Bumped on every hotel write, so rankers know when to reload a city.
+        self.hotel_revision = 0
+        self.lookups = 0
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.stores = 0
+        # Places stored without coordinates; the scheduler and hotel ranker can't use them.
+        self.unlocated_stores = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS places ("
+            " id INTEGER PRIMARY KEY, city TEXT NOT NULL, name TEXT NOT NULL, name_key TEXT NOT NULL,"
+            " lat REAL, lon REAL, geo_cell TEXT, data TEXT NOT NULL, version TEXT,"
+            " source TEXT NOT NULL, updated_at REAL NOT NULL, UNIQUE (city, name_key));"
+            "CREATE INDEX IF NOT EXISTS places_geo ON places(geo_cell);"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS places_fts USING fts5("
+            " name_key, content='places', content_rowid='id', tokenize='unicode61 remove_diacritics 2');"
+            "CREATE TRIGGER IF NOT EXISTS places_ai AFTER INSERT ON places BEGIN"
+            " INSERT INTO places_fts(rowid, name_key) VALUES (new.id, new.name_key); END;"
+            "CREATE TRIGGER IF NOT EXISTS places_ad AFTER DELETE ON places BEGIN"
+            " INSERT INTO places_fts(places_fts, rowid, name_key) VALUES ('delete', old.id, old.name_key); END;"
+            "CREATE TRIGGER IF NOT EXISTS places_au AFTER UPDATE ON places BEGIN"
+            " INSERT INTO places_fts(places_fts, rowid, name_key) VALUES ('delete', old.id, old.name_key);"
+            " INSERT INTO places_fts(rowid, name_key) VALUES (new.id, new.name_key); END;"
+            "CREATE TABLE IF NOT EXISTS cities ("
+            " city TEXT PRIMARY KEY, name TEXT NOT NULL, data TEXT NOT NULL, version TEXT,"
+            " source TEXT NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS hotels ("
+            " city TEXT NOT NULL, name TEXT NOT NULL, name_key TEXT NOT NULL, lat REAL, lon REAL,"
+            " price TEXT, rating REAL, eco INTEGER NOT NULL, data TEXT NOT NULL, source TEXT NOT NULL,"
+            " updated_at REAL NOT NULL, PRIMARY KEY (city, name_key));"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _valid(version, wanted):
+        return version is None or wanted is None or version == wanted
+
+    def place(self, city, name, version=None):
+        """Fresh answer for ``name`` in ``city``, matching name variants such as
+        "Louvre" / "Louvre Museum"; ``None`` on a miss."""
+        city_key, name_key = normalize_name(city), normalize_name(name)
+        cutoff = time.time() - self.place_ttl
+        self.lookups += 1
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, version, lat, lon FROM places WHERE city = ? AND name_key = ? AND updated_at >= ?",
+                (city_key, name_key, cutoff),
+            ).fetchone()
+            fuzzy = False
+            if row is None or not self._valid(row[1], version):
+                row, fuzzy = self._fuzzy_place(city_key, name_key, cutoff, version), True
+        if row is None:
+            return None
+        self.hits += 1
+        self.fuzzy_hits += int(fuzzy)
+        return json.loads(row[0])
+
+    def _fuzzy_place(self, city_key, name_key, cutoff, version):
+        words = set(name_key.split())
+        if not words:
+            return None
+        query = " OR ".join(f'"{word}"' for word in words)
+        rows = self._conn.execute(
+            "SELECT p.name_key, p.data, p.version, p.lat, p.lon FROM places_fts f JOIN places p ON p.id = f.rowid"
+            " WHERE places_fts MATCH ? AND p.city = ? AND p.updated_at >= ? ORDER BY f.rank LIMIT 8",
+            (query, city_key, cutoff),
+        ).fetchall()
+        for candidate, *row in rows:
+            if same_place(name_key, candidate) and self._valid(row[1], version):
+                return row
+        return None
+
+    def put_place(self, city, name, answer, point=None, version=None, source="crew", updated_at=None):
+        point = point or find_coordinates(answer.get("json") if isinstance(answer, dict) else None)
+        lat, lon = point if point else (None, None)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO places (city, name, name_key, lat, lon, geo_cell, data, version, source, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (city, name_key) DO UPDATE SET"
+                " name = excluded.name, lat = COALESCE(excluded.lat, lat), lon = COALESCE(excluded.lon, lon),"
+                " geo_cell = COALESCE(excluded.geo_cell, geo_cell), data = excluded.data,"
+                " version = excluded.version, source = excluded.source, updated_at = excluded.updated_at",
+                (normalize_name(city), name, normalize_name(name), lat, lon,
+                 geo_cell(lat, lon) if point else None, json.dumps(answer, ensure_ascii=False),
+                 version, source, updated_at or time.time()),
+            )
+            self._conn.commit()
+        self.stores += 1
+        self.unlocated_stores += int(not point)
+
+    def coordinates(self, city, name):
+        """``(lat, lon)`` of a known place, however old its answer is; ``None`` if unknown."""
+        city_key, name_key = normalize_name(city), normalize_name(name)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, version, lat, lon FROM places WHERE city = ? AND name_key = ?", (city_key, name_key)
+            ).fetchone() or self._fuzzy_place(city_key, name_key, 0, None)
+        return (row[2], row[3]) if row is not None and row[2] is not None else None
+
+    def city(self, city, version=None):
+        """Fresh city guide answer for ``city``, or ``None``."""
+        self.lookups += 1
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, version FROM cities WHERE city = ? AND updated_at >= ?",
+                (normalize_name(city), time.time() - self.city_ttl),
+            ).fetchone()
+        if row is None or not self._valid(row[1], version):
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put_city(self, city, answer, version=None, source="crew", updated_at=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cities (city, name, data, version, source, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_name(city), city, json.dumps(answer, ensure_ascii=False),
+                 version, source, updated_at or time.time()),
+            )
+            self._conn.commit()
+        self.stores += 1
+
+    def hotels(self, city):
+        """Fresh hotel candidates for ``city`` as ``(name, lat, lon, price, rating, eco, data)`` rows."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT name, lat, lon, price, rating, eco, data FROM hotels WHERE city = ? AND updated_at >= ?",
+                (normalize_name(city), time.time() - self.hotel_ttl),
+            ).fetchall()
+
+    def put_hotel(self, city, name, details, point=None, price=None, rating=None, eco=False,
+                  source="crew", updated_at=None):
+        self.put_hotels(city, [{"name": name, "details": details, "point": point, "price": price,
+                                "rating": rating, "eco": eco}], source=source, updated_at=updated_at)
+
+    def put_hotels(self, city, hotels, source="crew", updated_at=None):
+        """Store ``{"name", "details", "point", "price", "rating", "eco"}`` candidates in one transaction."""
+        rows = []
+        for hotel in hotels:
+            point = hotel.get("point") or find_coordinates(hotel["details"])
+            lat, lon = point if point else (None, None)
+            try:
+                rating = float(hotel["rating"]) if hotel.get("rating") is not None else None
+            except (TypeError, ValueError):
+                rating = None
+            price = hotel.get("price")
+            rows.append((normalize_name(city), hotel["name"], normalize_name(hotel["name"]), lat, lon,
+                         None if price is None else str(price), rating, int(bool(hotel.get("eco"))),
+                         json.dumps(hotel["details"], ensure_ascii=False), source, updated_at or time.time()))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO hotels (city, name, name_key, lat, lon, price, rating, eco, data, source, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self.hotel_revision += 1
+        self.stores += len(rows)
+
+    def import_records(self, records):
+        """Store ``{"type": "place"|"city"|"hotel", ...}`` records; returns counts by type."""
+        counts = {"place": 0, "city": 0, "hotel": 0, "skipped": 0}
+        for record in records:
+            kind = record.get("type")
+            # Hotel records are usable from their own fields alone.
+            details = record.get("details", {} if kind == "hotel" else None)
+            if not record.get("city") or not isinstance(details, dict):
+                counts["skipped"] += 1
+            elif kind == "place" and record.get("name"):
+                point = (record["lat"], record["lon"]) if record.get("lat") is not None else None
+                self.put_place(record["city"], record["name"], as_answer(details), point=point,
+                               source="import", updated_at=record.get("updated_at"))
+                counts["place"] += 1
+            elif kind == "city":
+                self.put_city(record["city"], as_answer(details), source="import",
+                              updated_at=record.get("updated_at"))
+                counts["city"] += 1
+            elif kind == "hotel" and record.get("name"):
+                point = (record["lat"], record["lon"]) if record.get("lat") is not None else None
+                self.put_hotel(record["city"], record["name"], details, point=point, price=record.get("price"),
+                               rating=record.get("rating"), eco=record.get("eco"), source="import",
+                               updated_at=record.get("updated_at"))
+                counts["hotel"] += 1
+            else:
+                counts["skipped"] += 1
+        return counts
+
+    def import_file(self, path):
+        text = Path(path).read_text(encoding="utf-8")
+        if str(path).endswith(".jsonl"):
+            records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            records = json.loads(text)
+            records = records if isinstance(records, list) else [records]
+        return self.import_records(records)
+
+    def stats(self):
+        with self._lock:
+            places = self._conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+            cities = self._conn.execute("SELECT COUNT(*) FROM cities").fetchone()[0]
+            hotels = self._conn.execute("SELECT COUNT(*) FROM hotels").fetchone()[0]
+        return {
+            "places": places,
+            "cities": cities,
+            "hotels": hotels,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "stores": self.stores,
+            "unlocated_stores": self.unlocated_stores,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+knowledge_base = KnowledgeBase()
+
+__all__ = ["KnowledgeBase", "find_coordinates", "geo_cell", "knowledge_base", "normalize_name", "same_place"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="bulk-import JSON or JSONL files")
+    importer.add_argument("files", nargs="+")
+    commands.add_parser("stats")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        for path in args.files:
+            print(f"{path}: {knowledge_base.import_file(path)}")
+    print(json.dumps(knowledge_base.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,210 @@
 # main.py
 
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
+from pydantic import BaseModel, ValidationError
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from pathlib import Path
+import os
 import uuid
 import json
-from collections import defaultdict
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 
-# user_id -> context dict
-user_context = defaultdict(dict)
+from crew import crew_pool, crew_fingerprint
+from json_utils import ArrayItemParser
 
-
-from crew import (
-    planner_crew, budget_crew, optimizer_crew, replanner_crew,
-    place_crew, city_guide_crew, intent_crew, eco_crew, hotel_crew, chatbot_crew
-)
+from budget_engine import budget_engine
+from cache import canonical_key, result_cache
+from context import record_turn, render_conversation, session_context, turn_context
+from executor import BACKGROUND, BATCH, INTERACTIVE, NORMAL, QueueFull, executor
+from hotels import hotel_ranker
+from schemas import output_validator
+from intent import intent_parser
+from jobs import TooManyJobs, job_manager
+from knowledge import knowledge_base
+from metrics import metrics, tracer
+from plan_store import plan_store
+from prefetch import PlacePrefetcher
+from prompts import prefix_tracker
+from routing import model_router, session_affinity
+from scheduling import itinerary_scheduler
+from replanning import PlanChange, build_window, merge_window, replanner_inputs, window_edges, window_slots
+from semantic_cache import is_general_question, semantic_cache
+from session import session_store, session_text
+from singleflight import SingleFlight
+from tools import travel_tools
 
 load_dotenv()
-app = FastAPI(title="TourMuse AI Backend")
+
+
+# Building the crews imports crewai and every agent. "background" (default)
+# does it on a thread after startup so the worker takes traffic at once,
+# "blocking" finishes it before startup completes, "off" leaves each crew to
+# be built on first use.
+WARM_UP = os.getenv("TOURMUSE_WARM_UP", "background")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARM_UP == "blocking":
+        await asyncio.to_thread(crew_pool.warm_up)
+    elif WARM_UP == "background":
+        threading.Thread(target=crew_pool.warm_up, name="crew-warm-up", daemon=True).start()
+    yield
+    await prefetcher.aclose()
+    executor.shutdown()
+    await travel_tools.aclose()
+    await semantic_cache.aclose()
+    knowledge_base.close()
+    plan_store.close()
+    tracer.close()
+
+
+app = FastAPI(title="TourMuse AI Backend", lifespan=lifespan)
+
+
+def endpoint_label(request):
+    """The path template of the route ``request`` matches (``/plans/{user_id}/{trip_id}``), keeping
+    label cardinality bounded; ``"unmatched"`` for paths no route serves."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def trace_requests(request, call_next):
+    # For streaming endpoints this span ends when the response starts.
+    endpoint = endpoint_label(request)
+    status = 500
+    try:
+        with tracer.span("request", endpoint=endpoint, method=request.method) as extra:
+            response = await call_next(request)
+            status = extra["status"] = response.status_code
+        return response
+    finally:
+        metrics.inc("tourmuse_requests_total", endpoint=endpoint, status=status)
+
+
+inflight = SingleFlight()
+
+# Crews whose output depends only on their inputs and is safe to share across users.
+CACHED_CREWS = {"planner", "budget", "hotel", "hotel_blurb", "city_guide"}
+
+
+# Scheduler priority per crew: interactive turns first, full-trip generation last.
+CREW_PRIORITY = {
+    "chatbot": INTERACTIVE,
+    "place": INTERACTIVE,
+    "intent": INTERACTIVE,
+    "planner": BATCH,
+    "replanner": BATCH,
+}
+
+
+async def fingerprint(name):
+    """``crew_fingerprint(name)``, building the crew off the event loop if this is its first use."""
+    if not crew_pool.built(name):
+        # The first build imports crewai and the agents, which takes seconds.
+        await asyncio.to_thread(crew_pool.prototype, name)
+    return crew_fingerprint(name)
+
+
+async def cache_key(name, inputs):
+    if name not in CACHED_CREWS:
+        return None
+    return result_cache.make_key(name, inputs, **await fingerprint(name))
+
+
+async def _generate(name, inputs, key, user, priority):
+    with tracer.span("crew", crew=name):
+        result = await executor.run(
+            crew_pool.kickoff, name, inputs,
+            priority=CREW_PRIORITY.get(name, NORMAL) if priority is None else priority, user=user,
+        )
+    if key is not None:
+        result_cache.set(key, result)
+    return result
+
+
+async def run_crew(name, inputs, user=None, priority=None):
+    key = await cache_key(name, inputs)
+    if key is not None:
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
+    # Identical requests already being generated wait for that run instead of starting another.
+    # Background runs coalesce separately: a caller joining one would wait behind every queued
+    # interactive and batch job.
+    flight = canonical_key(name, inputs, "background" if priority == BACKGROUND else "")
+    return await inflight.do(flight, _generate, name, inputs, key, user, priority)
+
+
+async def stream_crew(name, inputs, user=None):
+    """Yield ``{"type": "token"}`` events while the crew generates, then the result."""
+    key = await cache_key(name, inputs)
+    cached = result_cache.get(key) if key is not None else None
+    if cached is not None:
+        yield {"type": "result", "data": cached}
+        return
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def on_chunk(text):
+        loop.call_soon_threadsafe(queue.put_nowait, text)
+
+    async def generate():
+        with tracer.span("crew", crew=name, stream=True):
+            return await executor.run(
+                crew_pool.stream, name, inputs, on_chunk, priority=CREW_PRIORITY.get(name, NORMAL), user=user
+            )
+
+    job = asyncio.ensure_future(generate())
+    job.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while (text := await queue.get()) is not None:
+            yield {"type": "token", "text": text}
+        result = await job
+    finally:
+        job.cancel()
+    if key is not None:
+        result_cache.set(key, result)
+    yield {"type": "result", "data": result}
+
+
+def http_error(e):
+    """429 with Retry-After when the scheduler refuses work, otherwise 500."""
+    if isinstance(e, (QueueFull, TooManyJobs)):
+        return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return HTTPException(status_code=500, detail=str(e))
+
+
+def admit():
+    """Refuse a request up front when the scheduler is full, before a stream's 200 response has
+    started or a fan-out has queued any work."""
+    try:
+        executor.check_capacity()
+    except QueueFull as e:
+        raise http_error(e)
+
+
+def ndjson_response(items):
+    async def lines():
+        async for item in items:
+            yield json.dumps(item, default=str) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 
 class TripRequest(BaseModel):
+    user_id: str
+    trip_id: Optional[str] = None
     location: str
     startDate: datetime
     endDate: datetime
@@ -44,6 +225,8 @@ class TripRequest(BaseModel):
         }
 
 class PlaceRequest(BaseModel):
+    user_id: str
+    trip_id: Optional[str] = None
     place_name: str
     location: str
     date: datetime
@@ -55,104 +238,659 @@ class PlaceRequest(BaseModel):
             "date": self.date.isoformat() if self.date else None
         }
 
+class ReplanRequest(BaseModel):
+    user_id: str
+    trip_id: Optional[str] = None
+    location: str
+    # Days/slots to regenerate; empty means the whole trip.
+    changes: List[PlanChange] = []
+    constraints: Optional[str] = None
+
+class IntentRequest(BaseModel):
+    user_id: str
+    # Form fields from the frontend, or free text typed by the user.
+    data: Optional[dict] = None
+    text: Optional[str] = None
+
 class ChatbotRequest(BaseModel):
     user_id: str
+    trip_id: Optional[str] = None
     message: str
+    # Destination the question is about; defaults to the one of the stored plan.
+    location: Optional[str] = None
+
+
+def crew_inputs(payload: TripRequest, **context):
+    """Trip inputs plus the template variables referenced by the agents and tasks."""
+    trip = payload.to_serialized_dict()
+    return {
+        **trip,
+        "user_input": json.dumps(trip),
+        "itinerary": "Not available",
+        "budget_breakdown": "Not available",
+        "weather_forecast": "Not available",
+        **context,
+    }
+
+async def weather_forecast(location, days):
+    """Forecast text for the planner/replanner prompts; never fails the request."""
+    try:
+        forecast = await travel_tools.trip_weather(location, days)
+    except Exception:
+        forecast = {}
+    return json.dumps(forecast) if forecast else "Not available"
+
+def trip_days(payload: TripRequest):
+    start, end = payload.startDate.date(), payload.endDate.date()
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+async def planner_inputs(payload: TripRequest):
+    return crew_inputs(payload, weather_forecast=await weather_forecast(payload.location, trip_days(payload)))
+
+async def scheduled(result, location, eco_friendly=False):
+    """Planner output with each day's stops reordered and timed by the itinerary scheduler.
+
+    ``unscheduled_days`` lists the days left as the planner wrote them.
+    """
+    days, unscheduled = await itinerary_scheduler.schedule(result["json"]["days"], location, eco_friendly)
+    plan = {**result["json"], "days": days}
+    return {**result, "raw": json.dumps(plan, ensure_ascii=False), "json": plan, "unscheduled_days": unscheduled}
+
+async def scheduled_windows(days, ranges, new_days, location, eco_friendly=False):
+    """The replanner's slots for each window, timed to fit between the stored slots around it,
+    and the days with a window left as the replanner wrote it."""
+    replacements = window_slots(ranges, new_days)
+    windows = await asyncio.gather(*(
+        itinerary_scheduler.schedule_day({"slots": slots}, location, eco_friendly, before, after)
+        if slots is not None else asyncio.sleep(0)
+        for slots, (before, after) in zip(replacements, window_edges(days, ranges))
+    ))
+    unscheduled = sorted({
+        number for (number, _, _), slots, window in zip(ranges, replacements, windows)
+        if slots is not None and window is None
+    })
+    return [window["slots"] if window is not None else slots for slots, window in zip(replacements, windows)], unscheduled
+
+async def plan_itinerary(payload: TripRequest):
+    result = await run_crew("planner", await planner_inputs(payload), payload.user_id)
+    result = await scheduled(result, payload.location, payload.ecoFriendly)
+    prefetcher.enqueue(payload.location, result["json"]["days"])
+    return await with_slot_places(result, payload.location)
+
+def store_plan(user_id, trip_id, result, **slots):
+    """Make ``result`` the trip's current plan; returns it with its plan-store version."""
+    session_store.update(user_id, trip_id, current_plan=result, **slots)
+    return {**result, "version": plan_store.save(user_id, trip_id, result["json"])}
 
 @app.post("/generate-plan")
 async def generate_plan(payload: TripRequest):
     try:
-        result = planner_crew.kickoff(inputs=payload.to_serialized_dict())
-        user_context[payload.user_id]["current_plan"] = result
+        result = store_plan(payload.user_id, payload.trip_id, await plan_itinerary(payload))
+        session_store.put(payload.user_id, payload.trip_id, location=payload.location)
         return {"plan": result}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+def stored_days(context):
+    plan = (context.get("current_plan") or {}).get("json") or {}
+    return plan.get("days") or []
+
+def engine_output(breakdown):
+    return {"raw": json.dumps(breakdown, ensure_ascii=False), "json": breakdown}
 
 @app.post("/compute-budget")
 async def compute_budget(payload: TripRequest):
+    """Category and per-day costs from the stored itinerary and the city's cost tables."""
     try:
-        result = budget_crew.kickoff(inputs=payload.to_serialized_dict())
-        user_context[payload.user_id]["budget"] = result
+        context = session_store.get(payload.user_id, payload.trip_id)
+        breakdown = budget_engine.compute(
+            payload.location, len(trip_days(payload)), payload.budget, stored_days(context)
+        )
+        result = engine_output(breakdown)
+        session_store.update(payload.user_id, payload.trip_id, budget=result)
         return {"budget": result}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @app.post("/optimize-budget")
-async def optimize_budget(payload: TripRequest):
-    try:
-        result = optimizer_crew.kickoff(inputs=payload.to_serialized_dict())
-        user_context[payload.user_id]["optimized_budget"] = result
-        return {"optimized_plan": result}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def optimize_budget(payload: TripRequest, explain: bool = False):
+    """Cheapest-fitting mix of hotel tier, meals, transport and shopping.
+
+    With ``explain=true`` the optimizer agent phrases recommendations for the
+    computed numbers; it never does the arithmetic itself.
+    """
+    context = session_store.get(payload.user_id, payload.trip_id)
+    optimized = budget_engine.optimize(
+        payload.location, len(trip_days(payload)), payload.budget, stored_days(context),
+        eco_friendly=payload.ecoFriendly, travel_style=payload.travelStyle,
+    )
+    result = engine_output(optimized)
+    if explain:
+        try:
+            inputs = crew_inputs(
+                payload,
+                itinerary=session_text(context, "current_plan"),
+                budget_breakdown=result["raw"],
+            )
+            result["explanation"] = (await run_crew("optimizer", inputs, payload.user_id))["raw"]
+        except Exception as e:
+            raise http_error(e)
+    session_store.update(payload.user_id, payload.trip_id, optimized_plan=result)
+    return {"optimized_plan": result}
 
 @app.post("/replan")
-async def replan_trip(payload: TripRequest):
+async def replan_trip(payload: ReplanRequest):
+    """Regenerate only the days/slots named in ``changes`` and merge them into the stored plan."""
+    context = session_store.get(payload.user_id, payload.trip_id)
+    plan = (context.get("current_plan") or {}).get("json")
+    if not plan:
+        raise HTTPException(status_code=409, detail="No plan stored for this trip; call /generate-plan first")
+    days = plan["days"]
+    changes = payload.changes or [PlanChange(day=day["day"], reason=payload.constraints or "Replan") for day in days]
+    try:
+        window, neighbors, ranges = build_window(days, changes)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     try:
-        result = replanner_crew.kickoff(inputs=payload.to_serialized_dict())
-        user_context[payload.user_id]["replan"] = result
-        return {"replanned_plan": result}
+        forecast = await weather_forecast(payload.location, [day["date"] for day in window if day.get("date")])
+        inputs = replanner_inputs(payload.location, window, neighbors, payload.constraints, forecast)
+        result = await run_crew("replanner", inputs, payload.user_id)
+        replacements, unscheduled = await scheduled_windows(days, ranges, result["json"]["days"], payload.location)
+        prefetcher.enqueue(payload.location, [{**entry, "slots": slots} for entry, slots in zip(window, replacements) if slots])
+        merged = {"days": merge_window(days, ranges, replacements)}
+        replanned = {"raw": json.dumps(merged), "json": merged}
+        replanned = store_plan(payload.user_id, payload.trip_id, replanned, replanned_plan=replanned)
+        return {"replanned_plan": replanned, "changed_days": sorted({number for number, _, _ in ranges}),
+                "unscheduled_days": unscheduled}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+async def with_place_info(answer, location, place_name, day):
+    """The place answer with the forecast for ``day`` (stored answers were written for other dates)
+    and, when a places source is configured, its photo and nearby restaurants."""
+    if not isinstance(answer.get("json"), dict):
+        return answer
+    try:
+        info = await travel_tools.place_info(place_name, location, day)
+    except Exception:
+        return answer
+    extra = {"weather": info["weather"]} if info["weather"] else {}
+    if travel_tools.places is not None:
+        extra.update(image=info["image"], nearby_restaurants=info["nearby_restaurants"])
+    return {**answer, "json": {**answer["json"], **extra}} if extra else answer
+
+async def with_slot_places(result, location):
+    """A plan with each stop's photo and nearby restaurants, looked up once per distinct place."""
+    if travel_tools.places is None:
+        return result
+    slots = [slot for day in result["json"]["days"] for slot in day.get("slots") or []
+             if isinstance(slot, dict) and slot.get("place")]
+    places = list(dict.fromkeys(slot["place"] for slot in slots))
+    try:
+        info = dict(zip(places, await travel_tools.places_info(places, location)))
+    except Exception:
+        return result
+    days = [
+        {**day, "slots": [
+            {**slot, "image": info[slot["place"]]["image"],
+             "nearby_restaurants": info[slot["place"]]["nearby_restaurants"]}
+            if isinstance(slot, dict) and slot.get("place") in info else slot
+            for slot in day.get("slots") or []
+        ]}
+        for day in result["json"]["days"]
+    ]
+    plan = {**result["json"], "days": days}
+    return {**result, "raw": json.dumps(plan, ensure_ascii=False), "json": plan}
+
+async def with_city_events(answer, payload: TripRequest):
+    """A stored city guide with the events listed for this trip's dates, when an events source is configured."""
+    if travel_tools.events is None or not isinstance(answer.get("json"), dict):
+        return answer
+    found = await asyncio.gather(
+        *(travel_tools.local_events(payload.location, day) for day in trip_days(payload)), return_exceptions=True
+    )
+    events = [event for day in found if isinstance(day, list) for event in day]
+    return {**answer, "json": {**answer["json"], "events": events}}
+
+async def place_answer(location, place_name, day, user=None, priority=None):
+    """Place details from the knowledge base or semantic cache, else from the crew (and then stored)."""
+    version = (await fingerprint("place"))["prompt_version"]
+    result = await asyncio.to_thread(knowledge_base.place, location, place_name, version)
+    if result is not None:
+        return result
+    # "Louvre", "Louvre Museum" and "Musée du Louvre" in the same city share one answer.
+    probe = await semantic_cache.lookup("place", location, place_name, version)
+    result = probe.answer
+    if result is None:
+        inputs = {"place_name": place_name, "location": location, "date": day.isoformat() if day else None}
+        result = await run_crew("place", inputs, user, priority)
+        probe.store(result)
+    await asyncio.to_thread(knowledge_base.put_place, location, place_name, result, version=version)
+    return result
+
+async def prefetch_place(location, place_name, day):
+    # Runs at BACKGROUND priority; a click on the same place meanwhile starts its own
+    # interactive run, and whichever finishes first fills the knowledge base.
+    day = datetime.fromisoformat(str(day)) if day else None
+    await place_answer(location, place_name, day, priority=BACKGROUND)
+
+prefetcher = PlacePrefetcher(prefetch_place)
 
 @app.post("/place-details")
 async def place_details(payload: PlaceRequest):
     try:
-        result = place_crew.kickoff(inputs=payload.to_serialized_dict())
-        user_context[payload.user_id]["place_details"] = result
+        result = await place_answer(payload.location, payload.place_name, payload.date, payload.user_id)
+        result = await with_place_info(result, payload.location, payload.place_name, payload.date)
+        session_store.update(payload.user_id, payload.trip_id, place_details=result)
         return {"place_details": result}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+async def city_guide_answer(payload: TripRequest):
+    """City guide from the knowledge base, or from the crew on a miss (and then stored)."""
+    version = (await fingerprint("city_guide"))["prompt_version"]
+    result = await asyncio.to_thread(knowledge_base.city, payload.location, version)
+    if result is not None:
+        return await with_city_events(result, payload)
+    result = await run_crew("city_guide", crew_inputs(payload), payload.user_id)
+    await asyncio.to_thread(knowledge_base.put_city, payload.location, result, version=version)
+    return result
 
 @app.post("/city-guide")
 async def city_guide(payload: TripRequest):
     try:
-        result = city_guide_crew.kickoff(inputs=payload.to_serialized_dict())
-        user_context[payload.user_id]["city_guide"] = result
+        result = await city_guide_answer(payload)
+        session_store.update(payload.user_id, payload.trip_id, city_guide=result)
         return {"city_guide": result}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @app.post("/eco-suggestions")
 async def eco_suggestions(payload: TripRequest):
     try:
-        result = eco_crew.kickoff(inputs=payload.to_serialized_dict())
-        user_context[payload.user_id]["eco_suggestions"] = result
+        result = await run_crew("eco", crew_inputs(payload), payload.user_id)
+        session_store.update(payload.user_id, payload.trip_id, eco_suggestions=result)
         return {"eco_suggestions": result}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+async def with_hotel_blurbs(result, payload: TripRequest):
+    """Ranked hotels with a one-line blurb each; the hotels are returned without blurbs if the crew fails."""
+    listing = [
+        {key: hotel.get(key) for key in ("name", "price", "rating", "eco", "address")}
+        for tier in result["json"].values() for hotel in tier
+    ]
+    if not listing:
+        return result
+    try:
+        inputs = {"location": payload.location, "hotels": json.dumps(listing, ensure_ascii=False)}
+        blurbs = (await run_crew("hotel_blurb", inputs, payload.user_id))["json"] or {}
+    except Exception:
+        return result
+    tiers = {
+        name: [{**hotel, "blurb": blurbs[hotel["name"]]} if hotel["name"] in blurbs else hotel for hotel in tier]
+        for name, tier in result["json"].items()
+    }
+    return {**result, "raw": json.dumps(tiers, ensure_ascii=False), "json": tiers}
+
+async def hotels_answer(payload: TripRequest, blurbs=False, days=None):
+    """Hotels ranked from the city's local candidates.
+
+    The hotel crew only runs for a city with no candidates yet; its hotels
+    become the candidates. The ranking uses ``days``, or else the trip's stored
+    itinerary when there is one, for distances.
+    """
+    if days is None:
+        days = stored_days(session_store.get(payload.user_id, payload.trip_id))
+    args = (payload.location, len(trip_days(payload)), payload.budget, days)
+    options = {"eco_friendly": payload.ecoFriendly, "travel_style": payload.travelStyle}
+    result = await asyncio.to_thread(hotel_ranker.rank, *args, **options)
+    if result is None:
+        crew = await run_crew("hotel", crew_inputs(payload), payload.user_id)
+        await asyncio.to_thread(hotel_ranker.ingest, payload.location, crew["json"])
+        result = await asyncio.to_thread(hotel_ranker.rank, *args, **options)
+        if result is None:
+            return crew
+    return await with_hotel_blurbs(result, payload) if blurbs else result
 
 @app.post("/generate-hotels")
-async def generate_hotels(payload: TripRequest):
+async def generate_hotels(payload: TripRequest, blurbs: bool = False):
+    """Hotels by tier, ranked on budget, rating, distance to the itinerary and eco flags.
+
+    With ``blurbs=true`` a small model adds a one-line description per hotel
+    (cached per city and hotel list).
+    """
     try:
-        result = hotel_crew.kickoff(inputs=payload.to_serialized_dict())
-        user_context[payload.user_id]["hotels"] = result
+        result = await hotels_answer(payload, blurbs)
+        session_store.update(payload.user_id, payload.trip_id, hotels=result)
         return {"hotels": result}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+@app.post("/parse-intent")
+async def parse_intent(payload: IntentRequest):
+    """Parse trip intent with the rule-based parser, using intent_agent only for free text it cannot handle."""
+    raw_input = payload.data if payload.data is not None else payload.text
+    intent = intent_parser.parse(raw_input)
+    if intent is not None:
+        return {"intent": intent.model_dump(mode="json"), "source": "fast_path"}
+    try:
+        result = await run_crew("intent", {"user_input": json.dumps(raw_input, default=str)}, payload.user_id)
+        return {"intent": result, "source": "intent_agent"}
+    except Exception as e:
+        raise http_error(e)
+
+def chatbot_inputs(payload: ChatbotRequest, context):
+    return {
+        "user_message": payload.message,
+        "trip_context": session_context(context),
+        "conversation": render_conversation(context.get("conversation")),
+        "turn_context": turn_context(context, payload.message),
+    }
+
+async def chat_probe(payload: ChatbotRequest, context):
+    """Semantic-cache probe for general questions about the destination, else None.
+
+    Shared answers are generated from the destination alone (see
+    ``shared_chatbot_inputs``), so nothing from one user's plan or history can
+    reach another user.
+    """
+    location = payload.location or context.get("location")
+    if not location or not is_general_question(payload.message):
+        return None
+    return await semantic_cache.lookup(
+        "chat", location, payload.message, (await fingerprint("chatbot"))["prompt_version"]
+    )
+
+def shared_chatbot_inputs(payload: ChatbotRequest, context):
+    return {
+        "user_message": payload.message,
+        "trip_context": f"Destination: {payload.location or context.get('location')}",
+        "conversation": "None",
+        "turn_context": "None",
+    }
+
+def remember_turn(payload: ChatbotRequest, context, result):
+    conversation = record_turn(context.get("conversation"), payload.message, result["raw"])
+    session_store.put(payload.user_id, payload.trip_id, conversation=conversation)
 
 @app.post("/chatbot")
 async def chatbot(payload: ChatbotRequest):
     try:
-        context = user_context.get(payload.user_id, {})
-        chatbot_inputs = {
-            "user_message": payload.message,
-            "current_plan": context.get("current_plan", "Not available"),
-            "budget": context.get("budget", "Not available"),
-            "optimized_plan": context.get("optimized_plan", "Not available"),
-            "replanned_plan": context.get("replanned_plan", "Not available"),
-            "eco_suggestions": context.get("eco_suggestions", "Not available"),
-            "hotels": context.get("hotels", "Not available"),
-            "city_guide": context.get("city_guide", "Not available")
-        }
-        result = chatbot_crew.kickoff(inputs=chatbot_inputs)
+        session_affinity.set(f"{payload.user_id}:{payload.trip_id}")
+        context = session_store.get(payload.user_id, payload.trip_id)
+        probe = await chat_probe(payload, context)
+        if probe is not None and probe.answer is not None:
+            result = probe.answer
+        elif probe is not None:
+            result = await run_crew("chatbot", shared_chatbot_inputs(payload, context), payload.user_id)
+            probe.store(result)
+        else:
+            result = await run_crew("chatbot", chatbot_inputs(payload, context), payload.user_id)
+        remember_turn(payload, context, result)
         return {"response": result}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+@app.post("/chatbot/stream")
+async def chatbot_stream(payload: ChatbotRequest):
+    admit()
+    async def events():
+        try:
+            session_affinity.set(f"{payload.user_id}:{payload.trip_id}")
+            context = session_store.get(payload.user_id, payload.trip_id)
+            probe = await chat_probe(payload, context)
+            if probe is not None and probe.answer is not None:
+                remember_turn(payload, context, probe.answer)
+                yield {"type": "result", "data": probe.answer}
+                return
+            inputs = chatbot_inputs(payload, context) if probe is None else shared_chatbot_inputs(payload, context)
+            async for event in stream_crew("chatbot", inputs, payload.user_id):
+                if event["type"] == "result":
+                    if probe is not None:
+                        probe.store(event["data"])
+                    remember_turn(payload, context, event["data"])
+                yield event
+        except Exception as e:
+            yield {"type": "error", "error": str(e)}
+    return ndjson_response(events())
+
+@app.post("/generate-plan/stream")
+async def generate_plan_stream(payload: TripRequest):
+    """Stream planner tokens, each itinerary day as soon as it is complete, then the validated plan."""
+    admit()
+    async def events():
+        days = ArrayItemParser()
+        try:
+            async for event in stream_crew("planner", await planner_inputs(payload), payload.user_id):
+                if event["type"] == "token":
+                    yield event
+                    for day in days.feed(event["text"]):
+                        yield {"type": "day", "data": day}
+                else:
+                    # Streamed days are the planner's own; the final plan is reordered and timed.
+                    plan = await scheduled(event["data"], payload.location, payload.ecoFriendly)
+                    event = {**event, "data": store_plan(payload.user_id, payload.trip_id, plan)}
+                    prefetcher.enqueue(payload.location, event["data"]["json"]["days"])
+                    session_store.put(payload.user_id, payload.trip_id, location=payload.location)
+                    yield event
+        except Exception as e:
+            yield {"type": "error", "error": str(e)}
+    return ndjson_response(events())
+
+
+async def bundle_sections(payload: TripRequest):
+    """Yield trip sections as they complete.
+
+    The plan, city guide and eco sections start together. As soon as the plan
+    is ready the budget engine computes the budget and optimized budget, and the
+    hotels are ranked against its days.
+    """
+    queue = asyncio.Queue()
+    session_store.put(payload.user_id, payload.trip_id, location=payload.location)
+
+    async def section(name, produce):
+        try:
+            result = await produce
+            if name == "plan":
+                result = store_plan(payload.user_id, payload.trip_id, result)
+            else:
+                session_store.update(payload.user_id, payload.trip_id, **{name: result})
+            await queue.put({"section": name, "data": result})
+            return result
+        except Exception as e:
+            await queue.put({"section": name, "error": str(e)})
+            return None
+
+    async def computed(fn, *args, **kwargs):
+        return engine_output(fn(*args, **kwargs))
+
+    async def budget_chain(days):
+        args = (payload.location, len(trip_days(payload)), payload.budget, days)
+        await section("budget", computed(budget_engine.compute, *args))
+        await section("optimized_plan", computed(
+            budget_engine.optimize, *args,
+            eco_friendly=payload.ecoFriendly, travel_style=payload.travelStyle,
+        ))
+
+    async def plan_chain():
+        plan = await section("plan", plan_itinerary(payload))
+        if plan is None:
+            for name in ("budget", "optimized_plan"):
+                await queue.put({"section": name, "error": "skipped: plan failed"})
+            # Rank against the trip's stored itinerary, if any, instead.
+            await section("hotels", hotels_answer(payload))
+            return
+        days = plan["json"]["days"]
+        await asyncio.gather(budget_chain(days), section("hotels", hotels_answer(payload, days=days)))
+
+    tasks = [
+        asyncio.create_task(plan_chain()),
+        asyncio.create_task(section("eco_suggestions", run_crew("eco", crew_inputs(payload), payload.user_id))),
+        asyncio.create_task(section("city_guide", city_guide_answer(payload))),
+    ]
+    # plan, budget, optimized_plan and hotels come from the plan chain.
+    try:
+        for _ in range(len(tasks) + 3):
+            yield await queue.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+
 
+@app.post("/trip-bundle")
+async def trip_bundle(payload: TripRequest, stream: bool = False):
+    # A full queue is one 429, not an error string in every section.
+    admit()
+    if stream:
+        return ndjson_response(bundle_sections(payload))
 
+    bundle, errors = {}, {}
+    async for item in bundle_sections(payload):
+        if "error" in item:
+            errors[item["section"]] = item["error"]
+        else:
+            bundle[item["section"]] = item["data"]
+    return {**bundle, "errors": errors}
+
+
+# Endpoints that can run as background jobs: job kind -> (request model, endpoint)
+JOB_KINDS = {
+    "generate-plan": (TripRequest, generate_plan),
+    "replan": (ReplanRequest, replan_trip),
+    "trip-bundle": (TripRequest, trip_bundle),
+}
+
+
+@app.post("/jobs/{kind}", status_code=202)
+async def submit_job(kind: str, body: dict):
+    """Start a long request in the background; poll ``/jobs/{job_id}`` for its status."""
+    if kind not in JOB_KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind: {kind}")
+    model, endpoint = JOB_KINDS[kind]
+    try:
+        payload = model.model_validate(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    try:
+        executor.check_capacity()
+        job = job_manager.submit(kind, payload.user_id, endpoint, payload)
+    except (QueueFull, TooManyJobs) as e:
+        raise http_error(e)
+    return JSONResponse(
+        status_code=202,
+        content={**job.to_dict(), "status_url": f"/jobs/{job.id}", "result_url": f"/jobs/{job.id}/result"},
+        headers={"Location": f"/jobs/{job.id}"},
+    )
+
+
+def find_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return find_job(job_id).to_dict()
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = find_job(job_id)
+    if job.status == "succeeded":
+        return job.result
+    if job.status == "failed":
+        raise HTTPException(status_code=job.error_status, detail=job.error)
+    if job.status == "cancelled":
+        raise HTTPException(status_code=409, detail="Job was cancelled")
+    return JSONResponse(status_code=202, content=job.to_dict(), headers={"Retry-After": "2"})
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    find_job(job_id)
+    return job_manager.cancel(job_id).to_dict()
+
+
+def stored_plan(found):
+    if found is None:
+        raise HTTPException(status_code=404, detail="No plan stored for this trip")
+    return found
+
+
+@app.get("/plans/{user_id}")
+async def list_plans(user_id: str):
+    return {"trips": plan_store.trips(user_id)}
+
+
+@app.get("/plans/{user_id}/{trip_id}")
+async def plan_days(user_id: str, trip_id: str, start: Optional[int] = None, end: Optional[int] = None):
+    """Days ``start``..``end`` of the current plan (all by default), so long trips can be loaded in pages.
+
+    ``trip_id`` is ``default`` for plans generated without one.
+    """
+    return stored_plan(plan_store.days(user_id, trip_id, start, end))
+
+
+@app.get("/plans/{user_id}/{trip_id}/days/{day}")
+async def plan_day(user_id: str, trip_id: str, day: int):
+    found = stored_plan(plan_store.days(user_id, trip_id, day, day))
+    if not found["days"]:
+        raise HTTPException(status_code=404, detail=f"Day {day} is not in the plan")
+    return {"version": found["version"], "day": found["days"][0]}
+
+
+@app.get("/plans/{user_id}/{trip_id}/changes")
+async def plan_changes(user_id: str, trip_id: str, since: int = 0):
+    """Per-day deltas after version ``since`` (see plan_store.py), or the whole plan if they were pruned."""
+    return stored_plan(plan_store.changes(user_id, trip_id, since))
+
+
+@app.get("/ready")
+async def ready():
+    """200 once every crew is built; 503 while the warm-up is still running."""
+    status = crew_pool.stats()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "crews": crew_pool.stats(),
+        "executor": executor.stats(),
+        "cache": result_cache.stats(),
+        "sessions": session_store.stats(),
+        "intent": intent_parser.stats(),
+        "validation": output_validator.stats(),
+        "singleflight": inflight.stats(),
+        "routing": model_router.stats(),
+        "jobs": job_manager.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "knowledge": knowledge_base.stats(),
+        "scheduling": itinerary_scheduler.stats(),
+        "prefetch": prefetcher.stats(),
+        "plans": plan_store.stats(),
+        "hotels": hotel_ranker.stats(),
+        "prompts": prefix_tracker.stats(),
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of request, crew and LLM metrics plus current queue state."""
+    queue = executor.stats()
+    metrics.set_gauge("tourmuse_queue_depth", queue["queue_depth"])
+    metrics.set_gauge("tourmuse_crews_in_flight", queue["in_flight"])
+    for url, backend in model_router.stats()["backends"].items():
+        metrics.set_gauge("tourmuse_backend_outstanding", backend["outstanding"], backend=url)
+        metrics.set_gauge("tourmuse_backend_healthy", int(backend["healthy"]), backend=url)
+    metrics.set_gauge("tourmuse_cache_hit_rate", result_cache.stats()["hit_rate"])
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/")
 async def root():
     return {"message": "TourMuse AI Backend Running ✅"}
+
@@ -0,0 +1,167 @@
+# metrics.py
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Histogram buckets in seconds, from cache hits to multi-minute plan generations.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HELP = {
+    "tourmuse_span_seconds": "Time spent per stage (request, crew, queue_wait, kickoff, prompt_build, llm_call, llm_prefill, llm_decode, json_repair).",
+    "tourmuse_requests_total": "HTTP requests by endpoint and status.",
+    "tourmuse_crew_runs_total": "Crew kickoffs by outcome.",
+    "tourmuse_crew_retries_total": "Crew kickoffs retried on another model host.",
+    "tourmuse_llm_calls_total": "LLM calls; divide by crew runs for iterations per run.",
+    "tourmuse_llm_failures_total": "LLM calls that raised.",
+    "tourmuse_tokens_total": "Prompt (in) and completion (out) tokens.",
+    "tourmuse_prefill_tokens_total": "Estimated prompt tokens shared with the host's previous prompt for the session (reused) or not (new).",
+    "tourmuse_output_validation_total": "Structured outputs by validation outcome (valid, repaired, failed).",
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}   # key -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def render(self):
+        with self._lock:
+            series = [
+                ("counter", dict(self._counters)),
+                ("gauge", dict(self._gauges)),
+                ("histogram", {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}),
+            ]
+        lines = []
+        for kind, values in series:
+            seen = set()
+            for (name, labels), value in sorted(values.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in HELP:
+                        lines.append(f"# HELP {name} {HELP[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                if kind != "histogram":
+                    lines.append(f"{name}{_label_text(labels)} {value}")
+                    continue
+                counts, total, observed = value
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {observed}")
+                lines.append(f"{name}_sum{_label_text(labels)} {round(total, 6)}")
+                lines.append(f"{name}_count{_label_text(labels)} {observed}")
+        return "\n".join(lines) + "\n"
+
+
+# Tags of the span being executed (trace_id, endpoint, crew, ...). Copied into
+# crew worker threads by the executor, so spans recorded there join the request's trace.
+current_tags = ContextVar("tourmuse_trace_tags", default={})
+
+# Only these tags become metric labels; the rest go to the trace file only.
+LABELS = ("endpoint", "crew")
+
+class Tracer:
+    """Records timed spans as ``tourmuse_span_seconds`` and, optionally, as JSON lines.
+
+    Set ``TOURMUSE_TRACE_FILE`` to append every span (trace id, tags, start,
+    duration and extra fields such as token counts) to that file.
+    """
+
+    def __init__(self, metrics, path=None):
+        self.metrics = metrics
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def tags(self):
+        return current_tags.get()
+
+    @contextmanager
+    def span(self, name, **tags):
+        """Time the block as span ``name``; nested spans inherit ``tags``."""
+        parent = current_tags.get()
+        merged = {**parent, **tags}
+        merged.setdefault("trace_id", uuid.uuid4().hex)
+        token = current_tags.set(merged)
+        start = time.time()
+        extra = {}
+        try:
+            yield extra
+        except BaseException:
+            extra.setdefault("error", True)
+            raise
+        finally:
+            current_tags.reset(token)
+            self.record(name, time.time() - start, start=start, tags=merged, **extra)
+
+    def record(self, name, seconds, start=None, tags=None, **extra):
+        """Record a span measured elsewhere, under the current (or given) tags."""
+        tags = current_tags.get() if tags is None else tags
+        self.metrics.observe("tourmuse_span_seconds", seconds, span=name, **{k: tags.get(k) for k in LABELS})
+        if self.path:
+            line = {"span": name, "start": start if start is not None else time.time() - seconds,
+                    "duration_ms": round(seconds * 1000, 3), **tags, **extra}
+            with self._lock:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(json.dumps(line, default=str) + "\n")
+                self._file.flush()
+
+    def count(self, name, value=1, **labels):
+        """Increment counter ``name`` labelled with the current endpoint and crew."""
+        tags = current_tags.get()
+        self.metrics.inc(name, value, **{**{k: tags.get(k) for k in LABELS}, **labels})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+metrics = Metrics()
+tracer = Tracer(metrics, os.getenv("TOURMUSE_TRACE_FILE"))
+
+__all__ = ["Metrics", "Tracer", "current_tags", "metrics", "tracer"]
@@ -0,0 +1,275 @@
+# plan_store.py
+"""Versioned trip plans stored as per-day records plus structural deltas.
+
+Each save of a trip's plan becomes a new version. The current version is kept
+as one compact JSON record per day. Every version also records a delta for the
+days it changed only, so a replan that touches one day writes one small row
+rather than the whole plan again. Clients can read a single day or a range of
+days, or catch up with the changes since the version they already have.
+
+A delta is one of:
+
+- ``{"set": day}``: a day that didn't exist before.
+- ``{"deleted": true}``: a day that was removed.
+- ``{"fields": {...}, "drop": [...], "slots": [[start, end, [slot, ...]], ...]}``:
+  changed day fields, removed fields, and slot edits. Each slot edit replaces
+  ``slots[start:end]`` of the previous version; ``apply_delta`` applies them
+  from last to first.
+
+Changes with ``day`` ``None`` carry the plan's other top-level fields in
+``{"meta": {...}}``.
+"""
+
+import difflib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PLAN_PATH = os.getenv("TOURMUSE_PLAN_PATH", "tourmuse_plans.sqlite3")
+# Versions of deltas kept per trip; older clients get the whole plan instead.
+PLAN_HISTORY = int(os.getenv("TOURMUSE_PLAN_HISTORY", "50"))
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def day_number(day, position):
+    try:
+        return int(day.get("day"))
+    except (TypeError, ValueError):
+        return position + 1
+
+
+def day_delta(old, new):
+    """Structural delta turning day ``old`` into day ``new``."""
+    delta = {}
+    fields = {key: value for key, value in new.items() if key != "slots" and old.get(key) != value}
+    if fields:
+        delta["fields"] = fields
+    drop = [key for key in old if key not in new]
+    if drop:
+        delta["drop"] = drop
+    if "slots" in new:
+        before = [dumps(slot) for slot in old.get("slots") or []]
+        after = [dumps(slot) for slot in new["slots"] or []]
+        matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+        edits = [
+            [i1, i2, new["slots"][j1:j2]]
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"
+        ]
+        if edits or "slots" not in old:
+            delta["slots"] = edits
+    return delta
+
+
+def apply_delta(day, delta):
+    """Day ``day`` with ``delta`` applied; ``None`` when the delta deletes it."""
+    if delta.get("deleted"):
+        return None
+    if "set" in delta:
+        return delta["set"]
+    day = {key: value for key, value in (day or {}).items() if key not in delta.get("drop", ())}
+    day.update(delta.get("fields", {}))
+    if "slots" in delta:
+        slots = list(day.get("slots") or [])
+        for start, end, replacement in reversed(delta["slots"]):
+            slots[start:end] = replacement
+        day["slots"] = slots
+    return day
+
+
+def apply_changes(plan, changes):
+    """``plan`` (``{"days": [...], ...}``) brought up to date with ``changes`` from ``PlanStore.changes``."""
+    meta = {key: value for key, value in plan.items() if key != "days"}
+    days = {day_number(day, i): day for i, day in enumerate(plan.get("days") or [])}
+    for change in changes:
+        if change["day"] is None:
+            meta = change["delta"]["meta"]
+            continue
+        day = apply_delta(days.get(change["day"]), change["delta"])
+        if day is None:
+            days.pop(change["day"], None)
+        else:
+            days[change["day"]] = day
+    return {**meta, "days": [days[number] for number in sorted(days)]}
+
+
+class PlanStore:
+    """SQLite store of trip plans, one row per day, with per-version deltas.
+
+    ``save`` writes only the days that differ from the stored version (and
+    doesn't bump the version when nothing changed). Deltas are kept for the
+    last ``history`` versions of each trip; ``changes`` answers with the full
+    plan when asked for versions older than that.
+    """
+
+    def __init__(self, path=PLAN_PATH, history=PLAN_HISTORY):
+        self.path = path
+        self.history = history
+        self.saves = 0
+        self.versions = 0
+        self.plan_bytes = 0
+        self.delta_bytes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS trips ("
+            " trip_key TEXT PRIMARY KEY, user_id TEXT NOT NULL, trip_id TEXT NOT NULL, version INTEGER NOT NULL,"
+            " base_version INTEGER NOT NULL, meta TEXT NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS trips_user ON trips(user_id);"
+            "CREATE TABLE IF NOT EXISTS plan_days ("
+            " trip_key TEXT NOT NULL, day INTEGER NOT NULL, version INTEGER NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (trip_key, day));"
+            "CREATE TABLE IF NOT EXISTS plan_changes ("
+            " trip_key TEXT NOT NULL, version INTEGER NOT NULL, day INTEGER, delta TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS plan_changes_version ON plan_changes(trip_key, version);"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(user_id, trip_id=None):
+        return f"{user_id}:{trip_id or 'default'}"
+
+    def save(self, user_id, trip_id, plan):
+        """Store ``plan`` as the trip's next version; returns the version now current."""
+        key = self.key(user_id, trip_id)
+        days = {day_number(day, i): day for i, day in enumerate(plan.get("days") or [])}
+        meta = dumps({name: value for name, value in plan.items() if name != "days"})
+        with self._lock, self._conn:
+            trip = self._conn.execute(
+                "SELECT version, base_version, meta FROM trips WHERE trip_key = ?", (key,)
+            ).fetchone()
+            current, base = (trip[0], trip[1]) if trip else (0, 0)
+            stored = dict(self._conn.execute("SELECT day, data FROM plan_days WHERE trip_key = ?", (key,)))
+            version = current + 1
+
+            changes, rows = [], []
+            for number, day in days.items():
+                data = dumps(day)
+                previous = stored.pop(number, None)
+                if data == previous:
+                    continue
+                delta = {"set": day} if previous is None else day_delta(json.loads(previous), day)
+                changes.append((key, version, number, dumps(delta)))
+                rows.append((key, number, version, data))
+            changes += [(key, version, number, dumps({"deleted": True})) for number in stored]
+            if trip is None or trip[2] != meta:
+                changes.append((key, version, None, dumps({"meta": json.loads(meta)})))
+            self.saves += 1
+            if trip is not None and not changes:
+                return current
+
+            self._conn.executemany("INSERT INTO plan_changes VALUES (?, ?, ?, ?)", changes)
+            self._conn.executemany(
+                "INSERT INTO plan_days VALUES (?, ?, ?, ?) ON CONFLICT (trip_key, day) DO UPDATE SET"
+                " version = excluded.version, data = excluded.data",
+                rows,
+            )
+            self._conn.executemany(
+                "DELETE FROM plan_days WHERE trip_key = ? AND day = ?", [(key, number) for number in stored]
+            )
+            base = max(base, version - self.history)
+            self._conn.execute("DELETE FROM plan_changes WHERE trip_key = ? AND version <= ?", (key, base))
+            self._conn.execute(
+                "INSERT INTO trips VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (trip_key) DO UPDATE SET"
+                " version = excluded.version, base_version = excluded.base_version,"
+                " meta = excluded.meta, updated_at = excluded.updated_at",
+                (key, user_id, trip_id or "default", version, base, meta, time.time()),
+            )
+        self.versions += 1
+        self.plan_bytes += len(dumps(plan))
+        self.delta_bytes += sum(len(change[3]) for change in changes)
+        return version
+
+    def _trip(self, key):
+        return self._conn.execute("SELECT version, base_version, meta FROM trips WHERE trip_key = ?", (key,)).fetchone()
+
+    def days(self, user_id, trip_id=None, start=None, end=None):
+        """Days ``start``..``end`` (inclusive, either open) of the current version; ``None`` if no plan is stored."""
+        key = self.key(user_id, trip_id)
+        with self._lock:
+            trip = self._trip(key)
+            if trip is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT data FROM plan_days WHERE trip_key = ? AND day >= ? AND day <= ? ORDER BY day",
+                (key, start if start is not None else -2 ** 63, end if end is not None else 2 ** 63 - 1),
+            ).fetchall()
+            total = self._conn.execute("SELECT COUNT(*) FROM plan_days WHERE trip_key = ?", (key,)).fetchone()[0]
+        return {"version": trip[0], "total_days": total, "days": [json.loads(row[0]) for row in rows]}
+
+    def plan(self, user_id, trip_id=None):
+        """The whole current plan with its version, or ``None``."""
+        key = self.key(user_id, trip_id)
+        with self._lock:
+            trip = self._trip(key)
+            if trip is None:
+                return None
+            rows = self._conn.execute("SELECT data FROM plan_days WHERE trip_key = ? ORDER BY day", (key,)).fetchall()
+        return {"version": trip[0], "plan": {**json.loads(trip[2]), "days": [json.loads(row[0]) for row in rows]}}
+
+    def changes(self, user_id, trip_id=None, since=0):
+        """Deltas from version ``since`` to the current one, oldest first; ``None`` if no plan is stored.
+
+        When the deltas after ``since`` have been pruned, the answer has
+        ``"reset": true`` and the whole plan instead.
+        """
+        key = self.key(user_id, trip_id)
+        with self._lock:
+            trip = self._trip(key)
+            if trip is None:
+                return None
+            version, base = trip[0], trip[1]
+            if since < base:
+                rows = None
+            else:
+                rows = self._conn.execute(
+                    "SELECT version, day, delta FROM plan_changes WHERE trip_key = ? AND version > ?"
+                    " ORDER BY version, day IS NOT NULL, day",
+                    (key, since),
+                ).fetchall()
+        if rows is None:
+            return {"version": version, "since": since, "reset": True, **self.plan(user_id, trip_id)}
+        changes = [{"version": v, "day": day, "delta": json.loads(delta)} for v, day, delta in rows]
+        return {"version": version, "since": since, "reset": False, "changes": changes}
+
+    def trips(self, user_id):
+        """The user's stored trips, most recently updated first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT t.trip_id, t.version, t.updated_at, COUNT(d.day) FROM trips t"
+                " LEFT JOIN plan_days d ON d.trip_key = t.trip_key WHERE t.user_id = ?"
+                " GROUP BY t.trip_key ORDER BY t.updated_at DESC",
+                (user_id,),
+            ).fetchall()
+        return [
+            {"trip_id": trip_id, "version": version, "updated_at": updated_at, "total_days": total}
+            for trip_id, version, updated_at, total in rows
+        ]
+
+    def stats(self):
+        with self._lock:
+            trips = self._conn.execute("SELECT COUNT(*) FROM trips").fetchone()[0]
+            changes = self._conn.execute("SELECT COUNT(*) FROM plan_changes").fetchone()[0]
+        return {
+            "trips": trips,
+            "stored_changes": changes,
+            "saves": self.saves,
+            "versions": self.versions,
+            "plan_bytes": self.plan_bytes,
+            "delta_bytes": self.delta_bytes,
+            "delta_ratio": round(self.delta_bytes / self.plan_bytes, 4) if self.plan_bytes else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+plan_store = PlanStore()
+
+__all__ = ["PlanStore", "apply_changes", "apply_delta", "day_delta", "plan_store"]
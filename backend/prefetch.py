@@ -0,0 +1,111 @@
+# prefetch.py
+
+import asyncio
+import os
+import time
+from collections import deque
+
+from executor import executor as crew_executor
+from knowledge import normalize_name
+
+
+class PlacePrefetcher:
+    """Generates place details for a new itinerary's stops before anyone opens them.
+
+    ``enqueue`` takes a plan's days and queues each distinct place once: places
+    already queued or being generated, for any user, are skipped. A single
+    background task hands them to ``fetch(location, place_name, day)``, which
+    stores the answer where ``/place-details`` looks first. Prefetch only
+    starts work while the crew executor has no queue and a free worker, at
+    most ``concurrency`` at a time and ``rate`` per minute, so interactive
+    requests never wait behind it.
+    """
+
+    def __init__(self, fetch, executor=crew_executor, enabled=None, concurrency=None, rate=None, max_pending=None):
+        self.fetch = fetch
+        self.executor = executor
+        self.enabled = enabled if enabled is not None else os.getenv("TOURMUSE_PREFETCH", "0") == "1"
+        self.concurrency = concurrency or int(os.getenv("TOURMUSE_PREFETCH_CONCURRENCY", "1"))
+        self.rate = rate or float(os.getenv("TOURMUSE_PREFETCH_RATE", "30"))   # places per minute
+        self.max_pending = max_pending or int(os.getenv("TOURMUSE_PREFETCH_MAX_PENDING", "500"))
+        self._pending = deque()
+        self._keys = set()          # queued or running
+        self._running = set()
+        self._worker = None
+        self._last_start = 0.0
+        self.queued = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.fetched = 0
+        self.failed = 0
+
+    def enqueue(self, location, days):
+        """Queue the places of ``days``; returns how many were new."""
+        if not self.enabled:
+            return 0
+        added = 0
+        for day in days:
+            for slot in day.get("slots") or []:
+                place = slot.get("place")
+                key = (normalize_name(location), normalize_name(place))
+                if not place or key in self._keys:
+                    self.duplicates += 1
+                    continue
+                if len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    continue
+                self._keys.add(key)
+                self._pending.append((key, location, place, day.get("date")))
+                added += 1
+        self.queued += added
+        if added and (self._worker is None or self._worker.done()):
+            self._worker = asyncio.create_task(self._drain())
+        return added
+
+    def _idle(self):
+        queue = self.executor.stats()
+        return queue["queue_depth"] == 0 and queue["in_flight"] < self.executor.max_workers
+
+    async def _drain(self):
+        while self._pending:
+            wait = self._last_start + 60 / self.rate - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if len(self._running) >= self.concurrency or not self._idle():
+                await asyncio.sleep(0.25)
+                continue
+            self._last_start = time.monotonic()
+            task = asyncio.create_task(self._fetch(*self._pending.popleft()))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fetch(self, key, location, place, day):
+        try:
+            await self.fetch(location, place, day)
+            self.fetched += 1
+        except Exception:
+            # Nobody is waiting on this answer; /place-details will generate it on demand.
+            self.failed += 1
+        finally:
+            self._keys.discard(key)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "running": len(self._running),
+            "queued": self.queued,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped,
+            "fetched": self.fetched,
+            "failed": self.failed,
+        }
+
+    async def aclose(self):
+        self._pending.clear()
+        for task in [self._worker, *self._running]:
+            if task is not None:
+                task.cancel()
+
+
+__all__ = ["PlacePrefetcher"]
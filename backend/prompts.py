@@ -0,0 +1,121 @@
+# prompts.py
+"""Prompt assembly ordered for KV-cache reuse.
+
+Ollama keeps the processed tokens of the previous request and only prefills
+what follows the longest shared prefix. Prompts are therefore laid out from
+least to most often changing: the agent's role and instructions (the crewai
+system template), then the task instructions, then per-request data sorted by
+how stable it is, with the user's message last.
+"""
+
+import os
+import textwrap
+import threading
+from collections import OrderedDict
+
+from context import CHARS_PER_TOKEN
+from metrics import tracer
+
+# crewai fills in {role}, {backstory} and {goal} when building the prompt and
+# {input} (the task description and expected output) at kickoff. Its own
+# ``{{ .System }}`` block already ends with the task for agents without tools
+# and ``{{ .Prompt }}`` repeats it, so the layout is spelled out here instead:
+# role and goal, the agent's instructions, then the task, sent as one message.
+ROLE_PROMPT = "You are {role}. {backstory}\nYour personal goal is: {goal}"
+TASK_PROMPT = "Provide your complete response:"
+
+
+# Task input -> how often it changes; lower values go earlier in the prompt.
+STABILITY = {
+    "location": 0,
+    "user_input": 1,
+    "weather_forecast": 1,
+    "itinerary": 1,
+    "budget_breakdown": 1,
+    "previous_plan": 1,
+    "neighbor_context": 1,
+    "constraints": 1,
+    "hotels": 1,
+    "trip_context": 1,
+    "conversation": 2,
+    "place_name": 3,
+    "date": 3,
+    "turn_context": 3,
+    "user_message": 4,
+}
+
+
+def system_prompt(instructions):
+    """crewai ``system_template``: the agent's role, its fixed ``instructions``, then the task.
+
+    Pair it with ``prompt_template=TASK_PROMPT``.
+    """
+    return f"{ROLE_PROMPT}\n\n{textwrap.dedent(instructions).strip()}\n\nCurrent Task: {{input}}\n"
+
+
+def task_description(instructions, *sections):
+    """Task description with ``instructions`` first, then ``(label, input)`` sections, most stable first.
+
+    Instructions must not contain inputs; each section renders as
+    ``label:\\n{input}`` so crewai fills it in at kickoff.
+    """
+    ordered = sorted(sections, key=lambda section: STABILITY.get(section[1], max(STABILITY.values())))
+    return instructions + "".join(f"\n\n{label}:\n{{{name}}}" for label, name in ordered)
+
+
+def prompt_text(messages):
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(message.get("content") or "") for message in messages or [])
+
+
+class PrefixTracker:
+    """Estimates the prefill a host can skip thanks to the prompt it processed before.
+
+    The server's cache isn't observable, so each prompt is compared with the
+    previous one sent to the same host for the same session (or crew, outside
+    a session); the shared prefix counts as reused. Token counts are estimated
+    from characters.
+    """
+
+    def __init__(self, max_keys=4096):
+        self.max_keys = max_keys
+        self._last = OrderedDict()
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.prompt_tokens = 0
+        self.reused_tokens = 0
+
+    def observe(self, key, text):
+        """Record ``text`` for ``key``; returns the estimated ``(reused, total)`` tokens."""
+        with self._lock:
+            previous = self._last.pop(key, "")
+            self._last[key] = text
+            while len(self._last) > self.max_keys:
+                self._last.popitem(last=False)
+        shared = len(os.path.commonprefix([previous, text]))
+        reused, total = shared // CHARS_PER_TOKEN, len(text) // CHARS_PER_TOKEN
+        with self._lock:
+            self.prompts += 1
+            self.prompt_tokens += total
+            self.reused_tokens += reused
+        tracer.count("tourmuse_prefill_tokens_total", reused, cache="reused")
+        tracer.count("tourmuse_prefill_tokens_total", total - reused, cache="new")
+        return reused, total
+
+    def stats(self):
+        with self._lock:
+            return {
+                "prompts": self.prompts,
+                "prompt_tokens": self.prompt_tokens,
+                "reused_tokens": self.reused_tokens,
+                "reuse_rate": round(self.reused_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+            }
+
+
+prefix_tracker = PrefixTracker()
+
+__all__ = [
+    "PrefixTracker", "ROLE_PROMPT", "STABILITY", "TASK_PROMPT", "prefix_tracker", "prompt_text",
+    "system_prompt", "task_description"
+]
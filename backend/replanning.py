@@ -0,0 +1,139 @@
+# replanning.py
+
+import json
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class PlanChange(BaseModel):
+    day: int
+    # Indices of the affected slots within the day; None means the whole day.
+    slots: Optional[List[int]] = None
+    reason: str
+
+
+def _slot_runs(change, day):
+    """``(start, end)`` of each contiguous run of the changed slots: [0, 3] -> (0, 1), (3, 4)."""
+    if not change.slots:
+        return [(0, len(day["slots"]))]
+    valid = sorted({i for i in change.slots if 0 <= i < len(day["slots"])})
+    if not valid:
+        raise ValueError(f"day {change.day} has no slots {change.slots} (it has {len(day['slots'])})")
+    runs = [[valid[0], valid[0] + 1]]
+    for i in valid[1:]:
+        if i == runs[-1][1]:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    return [tuple(run) for run in runs]
+
+
+def _merge_changes(changes):
+    """One change per day: whole-day changes win, slot changes are unioned."""
+    merged = {}
+    for change in changes:
+        current = merged.get(change.day)
+        if current is None:
+            merged[change.day] = change.model_copy()
+        else:
+            slots = None if current.slots is None or change.slots is None else sorted(set(current.slots) | set(change.slots))
+            merged[change.day] = PlanChange(day=change.day, slots=slots, reason=f"{current.reason}; {change.reason}")
+    return merged
+
+
+def _slot_brief(slot):
+    return {key: slot.get(key) for key in ("time", "duration", "place", "address") if slot.get(key)}
+
+
+def build_window(days, changes):
+    """Cut the replanning window out of a stored plan.
+
+    Returns ``(window, neighbors, ranges)``, one entry each per contiguous run
+    of changed slots: the run's slots, a brief of the slots right before and
+    after it (kept fixed so timings line up), and the ``(day, start, end)``
+    slot range being replaced. A day can have several runs; the slots between
+    them are kept.
+    """
+    by_day = {day["day"]: day for day in days}
+    ordered = [day["day"] for day in days]
+    window, neighbors, ranges = [], [], []
+    for number, change in sorted(_merge_changes(changes).items()):
+        day = by_day.get(number)
+        if day is None:
+            raise ValueError(f"day {number} is not in the stored plan")
+        for start, end in _slot_runs(change, day):
+            ranges.append((number, start, end))
+            window.append({
+                "day": number,
+                "date": day.get("date"),
+                "reason": change.reason,
+                "replace_slots": "all" if (start, end) == (0, len(day["slots"])) else f"{start}-{end - 1}",
+                "slots": day["slots"][start:end],
+            })
+            before = day["slots"][start - 1] if start > 0 else None
+            if before is None and ordered.index(number) > 0:
+                previous = by_day[ordered[ordered.index(number) - 1]]["slots"]
+                before = previous[-1] if previous else None
+            after = day["slots"][end] if end < len(day["slots"]) else None
+            if after is None and ordered.index(number) + 1 < len(ordered):
+                following = by_day[ordered[ordered.index(number) + 1]]["slots"]
+                after = following[0] if following else None
+            neighbors.append({
+                "day": number,
+                "before": _slot_brief(before) if before else None,
+                "after": _slot_brief(after) if after else None,
+            })
+    return window, neighbors, ranges
+
+
+def window_edges(days, ranges):
+    """The stored ``(before, after)`` slots of the same day around each range, ``None`` at the day's ends."""
+    by_day = {day["day"]: day["slots"] for day in days}
+    return [
+        (by_day[number][start - 1] if start > 0 else None,
+         by_day[number][end] if end < len(by_day[number]) else None)
+        for number, start, end in ranges
+    ]
+
+
+def window_slots(ranges, new_days):
+    """The replanner's slots for each range, matched by day in window order; ``None`` where it returned none."""
+    returned = {}
+    for day in new_days:
+        returned.setdefault(day.get("day"), []).append(day.get("slots") or [])
+    return [returned[number].pop(0) if returned.get(number) else None for number, _, _ in ranges]
+
+
+def replanner_inputs(location, window, neighbors, constraints=None, weather_forecast="Not available"):
+    return {
+        "location": location,
+        "previous_plan": json.dumps(window, default=str),
+        "neighbor_context": json.dumps(neighbors, default=str),
+        "constraints": constraints or "None",
+        "weather_forecast": weather_forecast,
+    }
+
+
+def merge_window(days, ranges, replacements):
+    """Splice the replanned slots back into the stored plan; untouched days and slots are kept as-is.
+
+    ``replacements`` holds the new slots for each of ``ranges`` (``None`` keeps the range).
+    """
+    splices = {}
+    for (number, start, end), slots in zip(ranges, replacements):
+        if slots is not None:
+            splices.setdefault(number, []).append((start, end, slots))
+    merged = []
+    for day in days:
+        if day["day"] in splices:
+            slots = list(day["slots"])
+            # Last run first, so earlier ranges still index the stored slots.
+            for start, end, replacement in sorted(splices[day["day"]], reverse=True):
+                slots[start:end] = replacement
+            day = {**day, "slots": slots}
+        merged.append(day)
+    return merged
+
+
+__all__ = ["PlanChange", "build_window", "merge_window", "replanner_inputs", "window_edges", "window_slots"]
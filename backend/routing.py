@@ -0,0 +1,231 @@
+# routing.py
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+DEFAULT_MODEL = os.getenv("TOURMUSE_MODEL", "ollama/llama3.2")
+SMALL_MODEL = os.getenv("TOURMUSE_SMALL_MODEL", "ollama/llama3.2:1b")
+
+# crew name -> model. Short extraction/lookup tasks get the small model; the
+# rest use the default. Override with TOURMUSE_MODEL_ROUTES='{"planner": "ollama/qwen2.5:14b"}'.
+MODEL_ROUTES = {"intent": SMALL_MODEL, "place": SMALL_MODEL, "eco": SMALL_MODEL, "hotel_blurb": SMALL_MODEL}
+MODEL_ROUTES.update(json.loads(os.getenv("TOURMUSE_MODEL_ROUTES", "{}")))
+
+OLLAMA_URLS = [url.strip().rstrip("/") for url in os.getenv("TOURMUSE_OLLAMA_URLS", "http://localhost:11434").split(",") if url.strip()]
+MAX_INFLIGHT = int(os.getenv("TOURMUSE_OLLAMA_MAX_INFLIGHT", "4"))
+KEEP_ALIVE = os.getenv("TOURMUSE_KEEP_ALIVE", "30m")
+HEALTH_INTERVAL = float(os.getenv("TOURMUSE_HEALTH_INTERVAL", "15"))
+
+AFFINITY_SESSIONS = int(os.getenv("TOURMUSE_AFFINITY_SESSIONS", "10000"))
+
+# Conversation the current run belongs to; runs of one session go back to the same host.
+session_affinity = ContextVar("tourmuse_session_affinity", default=None)
+
+# Status codes Ollama answers with when its request queue is full.
+SATURATED_STATUS = (429, 503)
+
+
+def ollama_name(model):
+    """``ollama/llama3.2`` -> ``llama3.2:latest``, the form /api/tags lists."""
+    name = model.split("/", 1)[1] if model.startswith(("ollama/", "ollama_chat/")) else model
+    return name if ":" in name else f"{name}:latest"
+
+
+def is_backend_error(error):
+    """True for failures that another backend could serve: refused connections, timeouts, a full queue."""
+    while error is not None:
+        if isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError)):
+            return True
+        if type(error).__name__ in ("APIConnectionError", "APITimeoutError"):
+            return True
+        if getattr(error, "status_code", None) in SATURATED_STATUS:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class Backend:
+    def __init__(self, url, max_inflight=MAX_INFLIGHT):
+        self.url = url
+        self.max_inflight = max_inflight
+        self.outstanding = 0
+        self.served = 0
+        self.failures = 0
+        self.healthy = True
+        self.models = None          # None until the first successful health check
+        self.checked_at = 0.0
+
+    @property
+    def saturated(self):
+        return self.outstanding >= self.max_inflight
+
+    def serves(self, model):
+        return self.models is None or ollama_name(model) in self.models
+
+    def stats(self):
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "served": self.served,
+            "failures": self.failures,
+            "models": sorted(self.models) if self.models is not None else None,
+        }
+
+
+class ModelRouter:
+    """Chooses the model and Ollama host for each crew run.
+
+    The model comes from ``MODEL_ROUTES`` (falling back to the default model
+    when no healthy host has it pulled). Among the hosts serving it, the one
+    with the fewest outstanding requests wins; hosts at ``max_inflight`` are
+    skipped while any other has room. Hosts are health-checked through
+    ``/api/tags`` at most every ``HEALTH_INTERVAL`` seconds, the same call pins
+    routed models in memory with ``keep_alive``, and a host that refuses a
+    connection or reports a full queue is marked down until its next check.
+
+    Runs made under ``session_affinity`` stick to the host that served the
+    session before, as long as it is healthy and has room: Ollama only reuses
+    the prefill of the prompt it last processed, so a session's next turn is
+    cheapest where its previous one ran.
+    """
+
+    def __init__(self, urls=None, routes=None, default_model=DEFAULT_MODEL, keep_alive=KEEP_ALIVE,
+                 health_interval=HEALTH_INTERVAL, max_inflight=MAX_INFLIGHT, affinity_sessions=AFFINITY_SESSIONS):
+        self.backends = [Backend(url, max_inflight) for url in (urls or OLLAMA_URLS)]
+        self.routes = dict(MODEL_ROUTES if routes is None else routes)
+        self.default_model = default_model
+        self.keep_alive = keep_alive
+        self.health_interval = health_interval
+        self.failovers = 0
+        self.affinity_sessions = affinity_sessions
+        self.affinity_hits = 0
+        self._affinity = OrderedDict()
+        self._llms = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, name):
+        model = self.routes.get(name, self.default_model)
+        if model != self.default_model and not any(b.healthy and b.serves(model) for b in self.backends):
+            return self.default_model
+        return model
+
+    def check(self, backend):
+        """Refresh one host's health and model list, and pin the routed models it has."""
+        backend.checked_at = time.monotonic()
+        try:
+            response = httpx.get(f"{backend.url}/api/tags", timeout=2.0)
+            response.raise_for_status()
+            backend.models = {model["name"] for model in response.json().get("models", [])}
+            backend.healthy = True
+        except (httpx.HTTPError, ValueError):
+            backend.healthy = False
+            return
+        for model in {self.default_model, *self.routes.values()}:
+            if ollama_name(model) in backend.models:
+                try:
+                    # An empty generate loads the model and resets its unload timer.
+                    httpx.post(f"{backend.url}/api/generate",
+                               json={"model": ollama_name(model), "keep_alive": self.keep_alive}, timeout=2.0)
+                except httpx.HTTPError:
+                    pass
+
+    def check_all(self):
+        for backend in self.backends:
+            self.check(backend)
+
+    def _refresh(self):
+        now = time.monotonic()
+        with self._lock:
+            stale = [b for b in self.backends if now - b.checked_at >= self.health_interval]
+            for backend in stale:
+                backend.checked_at = now
+        for backend in stale:
+            self.check(backend)
+
+    def _pick(self, model, session=None):
+        with self._lock:
+            candidates = [b for b in self.backends if b.healthy and b.serves(model)]
+            if not candidates:
+                # Every host is down or lacks the model: try the least busy one anyway.
+                candidates = self.backends
+            open_ = [b for b in candidates if not b.saturated]
+            sticky = self._affinity.get(session) if session is not None else None
+            backend = next((b for b in open_ if b.url == sticky), None)
+            if backend is not None:
+                self.affinity_hits += 1
+            else:
+                if open_ and len(open_) < len(candidates):
+                    self.failovers += 1
+                backend = min(open_ or candidates, key=lambda b: b.outstanding)
+            if session is not None:
+                self._affinity[session] = backend.url
+                self._affinity.move_to_end(session)
+                while len(self._affinity) > self.affinity_sessions:
+                    self._affinity.popitem(last=False)
+            backend.outstanding += 1
+            return backend
+
+    def llm(self, model, backend, template=None, response_format=None):
+        """Shared LLM client for ``model`` on ``backend``, keeping ``template``'s response format."""
+        response_format = response_format or getattr(template, "response_format", None)
+        key = (model, backend.url, json.dumps(response_format, sort_keys=True))
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is None:
+                from crewai import LLM  # deferred: crewai is slow to import (see crew.py)
+
+                options = {"response_format": response_format} if response_format else {}
+                llm = self._llms[key] = LLM(
+                    model=model, base_url=backend.url,
+                    extra_body={"keep_alive": self.keep_alive}, **options
+                )
+            return llm
+
+    def base_url(self):
+        """URL of the least busy healthy host, for direct Ollama API calls."""
+        with self._lock:
+            healthy = [b for b in self.backends if b.healthy] or self.backends
+            return min(healthy, key=lambda b: b.outstanding).url
+
+    @contextmanager
+    def route(self, name, template=None):
+        """Yield ``(backend, llm)`` for one run of crew ``name``, releasing the slot afterwards."""
+        self._refresh()
+        model = self.model_for(name)
+        backend = self._pick(model, session_affinity.get())
+        try:
+            yield backend, self.llm(model, backend, template)
+        except Exception as e:
+            if is_backend_error(e):
+                with self._lock:
+                    backend.failures += 1
+                    backend.healthy = False
+            raise
+        else:
+            with self._lock:
+                backend.served += 1
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "routes": {name: self.model_for(name) for name in self.routes},
+                "default_model": self.default_model,
+                "failovers": self.failovers,
+                "affinity_hits": self.affinity_hits,
+                "backends": {b.url: b.stats() for b in self.backends},
+            }
+
+
+model_router = ModelRouter()
+
+__all__ = ["Backend", "ModelRouter", "is_backend_error", "model_router", "ollama_name", "session_affinity"]
@@ -0,0 +1,307 @@
+# scheduling.py
+
+import asyncio
+import os
+import re
+
+import numpy as np
+
+from knowledge import find_coordinates, knowledge_base
+from tools import travel_tools
+
+DAY_START = os.getenv("TOURMUSE_DAY_START", "09:00")
+# Street routes are longer than the great-circle distance.
+DETOUR = 1.3
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_DURATION = 90   # minutes, when a slot's duration can't be read
+
+# (longest leg in km, mode, km/h, fixed minutes for waiting/parking); first match wins.
+TRAVEL_MODES = (
+    (1.5, "Walk", 4.5, 0),
+    (12.0, "Public transport", 20.0, 6),
+    (float("inf"), "Taxi", 25.0, 4),
+)
+ECO_TRAVEL_MODES = (
+    (2.0, "Walk", 4.5, 0),
+    (float("inf"), "Public transport", 20.0, 6),
+)
+
+_CLOCK = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*([ap]\.?m\.?)?", re.IGNORECASE)
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)\s*(h|hr|hrs|hour|hours|m|min|mins|minute|minutes)\b", re.IGNORECASE)
+
+
+def parse_clock(text):
+    """Minutes after midnight of the first time in ``text`` ("9:30 AM", "14:00 - 16:00")."""
+    match = _CLOCK.search(text or "")
+    if match is None:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2) or 0)
+    suffix = (match.group(3) or "").lower()
+    if suffix.startswith("p") and hour < 12:
+        hour += 12
+    elif suffix.startswith("a") and hour == 12:
+        hour = 0
+    return hour * 60 + minute if hour < 24 and minute < 60 else None
+
+
+def parse_hours(text):
+    """``(open, close)`` in minutes from "09:00-18:00" or "9 AM - 6 PM"; ``None`` if unknown."""
+    parts = re.split(r"\s*(?:-|–|to)\s*", text or "", maxsplit=1)
+    if len(parts) != 2:
+        return None
+    start, end = parse_clock(parts[0]), parse_clock(parts[1])
+    if start is None or end is None:
+        return None
+    return start, end if end > start else end + 24 * 60
+
+
+def parse_duration(text):
+    """Minutes in "2 hours", "1.5 hrs", "45 min" or "1 hour 30 minutes"."""
+    minutes = 0.0
+    for amount, unit in _DURATION.findall(text or ""):
+        minutes += float(amount) * (60 if unit.lower().startswith("h") else 1)
+    return int(minutes) or DEFAULT_DURATION
+
+
+def format_clock(minutes):
+    minutes = int(round(minutes)) % (24 * 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def distance_matrix(points, other=None):
+    """Great-circle distances in km from each of ``points`` to each of ``other`` (default: ``points``).
+
+    Both are ``(n, 2)`` arrays of lat/lon degrees.
+    """
+    other = points if other is None else other
+    lat, lon = np.radians(points[:, 0])[:, None], np.radians(points[:, 1])[:, None]
+    lat2, lon2 = np.radians(other[:, 0])[None, :], np.radians(other[:, 1])[None, :]
+    a = np.sin((lat - lat2) / 2) ** 2 + np.cos(lat) * np.cos(lat2) * np.sin((lon - lon2) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def travel_legs(km, modes):
+    """Minutes and mode for every leg of a distance matrix."""
+    km = km * DETOUR
+    minutes = np.zeros_like(km)
+    labels = np.empty(km.shape, dtype=object)
+    unset = np.ones(km.shape, dtype=bool)
+    for limit, mode, speed, fixed in modes:
+        chosen = unset & (km <= limit)
+        minutes[chosen] = km[chosen] / speed * 60 + fixed
+        labels[chosen] = mode
+        unset &= ~chosen
+    np.fill_diagonal(minutes, 0)
+    return minutes, labels
+
+
+def _better(cost, other):
+    """Less lateness, or the same lateness and at least a minute less travel and waiting."""
+    if abs(cost[0] - other[0]) >= 1:
+        return cost[0] < other[0]
+    return cost[1] < other[1] - 1
+
+
+class DaySchedule:
+    """One day's stops as arrays: durations, opening windows and the travel matrix.
+
+    With ``head``/``tail`` the first/last stop is a fixed neighbour that stays
+    where it is; only the stops between them are reordered.
+    """
+
+    def __init__(self, start, durations, windows, minutes, head=False, tail=False):
+        self.start = start
+        self.durations = durations
+        self.windows = windows
+        self.minutes = minutes
+        self.head = head
+        self.tail = tail
+
+    @property
+    def movable(self):
+        """Indices of the stops that may be reordered."""
+        return range(int(self.head), len(self.durations) - int(self.tail))
+
+    def simulate(self, order):
+        """Start time of each stop in ``order``, and ``(lateness, travel + waiting)`` as the cost."""
+        clock, lateness, travel, starts = self.start, 0.0, 0.0, []
+        previous = None
+        for stop in order:
+            if previous is not None:
+                leg = self.minutes[previous, stop]
+                clock += leg
+                travel += leg
+            opens, closes = self.windows[stop]
+            begin = max(clock, opens)
+            travel += begin - clock
+            clock = begin + self.durations[stop]
+            lateness += max(0.0, clock - closes)
+            starts.append(begin)
+            previous = stop
+        return starts, (lateness, travel)
+
+    def solve(self):
+        """Visiting order from nearest-neighbour starts improved with 2-opt.
+
+        Days have a handful of stops, so every start is tried; the LLM's own
+        order is kept unless a candidate is strictly better.
+        """
+        best = list(range(len(self.durations)))
+        best_cost = self.simulate(best)[1]
+        for first in self.movable:
+            order = self._improve(self._nearest(first))
+            cost = self.simulate(order)[1]
+            if _better(cost, best_cost):
+                best, best_cost = order, cost
+        return best
+
+    def _nearest(self, first):
+        order = [0, first] if self.head else [first]
+        left = set(self.movable) - {first}
+        while left:
+            # Next stop: the one that can be started soonest from here.
+            clock = self.simulate(order)[0][-1] + self.durations[order[-1]]
+            order.append(min(left, key=lambda s: max(clock + self.minutes[order[-1], s], self.windows[s][0])))
+            left.discard(order[-1])
+        return order + [len(self.durations) - 1] if self.tail else order
+
+    def _improve(self, order):
+        cost = self.simulate(order)[1]
+        movable = self.movable
+        improved = True
+        while improved:
+            improved = False
+            for i in range(movable.start, movable.stop - 1):
+                for j in range(i + 2, movable.stop + 1):
+                    candidate = order[:i] + order[i:j][::-1] + order[j:]
+                    candidate_cost = self.simulate(candidate)[1]
+                    if _better(candidate_cost, cost):
+                        order, cost, improved = candidate, candidate_cost, True
+        return order
+
+
+class ItineraryScheduler:
+    """Orders each itinerary day's stops and sets their times and transport.
+
+    The planner's slots keep their content; only the visiting order, ``time``
+    and ``transport_method`` are rewritten from a travel-time matrix and the
+    slots' durations and opening hours. Coordinates come from the slot itself,
+    the knowledge base or the geocoder. Unlocated stops keep their place in the
+    day and are reached without a travel leg; days with fewer than two located
+    stops are left as the planner wrote them.
+    """
+
+    def __init__(self, knowledge=knowledge_base, tools=travel_tools, day_start=DAY_START):
+        self.knowledge = knowledge
+        self.tools = tools
+        self.day_start = parse_clock(day_start)
+        self.days_scheduled = 0
+        self.days_reordered = 0
+        self.days_partial = 0
+        self.days_skipped = 0
+
+    async def locate(self, slot, location):
+        point = find_coordinates(slot) or await asyncio.to_thread(self.knowledge.coordinates, location, slot["place"])
+        if point is None and self.tools.geocoder is not None:
+            try:
+                point = await self.tools.coordinates(f"{slot.get('address') or slot['place']}, {location}")
+            except Exception:
+                point = None
+        return point
+
+    async def schedule_day(self, day, location, eco_friendly=False, before=None, after=None):
+        """``day`` reordered and timed, or ``None`` when it can't be scheduled.
+
+        ``before``/``after`` are fixed slots of the same day around it (a
+        replanned window's neighbours), which its times have to fit between.
+        """
+        slots = day.get("slots") or []
+        if not slots:
+            self.days_skipped += 1
+            return None
+        *points, before_point, after_point = await asyncio.gather(
+            *(self.locate(slot, location) for slot in slots),
+            *(self.locate(slot, location) if slot else asyncio.sleep(0) for slot in (before, after)),
+        )
+
+        start = parse_clock(slots[0].get("time"))
+        start = self.day_start if start is None else start
+        head = False
+        if before and parse_clock(before.get("time")) is not None:
+            if before_point is not None:
+                head, start = True, parse_clock(before["time"])
+            else:
+                # Unlocated: start once it ends, without the leg from it.
+                start = parse_clock(before["time"]) + parse_duration(before.get("duration"))
+        tail = bool(after) and parse_clock(after.get("time")) is not None and after_point is not None
+        stops = [before] * head + slots + [after] * tail
+        points = [before_point] * head + points + [after_point] * tail
+        located = [i for i, point in enumerate(points) if point is not None]
+        if len(located) < 2:
+            self.days_skipped += 1
+            return None
+
+        windows = [parse_hours(slot.get("opening_hours")) or (0, 48 * 60) for slot in stops]
+        durations = [parse_duration(slot.get("duration")) for slot in stops]
+        if tail:
+            # Arriving later than the fixed next stop's start counts as lateness.
+            windows[-1] = (parse_clock(after["time"]),) * 2
+            durations[-1] = 0
+        legs, labels = travel_legs(distance_matrix(np.array([points[i] for i in located], dtype=float)),
+                                   ECO_TRAVEL_MODES if eco_friendly else TRAVEL_MODES)
+        # Legs to or from an unlocated stop are unknown and left out.
+        minutes = np.zeros((len(stops), len(stops)))
+        modes = np.full((len(stops), len(stops)), None, dtype=object)
+        minutes[np.ix_(located, located)] = legs
+        modes[np.ix_(located, located)] = labels
+
+        # The located stops are reordered among themselves; unlocated ones keep their positions.
+        routed = DaySchedule(start, [durations[i] for i in located], [windows[i] for i in located], legs,
+                             head=head, tail=tail)
+        solved = iter([located[i] for i in routed.solve()])
+        order = [next(solved) if point is not None else i for i, point in enumerate(points)]
+        schedule = DaySchedule(start, durations, windows, minutes, head=head, tail=tail)
+        starts, _ = schedule.simulate(order)
+
+        scheduled = []
+        for position, (stop, begin) in enumerate(zip(order, starts)):
+            if stop not in schedule.movable:
+                continue
+            slot = dict(stops[stop])
+            clock = format_clock(begin)
+            if "-" in (slot.get("time") or ""):
+                clock += f" - {format_clock(begin + schedule.durations[stop])}"
+            slot["time"] = clock
+            if position:
+                if modes[order[position - 1], stop] is not None:
+                    slot["transport_method"] = modes[order[position - 1], stop]
+            elif "transport_method" in slots[0]:
+                # The first stop is reached from the hotel, however the day was ordered.
+                slot["transport_method"] = slots[0]["transport_method"]
+            scheduled.append(slot)
+        self.days_scheduled += 1
+        self.days_reordered += int(order != list(range(len(stops))))
+        self.days_partial += int(len(located) < len(stops))
+        return {**day, "slots": scheduled}
+
+    async def schedule(self, days, location, eco_friendly=False):
+        """``(days, unscheduled)``: the days scheduled where possible, and the numbers of those left as written."""
+        results = await asyncio.gather(*(self.schedule_day(day, location, eco_friendly) for day in days))
+        unscheduled = [day.get("day", i + 1) for i, (day, result) in enumerate(zip(days, results)) if result is None]
+        return [result or day for day, result in zip(days, results)], unscheduled
+
+    def stats(self):
+        return {
+            "days_scheduled": self.days_scheduled,
+            "days_reordered": self.days_reordered,
+            "days_partial": self.days_partial,
+            "days_skipped": self.days_skipped,
+        }
+
+
+itinerary_scheduler = ItineraryScheduler()
+
+__all__ = [
+    "DaySchedule", "ItineraryScheduler", "distance_matrix", "itinerary_scheduler",
+    "parse_duration", "parse_hours", "travel_legs"
+]
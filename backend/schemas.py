@@ -0,0 +1,167 @@
+# schemas.py
+
+import datetime
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, RootModel, ValidationError, field_validator, model_validator
+
+from json_utils import repair_json
+from metrics import tracer
+
+Money = Union[str, float, int]
+
+
+class Slot(BaseModel):
+    model_config = ConfigDict(extra="allow", populate_by_name=True)
+
+    time: str = Field(validation_alias=AliasChoices("time", "time_range", "start_time"))
+    place: str = Field(validation_alias=AliasChoices("place", "place_name", "activity_name", "name"))
+    duration: Optional[str] = None
+    address: Optional[str] = Field(default=None, validation_alias=AliasChoices("address", "location"))
+    description: Optional[str] = Field(default=None, validation_alias=AliasChoices("description", "notes"))
+    weather: Optional[str] = None
+    entry_fee: Optional[Money] = None
+    transport_method: Optional[str] = Field(
+        default=None, validation_alias=AliasChoices("transport_method", "travel_mode", "transport")
+    )
+
+
+class ItineraryDay(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    day: int
+    date: Optional[datetime.date] = None
+    slots: List[Slot] = Field(default_factory=list, validation_alias=AliasChoices("slots", "time_slots"))
+
+
+class Itinerary(BaseModel):
+    days: List[ItineraryDay]
+
+    @model_validator(mode="before")
+    @classmethod
+    def unwrap(cls, data):
+        # Models return a bare list, {"days": [...]} or another single-list wrapper.
+        if isinstance(data, list):
+            return {"days": data}
+        if isinstance(data, dict) and "days" not in data:
+            lists = [value for value in data.values() if isinstance(value, list)]
+            if len(lists) == 1:
+                return {"days": lists[0]}
+        return data
+
+    @field_validator("days")
+    @classmethod
+    def non_empty(cls, days):
+        if not days:
+            raise ValueError("itinerary has no days")
+        return days
+
+
+class BudgetBreakdown(BaseModel):
+    model_config = ConfigDict(extra="allow", populate_by_name=True)
+
+    Accommodation: Optional[Money] = Field(default=None, validation_alias=AliasChoices("Accommodation", "accommodation"))
+    Meals: Optional[Money] = Field(default=None, validation_alias=AliasChoices("Meals", "meals", "Food", "food"))
+    Transport: Optional[Money] = Field(default=None, validation_alias=AliasChoices("Transport", "transport"))
+    Activities: Optional[Money] = Field(default=None, validation_alias=AliasChoices("Activities", "activities"))
+    Shopping: Optional[Money] = Field(default=None, validation_alias=AliasChoices("Shopping", "shopping"))
+    Total: Money = Field(validation_alias=AliasChoices("Total", "total", "total_budget"))
+
+
+class Hotel(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    name: str
+    price: Optional[Money] = Field(default=None, validation_alias=AliasChoices("price", "price_per_night", "cost"))
+    rating: Optional[Union[float, str]] = None
+    address: Optional[str] = None
+
+
+class HotelTiers(BaseModel):
+    budget_hotels: List[Hotel] = Field(default_factory=list)
+    mid_range_hotels: List[Hotel] = Field(default_factory=list)
+    luxury_hotels: List[Hotel] = Field(default_factory=list)
+
+    @model_validator(mode="after")
+    def non_empty(self):
+        if not (self.budget_hotels or self.mid_range_hotels or self.luxury_hotels):
+            raise ValueError("no hotels returned")
+        return self
+
+
+# hotel name -> one-line description
+HotelBlurbs = RootModel[Dict[str, str]]
+
+
+class PlaceDetails(BaseModel):
+    """Any JSON object; the place modal shows whatever fields the model returns."""
+
+    model_config = ConfigDict(extra="allow")
+
+
+class CityGuide(BaseModel):
+    """Any JSON object; events for the trip's dates are merged in after generation."""
+
+    model_config = ConfigDict(extra="allow")
+
+
+# crew name -> schema its output must satisfy
+OUTPUT_SCHEMAS = {
+    "planner": Itinerary,
+    "replanner": Itinerary,
+    "budget": BudgetBreakdown,
+    "hotel": HotelTiers,
+    "hotel_blurb": HotelBlurbs,
+    "place": PlaceDetails,
+    "city_guide": CityGuide,
+}
+
+
+class OutputValidationError(ValueError):
+    pass
+
+
+class OutputValidator:
+    """Validates crew outputs against their schema, repairing the JSON locally first."""
+
+    def __init__(self, schemas):
+        self.schemas = schemas
+        self.valid = 0
+        self.repaired = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def _count(self, field, started):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+        tracer.record("json_repair", time.perf_counter() - started, outcome=field)
+        tracer.count("tourmuse_output_validation_total", outcome=field)
+
+    def validate(self, name, result):
+        """Return ``result`` with ``json`` replaced by the validated data."""
+        schema = self.schemas.get(name)
+        if schema is None:
+            return result
+        started = time.perf_counter()
+        try:
+            data, repaired = repair_json(result["raw"])
+            model = schema.model_validate(data)
+        except (ValueError, ValidationError) as e:
+            self._count("failed", started)
+            raise OutputValidationError(f"{name} output failed validation: {e}") from e
+        self._count("repaired" if repaired else "valid", started)
+        return {**result, "json": model.model_dump(mode="json", exclude_none=True)}
+
+    def stats(self):
+        return {"valid": self.valid, "repaired": self.repaired, "failed": self.failed}
+
+
+output_validator = OutputValidator(OUTPUT_SCHEMAS)
+
+__all__ = [
+    "BudgetBreakdown", "CityGuide", "Hotel", "HotelBlurbs", "HotelTiers", "Itinerary", "ItineraryDay",
+    "OUTPUT_SCHEMAS", "OutputValidationError", "OutputValidator", "PlaceDetails", "Slot",
+    "output_validator"
+]
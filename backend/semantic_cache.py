@@ -0,0 +1,280 @@
+# semantic_cache.py
+
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+
+import httpx
+import numpy as np
+
+from knowledge import same_place
+from routing import model_router
+
+try:
+    import hnswlib
+except ImportError:  # optional: brute force is used without it
+    hnswlib = None
+
+EMBED_MODEL = os.getenv("TOURMUSE_EMBED_MODEL", "nomic-embed-text")
+THRESHOLD = float(os.getenv("TOURMUSE_SEMANTIC_THRESHOLD", "0.88"))
+MAX_ENTRIES = int(os.getenv("TOURMUSE_SEMANTIC_MAX_ENTRIES", "2000"))   # per scope
+MAX_SCOPES = int(os.getenv("TOURMUSE_SEMANTIC_MAX_SCOPES", "256"))
+# Scopes larger than this use an HNSW index when hnswlib is installed.
+ANN_MIN_ENTRIES = int(os.getenv("TOURMUSE_SEMANTIC_ANN_MIN", "512"))
+
+# kind -> seconds an answer may be served. Place details mention weather and
+# opening hours, so they go stale sooner than general city answers would.
+KIND_TTLS = {"place": 3 * 86400, "chat": 86400}
+
+# kind -> check a close match must also pass. Short place names embed close
+# together ("Museum of Modern Art" / "Museum of Art"), so a hit has to name the
+# same place by the knowledge base's own rule.
+KIND_MATCHERS = {"place": same_place}
+
+_WORD = re.compile(r"[^\W_]+")
+
+# Messages about the user's own trip, or follow-ups leaning on the conversation,
+# have answers that cannot be shared between users.
+_PERSONAL = re.compile(
+    r"\b(i|me|my|mine|we|us|our|ours|plan|itinerary|trip|schedule|booking|budget|"
+    r"day\s*\d+|today|tonight|tomorrow|yesterday|change|swap|move|add|remove|replace|instead|"
+    r"it|that|there|those|these|them)\b",
+    re.IGNORECASE,
+)
+
+
+def is_general_question(message):
+    """True for self-contained questions about a place or city, e.g. "Louvre ticket price"."""
+    return bool(_WORD.search(message or "")) and not _PERSONAL.search(message)
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class HashingEmbedder:
+    """Character-trigram and word features hashed into a fixed-size vector.
+
+    No model needed; catches rewordings with shared words ("Louvre entry fee" /
+    "entry fee Louvre") but not synonyms. Used when Ollama has no embedding model.
+    """
+
+    name = "hash"
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = _WORD.findall(text.lower())
+        for word in words:
+            vector[zlib.crc32(word.encode()) % self.dim] += 2.0
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                vector[zlib.crc32(padded[i:i + 3].encode()) % self.dim] += 1.0
+        return vector
+
+    async def embed(self, texts):
+        return normalize([self._vector(text) for text in texts])
+
+
+class OllamaEmbedder:
+    """Embeddings from Ollama's ``/api/embed`` on the least busy healthy host."""
+
+    def __init__(self, model=EMBED_MODEL, router=model_router, timeout=5.0):
+        self.model = model
+        self.name = f"ollama:{model}"
+        self.router = router
+        self._timeout = timeout
+        self._client = None
+
+    async def embed(self, texts):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._timeout)
+        response = await self._client.post(
+            f"{self.router.base_url()}/api/embed", json={"model": self.model, "input": list(texts)}
+        )
+        response.raise_for_status()
+        return normalize(response.json()["embeddings"])
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class VectorIndex:
+    """Fixed-capacity vector store for one scope.
+
+    Slots are reused in place: a new answer takes an expired slot, or else the
+    least recently used one, so rows never need compacting. Search is a single
+    matrix-vector product, or an HNSW query for large scopes when available.
+    """
+
+    def __init__(self, dim, capacity=MAX_ENTRIES):
+        self.capacity = capacity
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.entries = []
+        self._ann = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _live(self, now):
+        return np.array([entry["expires_at"] > now for entry in self.entries], dtype=bool)
+
+    def search(self, query, now):
+        """``(slot, score)`` of the closest unexpired entry, or ``(None, 0.0)``."""
+        if not self.entries:
+            return None, 0.0
+        live = self._live(now)
+        if self._use_ann():
+            labels, distances = self._ann.knn_query(query, k=min(8, len(self.entries)))
+            for label, distance in zip(labels[0], distances[0]):
+                if live[label]:
+                    return int(label), float(1.0 - distance)
+            return None, 0.0
+        scores = np.where(live, self.vectors @ query, -np.inf)
+        best = int(np.argmax(scores))
+        return (best, float(scores[best])) if np.isfinite(scores[best]) else (None, 0.0)
+
+    def add(self, vector, entry, now):
+        if len(self.entries) < self.capacity:
+            slot = len(self.entries)
+            self.vectors = np.vstack([self.vectors, vector[None, :]])
+            self.entries.append(entry)
+        else:
+            expired = np.flatnonzero(~self._live(now))
+            slot = int(expired[0]) if expired.size else min(
+                range(len(self.entries)), key=lambda i: self.entries[i]["used_at"]
+            )
+            self.vectors[slot] = vector
+            self.entries[slot] = entry
+        if self._ann is not None:
+            self._ann.add_items(vector[None, :], [slot])
+        return slot
+
+    def _use_ann(self):
+        if hnswlib is None or len(self.entries) < ANN_MIN_ENTRIES:
+            return False
+        if self._ann is None:
+            self._ann = hnswlib.Index(space="cosine", dim=self.vectors.shape[1])
+            self._ann.init_index(max_elements=self.capacity, ef_construction=100, M=16)
+            self._ann.add_items(self.vectors, np.arange(len(self.entries)))
+        return True
+
+
+class Probe:
+    """Result of a lookup; ``store()`` saves the answer for a miss without re-embedding."""
+
+    def __init__(self, cache, index_key, vector, question, answer=None, score=0.0):
+        self.cache = cache
+        self.index_key = index_key
+        self.vector = vector
+        self.question = question
+        self.answer = answer
+        self.score = score
+
+    def store(self, answer):
+        if self.vector is not None and self.answer is None:
+            self.cache._store(self.index_key, self.vector, self.question, answer)
+
+
+class SemanticCache:
+    """Serves stored answers to questions that mean the same thing.
+
+    Questions are embedded and compared by cosine similarity within a scope
+    (``kind`` plus city, and the crew's prompt version so prompt edits start
+    fresh). Answers at or above ``threshold`` that also pass the kind's matcher
+    are returned; entries expire after the kind's TTL and each scope keeps at
+    most ``max_entries``. If the embedding model is unavailable, the hashing embedder takes over with its
+    own indexes, since the two vector spaces are not comparable.
+    """
+
+    def __init__(self, embedder=None, fallback=None, threshold=THRESHOLD, ttls=None,
+                 max_entries=MAX_ENTRIES, max_scopes=MAX_SCOPES, matchers=None):
+        self.embedder = embedder or OllamaEmbedder()
+        self.fallback = fallback or HashingEmbedder()
+        self.threshold = threshold
+        self.ttls = {**KIND_TTLS, **(ttls or {})}
+        self.matchers = {**KIND_MATCHERS, **(matchers or {})}
+        self.max_entries = max_entries
+        self.max_scopes = max_scopes
+        self._indexes = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.stores = 0
+        self.embed_failures = 0
+        self._embedder_down_until = 0.0
+
+    async def _embed(self, text):
+        if time.monotonic() >= self._embedder_down_until:
+            try:
+                return self.embedder.name, (await self.embedder.embed([text]))[0]
+            except (httpx.HTTPError, KeyError, ValueError):
+                self.embed_failures += 1
+                # Don't pay for a failing call on every message; try again in a minute.
+                self._embedder_down_until = time.monotonic() + 60
+        return self.fallback.name, (await self.fallback.embed([text]))[0]
+
+    async def lookup(self, kind, scope, question, version=""):
+        self.lookups += 1
+        embedder, vector = await self._embed(question)
+        index_key = (kind, " ".join((scope or "").lower().split()), version, embedder)
+        index = self._indexes.get(index_key)
+        if index is None:
+            return Probe(self, index_key, vector, question)
+        self._indexes.move_to_end(index_key)
+        now = time.time()
+        slot, score = index.search(vector, now)
+        if slot is None or score < self.threshold:
+            return Probe(self, index_key, vector, question, score=score)
+        entry = index.entries[slot]
+        matches = self.matchers.get(kind)
+        if matches is not None and not matches(question, entry["question"]):
+            return Probe(self, index_key, vector, question, score=score)
+        entry["used_at"] = now
+        entry["hits"] += 1
+        self.hits += 1
+        return Probe(self, index_key, vector, question, answer=entry["answer"], score=score)
+
+    def _store(self, index_key, vector, question, answer):
+        index = self._indexes.get(index_key)
+        if index is None:
+            index = self._indexes[index_key] = VectorIndex(vector.shape[0], self.max_entries)
+            while len(self._indexes) > self.max_scopes:
+                self._indexes.popitem(last=False)
+        now = time.time()
+        index.add(vector, {
+            "question": question, "answer": answer, "hits": 0,
+            "used_at": now, "expires_at": now + self.ttls.get(index_key[0], 86400),
+        }, now)
+        self.stores += 1
+
+    def stats(self):
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "stores": self.stores,
+            "embed_failures": self.embed_failures,
+            "scopes": len(self._indexes),
+            "entries": sum(len(index) for index in self._indexes.values()),
+            "ann": hnswlib is not None,
+        }
+
+    async def aclose(self):
+        if hasattr(self.embedder, "aclose"):
+            await self.embedder.aclose()
+
+
+semantic_cache = SemanticCache()
+
+__all__ = [
+    "HashingEmbedder", "OllamaEmbedder", "Probe", "SemanticCache", "VectorIndex",
+    "is_general_question", "semantic_cache"
+]
@@ -0,0 +1,84 @@
+# session.py
+
+import json
+import os
+
+from cache import create_backend
+from context import summarize_output
+
+# Crew outputs are stored as their compact text/JSON plus a prompt-ready
+# summary; token usage is only interesting in the response that produced it.
+SESSION_FIELDS = ("raw", "json")
+
+
+def compact_output(result):
+    if isinstance(result, dict):
+        entry = {field: result.get(field) for field in SESSION_FIELDS}
+    else:
+        entry = {"raw": str(result), "json": None}
+    entry["summary"] = summarize_output(entry)
+    return entry
+
+
+class SessionStore:
+    """Per user/trip context shared by all endpoints.
+
+    Sessions live in a cache backend (in-memory LRU, SQLite or Redis), so they
+    are bounded, expire after ``ttl`` seconds and, with the SQLite or Redis
+    backends, survive restarts and are shared across uvicorn workers.
+    """
+
+    def __init__(self, backend, ttl=None):
+        self.backend = backend
+        self.ttl = ttl
+
+    @classmethod
+    def from_env(cls):
+        backend = create_backend(
+            os.getenv("TOURMUSE_SESSION_BACKEND", "memory"),
+            path=os.getenv("TOURMUSE_SESSION_PATH", "tourmuse_sessions.sqlite3"),
+            max_entries=int(os.getenv("TOURMUSE_SESSION_MAX_ENTRIES", "10000")),
+            table="sessions",
+        )
+        return cls(backend, ttl=float(os.getenv("TOURMUSE_SESSION_TTL", str(7 * 86400))))
+
+    @staticmethod
+    def key(user_id, trip_id=None):
+        return f"{user_id}:{trip_id or 'default'}"
+
+    def get(self, user_id, trip_id=None):
+        value = self.backend.get(self.key(user_id, trip_id))
+        return json.loads(value) if value else {}
+
+    def update(self, user_id, trip_id=None, **outputs):
+        """Merge crew ``outputs`` into the session in their compact form."""
+        return self.put(user_id, trip_id, **{name: compact_output(result) for name, result in outputs.items()})
+
+    def put(self, user_id, trip_id=None, **fields):
+        """Merge JSON-serializable ``fields`` into the session as-is.
+
+        The backend merges atomically, so concurrent updates from other
+        workers to other fields of the same session are kept.
+        """
+        return self.backend.merge(self.key(user_id, trip_id), fields, ttl=self.ttl)
+
+    def clear(self, user_id, trip_id=None):
+        self.backend.delete(self.key(user_id, trip_id))
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "sessions": len(self.backend),
+            "bytes": self.backend.nbytes(),
+        }
+
+
+def session_text(context, name, default="Not available"):
+    """Raw text of a stored crew output, for prompt templates."""
+    entry = context.get(name)
+    return entry["raw"] if entry else default
+
+
+session_store = SessionStore.from_env()
+
+__all__ = ["SessionStore", "compact_output", "session_store", "session_text"]
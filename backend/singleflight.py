@@ -0,0 +1,48 @@
+# singleflight.py
+
+import asyncio
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one execution.
+
+    The first caller for a key runs the work; callers arriving while it is in
+    flight await the same future and get the same result (or exception). The
+    key is dropped as soon as the work finishes, so later calls run afresh.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: one waiter disconnecting must not cancel the shared work.
+            return await asyncio.shield(future)
+
+        self.executions += 1
+        future = asyncio.ensure_future(fn(*args, **kwargs))
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(future)
+
+    def _finish(self, key, future):
+        self._inflight.pop(key, None)
+        # Mark the exception as retrieved even if every waiter went away.
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self):
+        total = self.executions + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / total, 4) if total else 0.0,
+        }
+
+
+__all__ = ["SingleFlight"]
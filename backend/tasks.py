@@ -1,39 +1,66 @@
 # tasks.py
 
 from crewai import Task
-from agents import planner_agent, budget_agent, optimizer_agent, replanner_agent, place_agent, city_guide_agent, intent_agent, eco_agent, hotel_agent, chatbot_agent
+from agents import planner_agent, budget_agent, optimizer_agent, replanner_agent, place_agent, city_guide_agent, intent_agent, eco_agent, hotel_agent, hotel_blurb_agent, chatbot_agent
+from prompts import task_description
+
+# Descriptions put their inputs after the instructions, most stable first (see prompts.py).
 #from tools import weather_tool, event_tool, hotel_tool
 
 # Task: Generate daily itinerary
 planner_task = Task(
-    description= "Generate a **detailed, structured JSON daily itinerary** for the user trip with the following fields:\n"
-        "- day\n"
-        "- date\n"
-        "- time_slots: [{time_range, activity_name, place_name, location, entry_fee, travel_mode, notes, weather, event_info}]\n\n"
-        "The output **must be JSON only, no text explanations**, structured cleanly to match frontend expectations.",
+    description=task_description(
+        "Generate a **detailed, structured JSON daily itinerary** for the user trip as one object:\n"
+        "{\"days\": [{\"day\": 1, \"date\": \"YYYY-MM-DD\", \"slots\": [{time, duration, place, address, "
+        "description, weather, entry_fee, transport_method}]}]}\n\n"
+        "The output **must be JSON only, no text explanations**, structured cleanly to match frontend expectations.\n"
+        "Use the weather forecast for the weather field and to move outdoor slots.",
+        ("Trip request", "user_input"),
+        ("Weather forecast by date", "weather_forecast"),
+    ),
     agent=planner_agent,
     #tools=[weather_tool, event_tool, hotel_tool],
-    expected_output="JSON itinerary matching frontend slots for TourMuse.",
+    expected_output="A JSON object {\"days\": [...]} with each day's date and slots for TourMuse.",
     output_format="JSON"
 )
 
 # Task: Compute detailed budget
 budget_task = Task(
-    description="Compute a detailed budget breakdown (accommodation, meals, transport, activities, shopping) and return structured JSON.",
+    description=task_description(
+        "Compute a detailed budget breakdown (accommodation, meals, transport, activities, shopping) and return structured JSON.",
+        ("Trip request", "user_input"),
+        ("Draft itinerary", "itinerary"),
+    ),
     agent=budget_agent,
     expected_output="Budget JSON with day-wise and category-wise costs."
 )
 
 # Task: Suggest cost-cutting changes
 optimizer_task = Task(
-    description="Suggest optimized cost-cutting recommendations for a given trip plan while retaining user preferences.",
+    description=task_description(
+        "Suggest optimized cost-cutting recommendations for a given trip plan while retaining user preferences.",
+        ("Trip request", "user_input"),
+        ("Draft itinerary", "itinerary"),
+        ("Current budget breakdown", "budget_breakdown"),
+    ),
     agent=optimizer_agent,
     expected_output="Optimized plan JSON."
 )
 
 # Task: Replan itinerary
 replanner_task = Task(
-    description="Replan the trip itinerary considering new weather or event data.",
+    description=task_description(
+        "Replan the trip itinerary considering new weather or event data.\n"
+        "Only the affected window is given; replace just those slots. Neighbouring slots are fixed: "
+        "keep timings consistent with them and do not return them.\n"
+        "Return {\"days\": [{\"day\": ..., \"date\": ..., \"slots\": [...]}]} with, for each day in the window, "
+        "only its replacement slots.",
+        ("Destination", "location"),
+        ("Affected window", "previous_plan"),
+        ("Neighbouring slots", "neighbor_context"),
+        ("Additional constraints", "constraints"),
+        ("Weather forecast by date", "weather_forecast"),
+    ),
     agent=replanner_agent,
     #tools=[weather_tool, event_tool],
     expected_output="Replanned itinerary JSON."
@@ -41,7 +68,13 @@ replanner_task = Task(
 
 # Task: Get detailed place info
 place_task = Task(
-    description="Provide detailed information for a specific place, including description, entry fees, weather, mini-map coordinates.",
+    description=task_description(
+        "Provide detailed information for a specific place, including description, entry fees, weather, "
+        "and its coordinates as decimal \"lat\" and \"lon\" fields for the mini-map.",
+        ("City", "location"),
+        ("Place", "place_name"),
+        ("Date of visit", "date"),
+    ),
     agent=place_agent,
     #tools=[weather_tool],
     expected_output="Structured JSON for PlaceDetailsModal."
@@ -49,7 +82,10 @@ place_task = Task(
 
 # Task: Provide city guide info
 city_guide_task = Task(
-    description="Provide visa information, local customs, transport tips, and upcoming events for the location.",
+    description=task_description(
+        "Provide visa information, local customs, transport tips, and upcoming events for the location.",
+        ("Trip request", "user_input"),
+    ),
     agent=city_guide_agent,
     #tools=[event_tool],
     expected_output="JSON for City Guide page."
@@ -57,34 +93,57 @@ city_guide_task = Task(
 
 # Task: Parse user input intent
 intent_task = Task(
-    description="Parse user input (location, dates, budget, preferences) into structured JSON for triggering trip generation.",
+    description=task_description(
+        "Parse user input (location, dates, budget, preferences) into structured JSON for triggering trip generation.",
+        ("User input", "user_input"),
+    ),
     agent=intent_agent,
     expected_output="Parsed user input JSON."
 )
 
 # Task: Suggest eco-friendly alternatives
 eco_task = Task(
-    description="Suggest greener, eco-friendly alternatives for transport, activities, and accommodation.",
+    description=task_description(
+        "Suggest greener, eco-friendly alternatives for transport, activities, and accommodation.",
+        ("Trip request", "user_input"),
+    ),
     agent=eco_agent,
     #tools=[hotel_tool],
     expected_output="List of eco-friendly recommendations in JSON."
 )
 
 hotel_task = Task(
-    description="Generate hotels by budget tier for the location and dates.",
+    description=task_description(
+        "Generate hotels by budget tier for the location and dates.",
+        ("Trip request", "user_input"),
+    ),
     agent=hotel_agent,
     expected_output="Hotels JSON by tier."
 )
 
+hotel_blurb_task = Task(
+    description=task_description(
+        "Write a one-sentence blurb for each of these hotels.",
+        ("City", "location"),
+        ("Hotels", "hotels"),
+    ),
+    agent=hotel_blurb_agent,
+    expected_output="JSON object mapping hotel names to blurbs."
+)
+
 
 from crewai import Task
 from agents import chatbot_agent
 
 chatbot_task = Task(
-    description=(
-        "Respond to user input: {user_message}. "
+    description=task_description(
+        "Respond to the user's message. "
         "If it is a city or place question, provide clear, accurate information. "
-        "If it is an itinerary modification, analyze and suggest updated plans."
+        "If it is an itinerary modification, analyze and suggest updated plans.",
+        ("Trip context", "trip_context"),
+        ("Conversation so far", "conversation"),
+        ("Details for this message", "turn_context"),
+        ("User's message", "user_message"),
     ),
     agent=chatbot_agent,
     expected_output="A helpful, clear, and accurate response to the user's travel-related question or a modified itinerary as per user request."
@@ -100,5 +159,6 @@ __all__ = [
     "place_task",
     "city_guide_task",
     "intent_task",
-    "eco_task"
+    "eco_task",
+    "hotel_blurb_task"
 ]
\ No newline at end of file
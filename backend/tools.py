@@ -1,113 +1,256 @@
-# # tools.py
-
-# import requests
-# from datetime import datetime
-# from dotenv import load_dotenv
-# import os
-
-# load_dotenv()
-
-# OPENWEATHER_API_KEY = os.environ.get("OPENWEATHER_API_KEY")
-# EVENTBRITE_TOKEN = os.environ.get("EVENTBRITE_TOKEN")
-# GOOGLE_MAPS_API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY")
-
-# def get_weather(location, date):
-#     """Fetch weather forecast for a location on a specific date"""
-#     lat, lon = get_coordinates(location)
-#     url = (
-#         f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}"
-#         f"&appid={OPENWEATHER_API_KEY}&units=metric"
-#     )
-#     response = requests.get(url)
-#     data = response.json()
-#     target_date = date.strftime("%Y-%m-%d")
-#     forecast = next(
-#         (item for item in data['list'] if item['dt_txt'].startswith(target_date)),
-#         None
-#     )
-#     if forecast:
-#         desc = forecast['weather'][0]['description']
-#         temp = forecast['main']['temp']
-#         return f"{desc.capitalize()}, {temp}°C"
-#     else:
-#         return "Weather data unavailable"
-
-# def get_local_events(location, date):
-#     """Fetch local events from Eventbrite"""
-#     url = (
-#         f"https://www.eventbriteapi.com/v3/events/search/?location.address={location}"
-#         f"&start_date.range_start={date.isoformat()}T00:00:00Z"
-#         f"&start_date.range_end={date.isoformat()}T23:59:59Z"
-#     )
-#     headers = {"Authorization": f"Bearer {EVENTBRITE_TOKEN}"}
-#     response = requests.get(url, headers=headers)
-#     data = response.json()
-#     events = []
-#     for event in data.get("events", [])[:5]:
-#         events.append({
-#             "name": event["name"]["text"],
-#             "start": event["start"]["local"],
-#             "end": event["end"]["local"],
-#             "url": event["url"]
-#         })
-#     return events or "No local events found"
-
-# def get_crowd_prediction(place_name, date, time):
-#     """Simulated crowd prediction for demonstration"""
-#     from random import choice
-#     return choice(["Low", "Moderate", "High"])
-
-# def get_place_image(place_name, location):
-#     """Fetch a place image using Google Places API"""
-#     url = (
-#         f"https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
-#         f"?input={place_name} {location}&inputtype=textquery&fields=photos&key={GOOGLE_MAPS_API_KEY}"
-#     )
-#     response = requests.get(url)
-#     data = response.json()
-#     try:
-#         photo_ref = data["candidates"][0]["photos"][0]["photo_reference"]
-#         photo_url = (
-#             f"https://maps.googleapis.com/maps/api/place/photo"
-#             f"?maxwidth=800&photoreference={photo_ref}&key={GOOGLE_MAPS_API_KEY}"
-#         )
-#         return photo_url
-#     except:
-#         return "https://via.placeholder.com/800x600.png?text=No+Image"
-
-# def get_nearby_restaurants(location):
-#     """Fetch top 3 nearby restaurants using Google Places API"""
-#     lat, lon = get_coordinates(location)
-#     url = (
-#         f"https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-#         f"?location={lat},{lon}&radius=1500&type=restaurant&key={GOOGLE_MAPS_API_KEY}"
-#     )
-#     response = requests.get(url)
-#     data = response.json()
-#     restaurants = []
-#     for place in data.get("results", [])[:3]:
-#         restaurants.append({
-#             "name": place["name"],
-#             "rating": place.get("rating"),
-#             "address": place.get("vicinity")
-#         })
-#     return restaurants or "No nearby restaurants found"
-
-# def get_coordinates(location):
-#     """Helper to get lat/lon for a location using Google Maps Geocoding API"""
-#     url = (
-#         f"https://maps.googleapis.com/maps/api/geocode/json"
-#         f"?address={location}&key={GOOGLE_MAPS_API_KEY}"
-#     )
-#     response = requests.get(url)
-#     data = response.json()
-#     location_data = data["results"][0]["geometry"]["location"]
-#     return location_data["lat"], location_data["lng"]
-
-# __all__ = [
-#     "get_weather",
-#     "get_local_events",
-#     "get_crowd_prediction",
-#     "get_place_image",
-#     "get_nearby_restaurants"
-# ]
+# tools.py
+
+import asyncio
+import json
+import os
+from datetime import date, datetime
+
+import httpx
+from dotenv import load_dotenv
+
+from cache import MemoryBackend
+
+load_dotenv()
+
+OPENWEATHER_API_KEY = os.environ.get("OPENWEATHER_API_KEY")
+EVENTBRITE_TOKEN = os.environ.get("EVENTBRITE_TOKEN")
+GOOGLE_MAPS_API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY")
+
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/800x600.png?text=No+Image"
+
+# Seconds each kind of lookup stays cached.
+GEOCODE_TTL = 30 * 86400
+FORECAST_TTL = 3600
+EVENTS_TTL = 6 * 3600
+PLACES_TTL = 86400
+
+
+# Providers: one small class per external API. Each takes the shared client so
+# tests can swap in stubs with the same async methods.
+
+class GoogleGeocoder:
+    def __init__(self, api_key=GOOGLE_MAPS_API_KEY):
+        self.api_key = api_key
+
+    async def geocode(self, client, location):
+        response = await client.get(
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            params={"address": location, "key": self.api_key},
+        )
+        response.raise_for_status()
+        results = response.json().get("results") or []
+        if not results:
+            return None
+        point = results[0]["geometry"]["location"]
+        return point["lat"], point["lng"]
+
+
+class OpenWeatherForecast:
+    """5-day/3-hour forecast; one call covers every day and place of a trip in a city."""
+
+    def __init__(self, api_key=OPENWEATHER_API_KEY):
+        self.api_key = api_key
+
+    async def forecast(self, client, lat, lon):
+        response = await client.get(
+            "https://api.openweathermap.org/data/2.5/forecast",
+            params={"lat": lat, "lon": lon, "appid": self.api_key, "units": "metric"},
+        )
+        response.raise_for_status()
+        return [
+            {
+                "dt_txt": item["dt_txt"],
+                "description": item["weather"][0]["description"],
+                "temp": item["main"]["temp"],
+            }
+            for item in response.json().get("list", [])
+        ]
+
+
+class EventbriteEvents:
+    def __init__(self, token=EVENTBRITE_TOKEN):
+        self.token = token
+
+    async def events(self, client, location, day):
+        response = await client.get(
+            "https://www.eventbriteapi.com/v3/events/search/",
+            params={
+                "location.address": location,
+                "start_date.range_start": f"{day.isoformat()}T00:00:00Z",
+                "start_date.range_end": f"{day.isoformat()}T23:59:59Z",
+            },
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
+        response.raise_for_status()
+        return [
+            {
+                "name": event["name"]["text"],
+                "start": event["start"]["local"],
+                "end": event["end"]["local"],
+                "url": event["url"],
+            }
+            for event in response.json().get("events", [])[:5]
+        ]
+
+
+class GooglePlaces:
+    def __init__(self, api_key=GOOGLE_MAPS_API_KEY):
+        self.api_key = api_key
+
+    async def photo(self, client, place_name, location):
+        response = await client.get(
+            "https://maps.googleapis.com/maps/api/place/findplacefromtext/json",
+            params={
+                "input": f"{place_name} {location}",
+                "inputtype": "textquery",
+                "fields": "photos",
+                "key": self.api_key,
+            },
+        )
+        response.raise_for_status()
+        try:
+            photo_ref = response.json()["candidates"][0]["photos"][0]["photo_reference"]
+        except (KeyError, IndexError):
+            return None
+        return (
+            "https://maps.googleapis.com/maps/api/place/photo"
+            f"?maxwidth=800&photoreference={photo_ref}&key={self.api_key}"
+        )
+
+    async def restaurants(self, client, lat, lon):
+        response = await client.get(
+            "https://maps.googleapis.com/maps/api/place/nearbysearch/json",
+            params={"location": f"{lat},{lon}", "radius": 1500, "type": "restaurant", "key": self.api_key},
+        )
+        response.raise_for_status()
+        return [
+            {"name": place["name"], "rating": place.get("rating"), "address": place.get("vicinity")}
+            for place in response.json().get("results", [])[:3]
+        ]
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).date()
+
+
+class TravelTools:
+    """Grounding data for the planner and replanner.
+
+    All calls share one pooled ``httpx.AsyncClient``. Coordinates, forecasts,
+    events and place data are cached with per-kind TTLs. A trip's weather comes
+    from a single forecast fetch, and per-place lookups run in parallel.
+    """
+
+    def __init__(self, geocoder=None, weather=None, events=None, places=None, client=None, timeout=10.0):
+        self.geocoder = geocoder or (GoogleGeocoder() if GOOGLE_MAPS_API_KEY else None)
+        self.weather = weather or (OpenWeatherForecast() if OPENWEATHER_API_KEY else None)
+        self.events = events or (EventbriteEvents() if EVENTBRITE_TOKEN else None)
+        self.places = places or (GooglePlaces() if GOOGLE_MAPS_API_KEY else None)
+        self._client = client
+        self._timeout = timeout
+        self._cache = MemoryBackend(max_entries=4096)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _cached(self, key, ttl, fetch):
+        value = self._cache.get(key)
+        if value is not None:
+            return json.loads(value)
+        result = await fetch()
+        if result is not None:
+            self._cache.set(key, json.dumps(result), ttl=ttl)
+        return result
+
+    async def coordinates(self, location):
+        if self.geocoder is None:
+            return None
+        key = f"geo:{location.strip().lower()}"
+        point = await self._cached(key, GEOCODE_TTL, lambda: self.geocoder.geocode(self.client, location))
+        return tuple(point) if point else None
+
+    async def forecast(self, location):
+        if self.weather is None:
+            return []
+        point = await self.coordinates(location)
+        if point is None:
+            return []
+        key = f"forecast:{point[0]:.2f},{point[1]:.2f}"
+        return await self._cached(key, FORECAST_TTL, lambda: self.weather.forecast(self.client, *point))
+
+    async def trip_weather(self, location, days):
+        """``{"YYYY-MM-DD": "Light rain, 14°C"}`` for each day, from one forecast fetch."""
+        entries = await self.forecast(location)
+        weather = {}
+        for day in days:
+            target = _as_date(day).isoformat()
+            matches = [e for e in entries if e["dt_txt"].startswith(target)]
+            if not matches:
+                continue
+            # Prefer the midday reading when the day has several.
+            entry = min(matches, key=lambda e: abs(int(e["dt_txt"][11:13] or 12) - 12))
+            weather[target] = f"{entry['description'].capitalize()}, {entry['temp']}°C"
+        return weather
+
+    async def local_events(self, location, day):
+        if self.events is None:
+            return []
+        day = _as_date(day)
+        key = f"events:{location.strip().lower()}:{day.isoformat()}"
+        return await self._cached(key, EVENTS_TTL, lambda: self.events.events(self.client, location, day))
+
+    async def place_image(self, place_name, location):
+        if self.places is None:
+            return PLACEHOLDER_IMAGE
+        key = f"photo:{place_name.strip().lower()}:{location.strip().lower()}"
+        url = await self._cached(key, PLACES_TTL, lambda: self.places.photo(self.client, place_name, location))
+        return url or PLACEHOLDER_IMAGE
+
+    async def nearby_restaurants(self, place_name, location):
+        if self.places is None:
+            return []
+        point = await self.coordinates(f"{place_name}, {location}")
+        if point is None:
+            return []
+        key = f"restaurants:{point[0]:.3f},{point[1]:.3f}"
+        return await self._cached(key, PLACES_TTL, lambda: self.places.restaurants(self.client, *point))
+
+    async def place_info(self, place_name, location, day=None):
+        image, restaurants, weather = await asyncio.gather(
+            self.place_image(place_name, location),
+            self.nearby_restaurants(place_name, location),
+            self.trip_weather(location, [day]) if day else asyncio.sleep(0, result={}),
+            return_exceptions=True,
+        )
+        return {
+            "place_name": place_name,
+            "image": image if isinstance(image, str) else PLACEHOLDER_IMAGE,
+            "nearby_restaurants": restaurants if isinstance(restaurants, list) else [],
+            "weather": next(iter(weather.values()), None) if isinstance(weather, dict) else None,
+        }
+
+    async def places_info(self, places, location, day=None):
+        return await asyncio.gather(*(self.place_info(place, location, day) for place in places))
+
+
+travel_tools = TravelTools()
+
+__all__ = [
+    "EventbriteEvents", "GoogleGeocoder", "GooglePlaces", "OpenWeatherForecast",
+    "TravelTools", "travel_tools"
+]